@@ -10,3 +10,6 @@ admin.site.register(models.Animal, models.Animal.Admin)
 admin.site.register(models.Assignment, models.Assignment.Admin)
 admin.site.register(models.AssignmentStep, models.AssignmentStep.Admin)
 admin.site.register(models.AssignmentFulfillment, models.AssignmentFulfillment.Admin)
+admin.site.register(models.TrendSnapshot, models.TrendSnapshot.Admin)
+admin.site.register(models.TrendAccumulator, models.TrendAccumulator.Admin)
+admin.site.register(models.PtaCalculation, models.PtaCalculation.Admin)
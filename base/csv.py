@@ -1,14 +1,18 @@
-from io import BytesIO
+from itertools import islice
 from random import choice
-from typing import Any, Iterator
-import zipfile
+from typing import Any, Iterable, Iterator, Optional
 
 from background_task import background
 from django.conf import settings
 from django.core.mail import send_mail
-from django.http import FileResponse
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+import numpy as np
 
 from base import models
+from base import names as nms
+from base.sinks import get_export_sink
+from base.traitsets import Traitset, get_traitset, traitset
 
 COL_SEP = ","
 ROW_SEP = "\n"
@@ -20,101 +24,219 @@ def convert_data_row(data: list[Any]):
     )
 
 
-def get_file_str(headers: list[str], data: list[list[Any]]):
+def get_file_str(headers: list[str], data: Iterable[list[Any]]):
     first_row = convert_data_row(headers)
     data_rows = ROW_SEP.join(convert_data_row(row) for row in data)
     return first_row + ROW_SEP + data_rows
 
 
+def iter_csv(
+    headers: list[str], data: Iterable[list[Any]], rows_per_chunk: int = 1_000
+) -> Iterator[bytes]:
+    """Yield a csv file in chunks of encoded rows, consuming data as it
+    goes"""
+
+    yield f"{convert_data_row(headers)}{ROW_SEP}".encode("utf-8")
+
+    rows = iter(data)
+    while chunk := list(islice(rows, rows_per_chunk)):
+        yield "".join(
+            f"{convert_data_row(row)}{ROW_SEP}" for row in chunk
+        ).encode("utf-8")
+
+
 def create_csv_response(
     file_name: str,
     headers: list[str],
-    data: list[list[Any]],
-) -> FileResponse:
-    file_str = get_file_str(headers, data)
+    data: Iterable[list[Any]],
+) -> StreamingHttpResponse:
+    """Stream data as a csv download, as download_animal_chart does"""
+
+    response = StreamingHttpResponse(
+        iter_csv(headers, data), content_type="text/csv"
+    )
+    response["Content-Disposition"] = f'attachment; filename="{file_name}"'
+
+    return response
+
+
+class AnimalFileWriter:
+    """Builds rows of the animal file of a class a column at a time.
+
+    Columns are read with values_list and trait values are unpacked into
+    one matrix per chunk, so no Animal is created and no cell goes through
+    Animal.resolve_data_key. Output matches convert_data_row of the
+    resolve_data_key values. With a precision, floats are written with that
+    many decimals instead of their full repr."""
+
+    # Animal field read for each non trait data key
+    FIELDS = {
+        nms.ID_KEY: "id",
+        nms.NAME_KEY: "name",
+        nms.HERD_ID_KEY: "herd_id",
+        nms.HERD_NAME_KEY: "herd__name",
+        nms.CLASS_ID_KEY: "connectedclass_id",
+        nms.CLASS_NAME_KEY: "connectedclass__name",
+        nms.GENERATION_KEY: "generation",
+        nms.ASSIGNMENT_KEY: "assignment",
+        nms.SEX_KEY: "male",
+        nms.MALE_KEY: "male",
+        nms.SIRE_ID_KEY: "sire_id",
+        nms.DAM_ID_KEY: "dam_id",
+        nms.INBREEDING_COEFFICIENT_KEY: "inbreeding",
+        nms.INBREEDING_PERCENTAGE_KEY: "inbreeding",
+        nms.NETMERIT_KEY: "net_merit",
+    }
+    FLOAT_KEYS = {
+        nms.INBREEDING_COEFFICIENT_KEY,
+        nms.INBREEDING_PERCENTAGE_KEY,
+        nms.NETMERIT_KEY,
+    }
+    TRAIT_KEYS = [nms.GENOTYPE_KEY, nms.PHENOTYPE_KEY, nms.PTA_KEY]
+    FORMATTED_RECESSIVES = {
+        traitset.HOMOZYGOUS_FREE_KEY: "Tested Free",
+        traitset.HOMOZYGOUS_CARRIER_KEY: "Positive",
+        traitset.HETEROZYGOUS_KEY: "Carrier",
+    }
+
+    traitset: Traitset
+    data_keys: list[str | tuple[str, str]]
+    precision: Optional[int]
+    fields: list[str]
+
+    def __init__(
+        self, connectedclass: models.Class, precision: Optional[int] = None
+    ):
+        self.traitset = get_traitset(connectedclass.traitset)
+        self.data_keys = connectedclass.get_animal_file_data_order()
+        self.precision = precision
+
+        self.fields = ["id"]
+        for data_key in self.data_keys:
+            field = self.get_field(data_key)
+            if field not in self.fields:
+                self.fields.append(field)
+
+    def get_field(self, data_key: str | tuple[str, str]) -> str:
+        if type(data_key) is not tuple:
+            return self.FIELDS[data_key]
+
+        if data_key[0] in self.TRAIT_KEYS:
+            return f"{data_key[0]}_packed"
+
+        return nms.RECESSIVES_KEY
+
+    def format_floats(self, values: list[Optional[float]]) -> list[str]:
+        """Format a column of floats, None and nan are written as ~"""
+
+        if self.precision is None:
+            convert = str
+        else:
+            convert = f"{{:.{self.precision}f}}".format
+
+        return ["~" if x is None or x != x else convert(x) for x in values]
+
+    def get_trait_matrix(self, key: str, rows: list[tuple]) -> np.ndarray:
+        """Unpack the trait values of key for a chunk of rows"""
+
+        column = self.fields.index(f"{key}_packed")
+        return models.Animal.unpack_trait_rows(
+            self.traitset,
+            key,
+            [row[0] for row in rows],
+            [row[column] for row in rows],
+        )
 
-    # Correctly instantiate the BytesIO object
-    bytes_io = BytesIO()
-    with zipfile.ZipFile(bytes_io, "w", zipfile.ZIP_DEFLATED) as zip_file:
-        zip_file.writestr(file_name, file_str)
+    def get_columns(self, rows: list[tuple]) -> list[list[str]]:
+        """Get the formatted columns of a chunk of rows"""
+
+        values = dict(zip(self.fields, zip(*rows)))
+        matrices = {}
+        columns = []
+
+        for data_key in self.data_keys:
+            if type(data_key) is tuple:
+                key, uid = data_key
+
+                if key in self.TRAIT_KEYS:
+                    if key not in matrices:
+                        matrices[key] = self.get_trait_matrix(key, rows)
+
+                    index = self.traitset.trait_indexes[uid]
+                    columns.append(
+                        self.format_floats(matrices[key][:, index].tolist())
+                    )
+                    continue
+
+                recessives = [x[uid] for x in values[nms.RECESSIVES_KEY]]
+                if key == nms.FORMATTED_RECESSIVES_KEY:
+                    recessives = [
+                        self.FORMATTED_RECESSIVES.get(x) for x in recessives
+                    ]
+
+                columns.append(
+                    ["~" if x is None else str(x) for x in recessives]
+                )
+                continue
+
+            column = values[self.get_field(data_key)]
+            if data_key == nms.SEX_KEY:
+                columns.append(["male" if x else "female" for x in column])
+            elif data_key == nms.INBREEDING_PERCENTAGE_KEY:
+                columns.append(self.format_floats([x * 100 for x in column]))
+            elif data_key in self.FLOAT_KEYS:
+                columns.append(self.format_floats(column))
+            else:
+                columns.append(["~" if x is None else str(x) for x in column])
+
+        return columns
+
+    def get_rows(self, rows: list[tuple]) -> list[str]:
+        """Get a chunk of values_list rows as animal file lines"""
+
+        return [COL_SEP.join(x) for x in zip(*self.get_columns(rows))]
+
+    def iter_chunks(
+        self, animals: QuerySet, rows_per_chunk: int
+    ) -> Iterator[bytes]:
+        """Yield animals as chunks of encoded lines"""
+
+        rows = animals.values_list(*self.fields).iterator(chunk_size=5_000)
+
+        while chunk := list(islice(rows, rows_per_chunk)):
+            yield f"{ROW_SEP.join(self.get_rows(chunk))}{ROW_SEP}".encode(
+                "utf-8"
+            )
 
-    # Set the buffer's position to the beginning
-    bytes_io.seek(0)
-    return FileResponse(bytes_io, as_attachment=True, filename=f"{file_name}.zip")
+
+def iter_animal_csv(
+    connectedclass: models.Class,
+    rows_per_chunk: int = 1_000,
+    precision: Optional[int] = None,
+) -> Iterator[bytes]:
+    """Yield the animal csv of a class in chunks of encoded rows, reading
+    animals from the database as it goes"""
+
+    headers = connectedclass.get_animal_file_headers()
+    yield f"{convert_data_row(headers)}{ROW_SEP}".encode("utf-8")
+
+    yield from AnimalFileWriter(connectedclass, precision).iter_chunks(
+        models.Animal.objects.filter(connectedclass=connectedclass),
+        rows_per_chunk,
+    )
 
 
 @background(schedule=0)
 def create_animal_csv(classid: int, userid: int):
-    import boto3
-    from io import BytesIO
-
-    s3 = boto3.client("s3")
-    bucketname = settings.AWS_STORAGE_BUCKET_NAME
     uid = "".join(choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(10))
-    filekey = f"animal_charts/AnimalChart-{uid}.csv"
     connectedclass = models.Class.objects.get(id=classid)
-    headers = connectedclass.get_animal_file_headers()
-    data_keys = connectedclass.get_animal_file_data_order()
-
-    def iterator() -> Iterator[list[Any]]:
-        for animal in (
-            models.Animal.objects.filter(connectedclass=connectedclass)
-            .defer("pedigree")
-            .iterator(chunk_size=5_000)
-        ):
-            row = []
-            for key in data_keys:
-                row.append(animal.resolve_data_key(key))
-            yield row
-
-    # Initialize multipart upload
-    response = s3.create_multipart_upload(Bucket=bucketname, Key=filekey)
-    upload_id = response["UploadId"]
-    part_number = 1
-    parts = []
-    min_part_size = 5 * 1024 * 1024  # 5MB
-
-    buffer = BytesIO()
-    buffer.write(f"{convert_data_row(headers)}{ROW_SEP}".encode("utf-8"))
-
-    for item in iterator():
-        buffer.write(f"{convert_data_row(item)}{ROW_SEP}".encode("utf-8"))
-
-        if buffer.tell() >= min_part_size:
-            buffer.seek(0)
-            response = s3.upload_part(
-                Bucket=bucketname,
-                Key=filekey,
-                PartNumber=part_number,
-                UploadId=upload_id,
-                Body=buffer,
-            )
-            parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
-            part_number += 1
-            buffer = BytesIO()
-
-    # Upload the last part
-    if buffer.tell() > 0:
-        buffer.seek(0)
-        response = s3.upload_part(
-            Bucket=bucketname,
-            Key=filekey,
-            PartNumber=part_number,
-            UploadId=upload_id,
-            Body=buffer,
-        )
-        parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
-
-    # Complete multipart upload
-    s3.complete_multipart_upload(
-        Bucket=bucketname,
-        Key=filekey,
-        UploadId=upload_id,
-        MultipartUpload={"Parts": parts},
-    )
+
+    sink = get_export_sink(f"animal_charts/AnimalChart-{uid}.csv", userid)
+    for chunk in iter_animal_csv(connectedclass):
+        sink.write(chunk)
+    link = sink.close()
 
     user = models.User.objects.get(id=userid)
-    link = f"https://{bucketname}.s3.amazonaws.com/{filekey}"
 
     send_mail(
         "Animal Chart Ready",
@@ -0,0 +1,55 @@
+from typing import Any, Optional
+
+import numpy as np
+from django.db import models
+
+from .traitsets.traitset import PACKED_DTYPE
+
+
+class PackedTraitsField(models.BinaryField):
+    """Trait values packed by Traitset.pack_traits.
+
+    On Postgres the values are stored as a double precision[] instead of
+    bytes, with unknown (nan) values as NULL, so they can be summed and
+    sorted in SQL with PackedTraitValue. Python always sees the bytes."""
+
+    def db_type(self, connection) -> Optional[str]:
+        if connection.vendor == "postgresql":
+            return "double precision[]"
+
+        return super().db_type(connection)
+
+    def get_placeholder(self, value: Any, compiler, connection) -> str:
+        # Typed, as an array of only NULLs would otherwise be text[]
+        if connection.vendor == "postgresql":
+            return "%s::double precision[]"
+
+        return "%s"
+
+    def get_db_prep_value(
+        self, value: Any, connection, prepared: bool = False
+    ) -> Any:
+        if connection.vendor != "postgresql" or value is None:
+            return super().get_db_prep_value(value, connection, prepared)
+
+        return [
+            None if x != x else x
+            for x in np.frombuffer(value, dtype=PACKED_DTYPE).tolist()
+        ]
+
+    def from_db_value(self, value: Any, expression, connection) -> Any:
+        if connection.vendor != "postgresql" or value is None:
+            return value
+
+        return np.array(value, dtype=PACKED_DTYPE).tobytes()
+
+
+class PackedTraitValue(models.Func):
+    """The value of one trait (by traitset index) of a PackedTraitsField,
+    NULL if unknown. Postgres only."""
+
+    template = "(%(expressions)s)[%(position)s]"
+    output_field = models.FloatField()
+
+    def __init__(self, field: str, index: int):
+        super().__init__(models.F(field), position=int(index) + 1)
@@ -5,13 +5,13 @@ from django import forms
 from django.contrib.auth import forms as auth_forms
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from django.http import Http404
 
-from base.views_utils import ClassAuth, HerdAuth, auth_herd
+from base.views_utils import ClassAuth, HerdAuth
 
 from . import models
+from . import names as nms
 from .templatetags.animal_filters import filter_text_to_default
-from .traitsets import TRAITSET_CHOICES, Traitset
+from .traitsets import TRAITSET_CHOICES, get_traitset
 
 
 class EmailAuthenticationForm(auth_forms.AuthenticationForm):
@@ -132,7 +132,7 @@ class UpdateClassForm(forms.ModelForm):
 
     def __init__(self, connectedclass: models.Class, *args, **kwargs):
         super(UpdateClassForm, self).__init__(*args, **kwargs)
-        traitset = Traitset(self.instance.traitset)
+        traitset = get_traitset(self.instance.traitset)
 
         trait_visibility_choices = [
             (x.uid, filter_text_to_default(f"<{x.uid}>", connectedclass))
@@ -218,6 +218,19 @@ class UpdateClassForm(forms.ModelForm):
 
         self.instance.save()
 
+        visibility_fields = [
+            "genotype_visibility",
+            "phenotype_visibility",
+            "pta_visibility",
+            "recessive_visibility",
+            "net_merit_visibility",
+            "hide_female_pta",
+        ]
+        if any(x in self.changed_data for x in visibility_fields):
+            models.Herd.increment_versions(
+                models.Herd.objects.filter(connectedclass=self.instance)
+            )
+
 
 class ClassReadonlyForm(forms.ModelForm):
     "A form for the students view of the class (base.models.Class)."
@@ -304,51 +317,43 @@ class BreedHerd(forms.Form):
         if type(males) != list:
             return False
 
+        try:
+            ids = [int(x) for x in males]
+        except (TypeError, ValueError):
+            return False
+
+        # Sires may come from the class herd or the student's own herd
+        herd_ids = {
+            class_auth.connectedclass.class_herd_id,
+            class_auth.enrollment.herd_id,
+        } - {None}
+        animals = models.Animal.objects.in_bulk(ids)
+
         self.validation_catch.males = []
-        for male in males:
-            try:
-                animal = models.Animal.objects.get(id=male)
-                self.validation_catch.males.append(animal)
-            except models.Animal.DoesNotExist:
-                return False
+        for animal_id in ids:
+            animal = animals.get(animal_id)
 
-            if not animal.male:
+            if animal is None or not animal.male:
                 return False
 
-            try:
-                _herd_auth = auth_herd(class_auth, animal.herd_id)
-            except Http404:
+            if animal.herd_id not in herd_ids:
                 return False
 
+            self.validation_catch.males.append(animal)
+
         return True
 
     def validate_assignment(self, class_auth: ClassAuth.Student) -> bool:
-        assignment = self.cleaned_data["assignment"]
-
-        try:
-            assignment = models.Assignment.objects.get(id=assignment)
-            self.validation_catch.assignment = assignment
-        except models.Assignment.DoesNotExist:
-            return False
-
-        try:
-            assignment_fulfillment = models.AssignmentFulfillment.objects.get(
-                assignment=assignment, enrollment=class_auth.enrollment
-            )
-            self.validation_catch.assignment_fulfillment = (
-                assignment_fulfillment
-            )
-        except models.AssignmentFulfillment.DoesNotExist:
+        current = models.AssignmentFulfillment.get_current_step(
+            self.cleaned_data["assignment"], class_auth.enrollment
+        )
+        if current is None:
             return False
 
-        try:
-            assignment_step = models.AssignmentStep.objects.get(
-                assignment=assignment,
-                number=assignment_fulfillment.current_step,
-            )
-            self.validation_catch.assignment_step = assignment_step
-        except models.AssignmentStep.DoesNotExist:
-            return False
+        assignment_fulfillment, assignment_step = current
+        self.validation_catch.assignment = assignment_fulfillment.assignment
+        self.validation_catch.assignment_fulfillment = assignment_fulfillment
+        self.validation_catch.assignment_step = assignment_step
 
         return assignment_step.step == models.AssignmentStep.CHOICE_BREED
 
@@ -381,6 +386,90 @@ class BreedHerd(forms.Form):
         return breeding_result
 
 
+class HerdQuery(forms.Form):
+    "A form to page, sort and filter the animals of a herd."
+
+    SEX_CHOICES = (("", "Any"), ("male", "Male"), ("female", "Female"))
+
+    page = forms.IntegerField(min_value=1, required=False)
+    per_page = forms.IntegerField(min_value=1, max_value=500, required=False)
+    sort = forms.CharField(required=False)
+    descending = forms.BooleanField(required=False)
+    contains = forms.CharField(required=False)
+    sex = forms.ChoiceField(choices=SEX_CHOICES, required=False)
+    id = forms.IntegerField(required=False)
+    fields = forms.CharField(required=False)
+
+    def validate_sort(self, connectedclass: models.Class) -> bool:
+        """Only allow sorting by visible values, so hidden values can not
+        be inferred from the order"""
+
+        sort = self.cleaned_data["sort"] or nms.ID_KEY
+
+        if "," not in sort:
+            if sort not in models.Herd.Query.SORT_FIELDS:
+                return False
+
+            if sort == nms.NETMERIT_KEY:
+                return connectedclass.net_merit_visibility
+
+            return True
+
+        key, uid = sort.split(",", 1)
+        if key not in models.Herd.Query.SORT_TRAIT_KEYS:
+            return False
+
+        if key == nms.RECESSIVES_KEY:
+            return connectedclass.recessive_visibility.get(uid, False)
+
+        if uid not in connectedclass.trait_visibility:
+            return False
+
+        visibility_idx = [
+            nms.GENOTYPE_KEY,
+            nms.PHENOTYPE_KEY,
+            nms.PTA_KEY,
+        ].index(key)
+        if not connectedclass.trait_visibility[uid][visibility_idx]:
+            return False
+
+        if key == nms.PTA_KEY and connectedclass.hide_female_pta:
+            return self.cleaned_data["sex"] == "male"
+
+        return True
+
+    def validate_fields(self) -> bool:
+        fields = self.cleaned_data["fields"]
+        return not fields or all(
+            x in models.Herd.Query.FIELDS for x in fields.split(",")
+        )
+
+    def is_valid(self, connectedclass: models.Class) -> bool:
+        if super().is_valid() is False:
+            return False
+
+        return self.validate_sort(connectedclass) and self.validate_fields()
+
+    def get_query(self) -> models.Herd.Query:
+        sort = self.cleaned_data["sort"] or nms.ID_KEY
+        sex = self.cleaned_data["sex"]
+        fields = self.cleaned_data["fields"]
+
+        return models.Herd.Query(
+            page=self.cleaned_data["page"],
+            per_page=(
+                self.cleaned_data["per_page"]
+                or models.Herd.Query.DEFAULT_PER_PAGE
+            ),
+            sort=tuple(sort.split(",", 1)) if "," in sort else sort,
+            descending=self.cleaned_data["descending"],
+            contains=self.cleaned_data["contains"],
+            male=None if not sex else sex == "male",
+            animal_id=self.cleaned_data["id"],
+            fields=fields.split(",") if fields else None,
+        )
+
+
 class SubmitAnimal(forms.Form):
     "A form for animal submissions."
 
@@ -398,32 +487,16 @@ class SubmitAnimal(forms.Form):
         if super().is_valid() is False:
             return False
 
-        assignment = self.cleaned_data["assignment"]
-
-        try:
-            assignment = models.Assignment.objects.get(id=assignment)
-            self.validation_catch.assignment = assignment
-        except models.Assignment.DoesNotExist:
-            return False
-
-        try:
-            assignment_fulfillment = models.AssignmentFulfillment.objects.get(
-                assignment=assignment, enrollment=class_auth.enrollment
-            )
-            self.validation_catch.assignment_fulfillment = (
-                assignment_fulfillment
-            )
-        except models.AssignmentFulfillment.DoesNotExist:
+        current = models.AssignmentFulfillment.get_current_step(
+            self.cleaned_data["assignment"], class_auth.enrollment
+        )
+        if current is None:
             return False
 
-        try:
-            assignment_step = models.AssignmentStep.objects.get(
-                assignment=assignment,
-                number=assignment_fulfillment.current_step,
-            )
-            self.validation_catch.assignment_step = assignment_step
-        except models.AssignmentStep.DoesNotExist:
-            return False
+        assignment_fulfillment, assignment_step = current
+        self.validation_catch.assignment = assignment_fulfillment.assignment
+        self.validation_catch.assignment_fulfillment = assignment_fulfillment
+        self.validation_catch.assignment_step = assignment_step
 
         return assignment_step.step in [
             models.AssignmentStep.CHOICE_MALE_SUBMISSION,
@@ -433,17 +506,19 @@ class SubmitAnimal(forms.Form):
     @background_task.background(schedule=0)
     @staticmethod
     def move_animal(animal_id: int):
-        animal = (
-            models.Animal.objects.select_related("connectedclass")
-            .defer("pedigree", "connectedclass__trend_log")
-            .get(id=animal_id)
+        animal = models.Animal.objects.select_related("connectedclass").get(
+            id=animal_id
         )
         animal.herd = animal.connectedclass.class_herd
         animal.save()
+        animal.herd.increment_version()
 
     def save(
         self, class_auth: ClassAuth.Student, animal: models.Animal
     ) -> None:
+        models.Herd.increment_versions(
+            models.Herd.objects.filter(id=animal.herd_id)
+        )
         animal.herd = None
         animal.save()
 
@@ -541,7 +616,7 @@ class UpdateEnrollmentForm(forms.ModelForm):
 
         self.fields["animal"] = forms.ChoiceField(
             label="Animal Filter",
-            choices=Traitset(
+            choices=get_traitset(
                 self.instance.connectedclass.traitset
             ).animal_choices,
             disabled=not self.instance.connectedclass.allow_other_animals,
@@ -565,7 +640,8 @@ class UpdateEnrollmentForm(forms.ModelForm):
             )
         )
 
-        self.instance.herd.save()
+        self.instance.herd.save(update_fields=["name"])
+        self.instance.herd.increment_version()
 
     class Meta:
         model = models.Enrollment
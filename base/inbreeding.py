@@ -0,0 +1,152 @@
+from heapq import heappop, heappush
+from threading import Lock
+from typing import Iterable, Optional
+from weakref import WeakKeyDictionary
+
+from .pedigree import AncestryIndex, get_ancestry_index
+
+
+class InbreedingEngine:
+    """Inbreeding coefficients for the animals of one class.
+
+    Uses the Meuwissen & Luo (1992) method: the coefficient of an animal is
+    found by tracing its parents' contributions back through its ancestors
+    (youngest first, by id) and weighting each by the Mendelian sampling
+    variance of that ancestor. Work is proportional to the number of
+    ancestors. Coefficients of existing animals are kept so they are only
+    calculated once. Relies on animals always having larger ids than their
+    parents."""
+
+    ancestry: AncestryIndex
+    inbreeding: dict[int, float]
+
+    def __init__(self, ancestry: AncestryIndex):
+        self.ancestry = ancestry
+        self.inbreeding = {}
+
+    def add(self, animal_id: int, inbreeding: float) -> None:
+        self.inbreeding[animal_id] = inbreeding
+
+    def get_inbreeding(self, animal_id: int) -> float:
+        """Get the inbreeding coefficient of an existing animal"""
+
+        if animal_id not in self.inbreeding:
+            self.ancestry.load([animal_id])
+            self.inbreeding[animal_id] = self._get_coefficient(
+                *self.ancestry.parents[animal_id]
+            )
+
+        return self.inbreeding[animal_id]
+
+    def get_offspring_inbreeding(
+        self, sire_id: Optional[int], dam_id: Optional[int]
+    ) -> float:
+        """Get the inbreeding coefficient of a calf of sire and dam"""
+
+        self.ancestry.load([sire_id, dam_id])
+        return self._get_coefficient(sire_id, dam_id)
+
+    def get_offspring_inbreedings(
+        self, parents: Iterable[tuple[Optional[int], Optional[int]]]
+    ) -> list[float]:
+        """Get the inbreeding coefficients of calves of many (sire, dam)
+        pairs, loading all of their ancestors together"""
+
+        parents = list(parents)
+        self.ancestry.load(x for pair in parents for x in pair)
+
+        coefficients = {}
+        for pair in parents:
+            if pair not in coefficients:
+                coefficients[pair] = self._get_coefficient(*pair)
+
+        return [coefficients[pair] for pair in parents]
+
+    def _get_contributions(
+        self, sire_id: Optional[int], dam_id: Optional[int]
+    ) -> dict[int, float]:
+        """Get the fraction of genes an animal with sire and dam receives
+        from each of its ancestors (row of L in A = LDL')"""
+
+        contributions = {}
+        queue = []
+
+        def add(ancestor_id, contribution):
+            if ancestor_id is None:
+                return
+
+            if ancestor_id not in contributions:
+                contributions[ancestor_id] = 0
+                heappush(queue, -ancestor_id)
+
+            contributions[ancestor_id] += contribution
+
+        add(sire_id, 0.5)
+        add(dam_id, 0.5)
+
+        # All offspring of an ancestor have larger ids, so an ancestor's
+        # contribution is complete when it is popped
+        while queue:
+            ancestor_id = -heappop(queue)
+            for parent_id in self.ancestry.parents[ancestor_id]:
+                add(parent_id, contributions[ancestor_id] / 2)
+
+        return contributions
+
+    def _get_mendelian_variance(
+        self, sire_id: Optional[int], dam_id: Optional[int]
+    ) -> float:
+        """Within family variance (diagonal of D) of an animal with sire and
+        dam, relative to the additive variance"""
+
+        variance = 1
+        for parent_id in [sire_id, dam_id]:
+            if parent_id is not None:
+                variance -= (1 + self.inbreeding[parent_id]) / 4
+
+        return variance
+
+    def _get_coefficient(
+        self, sire_id: Optional[int], dam_id: Optional[int]
+    ) -> float:
+        if sire_id is None or dam_id is None:
+            return 0
+
+        contributions = self._get_contributions(sire_id, dam_id)
+
+        # Oldest first so parents are always known before their offspring
+        for ancestor_id in sorted(contributions):
+            if ancestor_id not in self.inbreeding:
+                self.inbreeding[ancestor_id] = self._get_coefficient(
+                    *self.ancestry.parents[ancestor_id]
+                )
+
+        self_relationship = self._get_mendelian_variance(sire_id, dam_id)
+        for ancestor_id, contribution in contributions.items():
+            variance = self._get_mendelian_variance(
+                *self.ancestry.parents[ancestor_id]
+            )
+            self_relationship += contribution**2 * variance
+
+        return max(self_relationship - 1, 0)
+
+
+_engines: WeakKeyDictionary[AncestryIndex, InbreedingEngine] = (
+    WeakKeyDictionary()
+)
+_engines_lock = Lock()
+
+
+def get_inbreeding_engine(connectedclass_id: int) -> InbreedingEngine:
+    """Get the shared inbreeding engine of a class. It lives as long as the
+    class's cached ancestry index."""
+
+    ancestry = get_ancestry_index(connectedclass_id)
+
+    with _engines_lock:
+        engine = _engines.get(ancestry)
+        if engine is None:
+            engine = InbreedingEngine(ancestry)
+            _engines[ancestry] = engine
+
+    return engine
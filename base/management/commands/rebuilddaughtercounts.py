@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from ...models import Animal
+
+
+class Command(BaseCommand):
+    help = "Recount the daughters of every animal from its offspring."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--class",
+            type=int,
+            dest="classid",
+            help="Only rebuild the animals of this class",
+        )
+
+    def handle(self, *args, classid=None, **options):
+        animals = Animal.objects.all()
+        if classid is not None:
+            animals = animals.filter(connectedclass_id=classid)
+
+        count = Animal.rebuild_daughter_counts(animals)
+        self.stdout.write(f"Rebuilt daughter counts of {count} animals")
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0021_alter_class_enrollment_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='animal',
+            name='genotype_packed',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='animal',
+            name='phenotype_packed',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='animal',
+            name='ptas_packed',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+from base.traitsets import get_traitset
+
+CHUNK_SIZE = 2_000
+
+
+def pack_animal_traits(apps, schema_editor):
+    Class = apps.get_model("base", "Class")
+    Animal = apps.get_model("base", "Animal")
+
+    for connectedclass in Class.objects.only("id", "traitset"):
+        try:
+            traitset = get_traitset(connectedclass.traitset)
+        except FileNotFoundError:
+            # Left unpacked, Animal.get_trait_array reads the json instead
+            continue
+
+        animals = Animal.objects.filter(
+            connectedclass_id=connectedclass.id, genotype_packed__isnull=True
+        ).only("id", "genotype", "phenotype", "ptas")
+
+        chunk = []
+        for animal in animals.iterator(chunk_size=CHUNK_SIZE):
+            try:
+                animal.genotype_packed = traitset.pack_traits(animal.genotype)
+                animal.phenotype_packed = traitset.pack_traits(
+                    animal.phenotype
+                )
+                animal.ptas_packed = traitset.pack_traits(animal.ptas)
+            except KeyError:
+                continue
+
+            chunk.append(animal)
+
+            if len(chunk) >= CHUNK_SIZE:
+                Animal.objects.bulk_update(
+                    chunk,
+                    ["genotype_packed", "phenotype_packed", "ptas_packed"],
+                )
+                chunk = []
+
+        Animal.objects.bulk_update(
+            chunk, ["genotype_packed", "phenotype_packed", "ptas_packed"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0022_animal_packed_traits"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            pack_animal_traits, migrations.RunPython.noop, elidable=True
+        ),
+    ]
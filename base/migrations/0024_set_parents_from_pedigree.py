@@ -0,0 +1,82 @@
+from django.db import migrations
+from django.db.models import Q
+from django.db.models.fields.json import KT
+
+CHUNK_SIZE = 2_000
+
+
+def set_parents_from_pedigree(apps, schema_editor):
+    Animal = apps.get_model("base", "Animal")
+
+    # Only read the parent ids out of the json, not whole pedigrees
+    rows = (
+        Animal.objects.filter(
+            Q(sire__isnull=True, pedigree__sire__id__isnull=False)
+            | Q(dam__isnull=True, pedigree__dam__id__isnull=False)
+        )
+        .annotate(
+            pedigree_sire_id=KT("pedigree__sire__id"),
+            pedigree_dam_id=KT("pedigree__dam__id"),
+        )
+        .values_list(
+            "id",
+            "connectedclass_id",
+            "sire_id",
+            "dam_id",
+            "pedigree_sire_id",
+            "pedigree_dam_id",
+        )
+    )
+
+    def flush(chunk):
+        parent_ids = {
+            int(x) for row in chunk for x in row[4:] if x is not None
+        }
+        existing = dict(
+            Animal.objects.filter(id__in=parent_ids).values_list(
+                "id", "connectedclass_id"
+            )
+        )
+
+        animals = []
+        for id, connectedclass_id, sire_id, dam_id, *parents in chunk:
+            # Only link parents that still exist in the same class
+            pedigree_sire_id, pedigree_dam_id = [
+                int(x)
+                if x is not None and existing.get(int(x)) == connectedclass_id
+                else None
+                for x in parents
+            ]
+
+            animal = Animal(
+                id=id,
+                sire_id=sire_id or pedigree_sire_id,
+                dam_id=dam_id or pedigree_dam_id,
+            )
+            if (animal.sire_id, animal.dam_id) != (sire_id, dam_id):
+                animals.append(animal)
+
+        Animal.objects.bulk_update(animals, ["sire", "dam"])
+
+    chunk = []
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        chunk.append(row)
+
+        if len(chunk) >= CHUNK_SIZE:
+            flush(chunk)
+            chunk = []
+
+    flush(chunk)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0023_pack_animal_traits"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            set_parents_from_pedigree, migrations.RunPython.noop, elidable=True
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0024_set_parents_from_pedigree'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='animal',
+            name='pedigree',
+        ),
+    ]
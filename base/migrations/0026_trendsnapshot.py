@@ -0,0 +1,27 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0025_remove_animal_pedigree'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('population_size', models.IntegerField()),
+                ('net_merit', models.FloatField()),
+                ('genotype', models.JSONField(default=dict)),
+                ('phenotype', models.JSONField(default=dict)),
+                ('ptas', models.JSONField(default=dict)),
+                ('connectedclass', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trend_snapshots', to='base.class')),
+            ],
+        ),
+    ]
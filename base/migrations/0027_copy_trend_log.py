@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from django.db import migrations
+
+CHUNK_SIZE = 2_000
+
+
+def copy_trend_log(apps, schema_editor):
+    Class = apps.get_model("base", "Class")
+    TrendSnapshot = apps.get_model("base", "TrendSnapshot")
+
+    for connectedclass in Class.objects.only("id", "trend_log").iterator(
+        chunk_size=100
+    ):
+        snapshots = [
+            TrendSnapshot(
+                connectedclass_id=connectedclass.id,
+                timestamp=datetime.fromisoformat(capture["timestamp"]),
+                population_size=capture["populationsize"],
+                net_merit=capture["NM$"],
+                genotype=capture.get("genotype", {}),
+                phenotype=capture.get("phenotype", {}),
+                ptas=capture.get("ptas", {}),
+            )
+            for capture in connectedclass.trend_log
+        ]
+
+        TrendSnapshot.objects.bulk_create(snapshots, batch_size=CHUNK_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0026_trendsnapshot"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            copy_trend_log, migrations.RunPython.noop, elidable=True
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:03
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0027_copy_trend_log'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='class',
+            name='trend_log',
+        ),
+    ]
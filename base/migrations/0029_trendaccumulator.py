@@ -0,0 +1,26 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0028_remove_class_trend_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendAccumulator',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('population_size', models.IntegerField(default=0)),
+                ('net_merit', models.FloatField(default=0)),
+                ('genotype', models.JSONField(default=dict)),
+                ('phenotype', models.JSONField(default=dict)),
+                ('ptas', models.JSONField(default=dict)),
+                ('connectedclass', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='trend_accumulator', to='base.class')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0029_trendaccumulator'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='herd',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
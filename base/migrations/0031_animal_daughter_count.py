@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0030_herd_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='animal',
+            name='daughter_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
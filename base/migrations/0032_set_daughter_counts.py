@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def set_daughter_counts(apps, schema_editor):
+    Animal = apps.get_model("base", "Animal")
+
+    def count_daughters(parent):
+        daughters = (
+            Animal.objects.filter(male=False, **{parent: OuterRef("pk")})
+            .order_by()
+            .values(parent)
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        return Coalesce(Subquery(daughters), 0)
+
+    Animal.objects.update(
+        daughter_count=count_daughters("sire") + count_daughters("dam")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0031_animal_daughter_count"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            set_daughter_counts, migrations.RunPython.noop, elidable=True
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0032_set_daughter_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PtaCalculation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genomic_test', models.BooleanField(default=False)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('done', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('connectedclass', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pta_calculations', to='base.class')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0033_ptacalculation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trendaccumulator',
+            name='updates_since_recompute',
+            field=models.IntegerField(default=0),
+        ),
+    ]
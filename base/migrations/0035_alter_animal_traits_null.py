@@ -0,0 +1,28 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0034_trendaccumulator_updates_since_recompute'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='animal',
+            name='genotype',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='animal',
+            name='phenotype',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='animal',
+            name='ptas',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations
+
+from base.traitsets import get_traitset
+
+CHUNK_SIZE = 2_000
+TRAIT_KEYS = ["genotype", "phenotype", "ptas"]
+
+
+def clear_packed_trait_json(apps, schema_editor):
+    Animal = apps.get_model("base", "Animal")
+
+    # Traits that could not be packed keep their json copy
+    for key in TRAIT_KEYS:
+        Animal.objects.filter(**{f"{key}_packed__isnull": False}).update(
+            **{key: None}
+        )
+
+
+def restore_trait_json(apps, schema_editor):
+    Class = apps.get_model("base", "Class")
+    Animal = apps.get_model("base", "Animal")
+
+    for connectedclass in Class.objects.only("id", "traitset"):
+        traitset = get_traitset(connectedclass.traitset)
+
+        animals = Animal.objects.filter(
+            connectedclass_id=connectedclass.id
+        ).only("id", *[f"{key}_packed" for key in TRAIT_KEYS])
+
+        chunk = []
+        for animal in animals.iterator(chunk_size=CHUNK_SIZE):
+            for key in TRAIT_KEYS:
+                packed = getattr(animal, f"{key}_packed")
+                if packed is not None:
+                    setattr(
+                        animal,
+                        key,
+                        traitset.from_trait_array(
+                            traitset.unpack_traits(packed)
+                        ),
+                    )
+
+            chunk.append(animal)
+
+            if len(chunk) >= CHUNK_SIZE:
+                Animal.objects.bulk_update(chunk, TRAIT_KEYS)
+                chunk = []
+
+        Animal.objects.bulk_update(chunk, TRAIT_KEYS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0035_alter_animal_traits_null"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            clear_packed_trait_json, restore_trait_json, elidable=True
+        ),
+    ]
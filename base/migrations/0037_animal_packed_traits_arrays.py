@@ -0,0 +1,99 @@
+from django.db import migrations
+import numpy as np
+
+import base.fields
+
+CHUNK_SIZE = 2_000
+COLUMNS = ["genotype_packed", "phenotype_packed", "ptas_packed"]
+
+
+def convert_column(schema_editor, table, column, db_type, convert):
+    """Replace column by a column of db_type holding convert(value) for
+    each value, a chunk of rows at a time"""
+
+    quote = schema_editor.quote_name
+    converted = quote(f"{column}_converted")
+    table = quote(table)
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {converted} {db_type}")
+
+        last_id = 0
+        while True:
+            cursor.execute(
+                f"SELECT id, {quote(column)} FROM {table}"
+                + f" WHERE id > %s AND {quote(column)} IS NOT NULL"
+                + " ORDER BY id LIMIT %s",
+                [last_id, CHUNK_SIZE],
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            cursor.executemany(
+                f"UPDATE {table} SET {converted} = %s::{db_type}"
+                + " WHERE id = %s",
+                [(convert(value), row_id) for row_id, value in rows],
+            )
+            last_id = rows[-1][0]
+
+        cursor.execute(f"ALTER TABLE {table} DROP COLUMN {quote(column)}")
+        cursor.execute(
+            f"ALTER TABLE {table} RENAME COLUMN {converted}"
+            + f" TO {quote(column)}"
+        )
+
+
+def bytes_to_array(value):
+    return [
+        None if x != x else x
+        for x in np.frombuffer(value, dtype="<f8").tolist()
+    ]
+
+
+def array_to_bytes(value):
+    return np.array(value, dtype="<f8").tobytes()
+
+
+def packed_to_arrays(apps, schema_editor):
+    # Other databases keep storing the packed bytes
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    table = apps.get_model("base", "Animal")._meta.db_table
+    for column in COLUMNS:
+        convert_column(
+            schema_editor, table, column, "double precision[]", bytes_to_array
+        )
+
+
+def arrays_to_packed(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    table = apps.get_model("base", "Animal")._meta.db_table
+    for column in COLUMNS:
+        convert_column(schema_editor, table, column, "bytea", array_to_bytes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0036_clear_packed_animal_trait_json"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(packed_to_arrays, arrays_to_packed),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="animal",
+                    name=column,
+                    field=base.fields.PackedTraitsField(blank=True, null=True),
+                )
+                for column in COLUMNS
+            ],
+        ),
+    ]
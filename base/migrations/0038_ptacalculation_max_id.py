@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0037_animal_packed_traits_arrays'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ptacalculation',
+            name='max_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
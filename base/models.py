@@ -1,24 +1,37 @@
-from collections import defaultdict
+from collections import Counter, defaultdict
+from hashlib import sha1
+import json
+import logging
+from math import ceil
 from random import choice
-from typing import Any, Optional
+from typing import Any, Iterable, Iterator, Optional
 
 import background_task
-import inbreeding_calculator
+import numpy as np
 
 from django.conf import settings
 from django.contrib.admin import ModelAdmin
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models, transaction
+from django.db.models.fields.json import KT
+from django.db.models.functions import Coalesce
 from django.utils.timezone import datetime, now
 from django.core.mail import send_mail
 
 
 from . import names as nms
+from .fields import PackedTraitsField, PackedTraitValue
+from .inbreeding import get_inbreeding_engine
+from .pedigree import get_ancestry_index
+from .ptas import PtaChunk, iter_derived_ptas
 from .templatetags.animal_filters import filter_text_to_default
-from .traitsets import Traitset
+from .traitsets import Traitset, get_traitset
 from .traitsets import traitset
 from .traitsets.traitset import HOMOZYGOUS_CARRIER_KEY
 
+logger = logging.getLogger(__name__)
 
 # Create your models here.
 class Class(models.Model):
@@ -35,6 +48,8 @@ class Class(models.Model):
         search_fields = ["name", "classcode"]
         list_filter = ["traitset"]
 
+    PTA_CHUNK_SIZE = 2_000
+
     name = models.CharField(max_length=255)
     teacher = models.ForeignKey(to=User, on_delete=models.CASCADE)
     traitset = models.CharField(max_length=255)
@@ -44,7 +59,6 @@ class Class(models.Model):
     hide_female_pta = models.BooleanField(default=False)
     recessive_visibility = models.JSONField()
     net_merit_visibility = models.BooleanField(default=True)
-    trend_log = models.JSONField(default=list, blank=True)
     default_animal = models.CharField(max_length=255)
     allow_other_animals = models.BooleanField(default=True)
     allow_herd_rename = models.BooleanField(default=True)
@@ -91,7 +105,7 @@ class Class(models.Model):
         new = cls(name=name, traitset=traitsetname, info=info, teacher=user)
         new.classcode = cls.generate_class_code()
 
-        traitset = Traitset(traitsetname)
+        traitset = get_traitset(traitsetname)
         new.trait_visibility = traitset.get_default_trait_visibility()
         new.recessive_visibility = traitset.get_default_recessive_visibility()
         new.default_animal = traitset.animal_choices[0][0]
@@ -105,9 +119,8 @@ class Class(models.Model):
             connectedclass=new,
         )
 
-        new.update_trend_log(save=False)
-
         new.save()
+        new.update_trend_log()
 
         return new
 
@@ -126,128 +139,113 @@ class Class(models.Model):
 
     def update_trend_log(
         self,
-        save: bool = True,
         new_animals: Optional[list["Animal"]] = None,
         old_animals: Optional[list["Animal"]] = None,
-    ) -> None:
-        """Update the class trend log"""
-
-        if new_animals is not None and old_animals is not None:
-            last = self.trend_log[-1]
-            last_pop = last[nms.POPULATION_SIZE_KEY]
-            new_pop = last_pop - len(old_animals) + len(new_animals)
-
-            capture = {
-                nms.GENOTYPE_KEY: {},
-                nms.PHENOTYPE_KEY: {},
-                nms.PTA_KEY: {},
-            }
-            for key, val in last[nms.GENOTYPE_KEY].items():
-                old_sum = 0
-                for animal in old_animals:
-                    old_sum += animal.genotype[key]
-
-                new_sum = 0
-                for animal in new_animals:
-                    new_sum += animal.genotype[key]
-
-                capture[nms.GENOTYPE_KEY][key] = (
-                    (val * last_pop) - old_sum + new_sum
-                ) / new_pop
-
-            for key, val in last[nms.PHENOTYPE_KEY].items():
-                old_sum = 0
-                for animal in old_animals:
-                    old_sum += animal.phenotype[key] or 0
-
-                new_sum = 0
-                for animal in new_animals:
-                    new_sum += animal.phenotype[key] or 0
-
-                capture[nms.PHENOTYPE_KEY][key] = (
-                    (val * last_pop) - old_sum + new_sum
-                ) / new_pop
-
-            if nms.PTA_KEY in last:
-                for key, val in last[nms.PTA_KEY].items():
-                    old_sum = 0
-                    for animal in old_animals:
-                        old_sum += animal.ptas[key]
-
-                    new_sum = 0
-                    for animal in new_animals:
-                        new_sum += animal.ptas[key]
-
-                    capture[nms.PTA_KEY][key] = (
-                        (val * last_pop) - old_sum + new_sum
-                    ) / new_pop
-
-            old_nm = 0
-            for animal in old_animals:
-                old_nm += animal.net_merit
-
-            new_nm = 0
-            for animal in new_animals:
-                new_nm += animal.net_merit
-
-            last_nm = last[nms.NETMERIT_KEY]
-            capture[nms.NETMERIT_KEY] = (
-                (last_nm * last_pop) - old_nm + new_nm
-            ) / new_pop
-            capture[nms.POPULATION_SIZE_KEY] = new_pop
-
-            capture[nms.TIME_STAMP_KEY] = now().isoformat()
-        else:
-            capture = {
-                nms.GENOTYPE_KEY: defaultdict(int),
-                nms.PHENOTYPE_KEY: defaultdict(int),
-                nms.PTA_KEY: defaultdict(int),
-            }
-            net_merit_capture = 0
-
-            animals = Animal.objects.defer("pedigree").filter(connectedclass=self)
-            num_animals_alive = 0
-            for animal in animals:
-                if animal.herd_id is None:
-                    continue
-                else:
-                    num_animals_alive += 1
-
-                net_merit_capture += animal.net_merit
+    ) -> "TrendSnapshot":
+        """Update the class trend log.
 
-                for key, val in animal.genotype.items():
-                    capture[nms.GENOTYPE_KEY][key] += val
+        With new and old animals only their difference is applied to the
+        class's running sums, otherwise the sums are recomputed from all
+        living animals. Every TrendAccumulator.RECOMPUTE_INTERVAL
+        differences a background recompute is scheduled, so float error
+        does not build up."""
 
-                for key, val in animal.phenotype.items():
-                    capture[nms.PHENOTYPE_KEY][key] += val or 0
+        traitset = get_traitset(self.traitset)
 
-                for key, val in animal.ptas.items():
-                    capture[nms.PTA_KEY][key] += val
-
-            net_merit_capture = net_merit_capture / num_animals_alive
+        if new_animals is not None and old_animals is not None:
+            new_sums = Animal.sum_traits(new_animals, traitset)
+            old_sums = Animal.sum_traits(old_animals, traitset)
+            new_sums[nms.POPULATION_SIZE_KEY] = len(new_animals)
+            old_sums[nms.POPULATION_SIZE_KEY] = len(old_animals)
+
+            # The row lock is held only to apply the difference
+            with transaction.atomic():
+                accumulator = (
+                    TrendAccumulator.objects.select_for_update()
+                    .filter(connectedclass=self)
+                    .first()
+                )
 
-            for key, val in capture[nms.GENOTYPE_KEY].items():
-                capture[nms.GENOTYPE_KEY][key] = val / num_animals_alive
+                if accumulator is not None:
+                    accumulator.add_sums(new_sums, traitset)
+                    accumulator.add_sums(old_sums, traitset, -1)
+                    accumulator.updates_since_recompute += 1
+                    accumulator.save()
+
+                    if (
+                        accumulator.updates_since_recompute
+                        % TrendAccumulator.RECOMPUTE_INTERVAL
+                        == 0
+                    ):
+                        Class.recompute_trend_sums(self.id)
+
+                    return accumulator.create_snapshot()
+
+        with transaction.atomic():
+            accumulator, _created = (
+                TrendAccumulator.objects.select_for_update().get_or_create(
+                    connectedclass=self
+                )
+            )
 
-            for key, val in capture[nms.PHENOTYPE_KEY].items():
-                capture[nms.PHENOTYPE_KEY][key] = val / num_animals_alive
+            # Aggregated under the lock so no concurrent difference is lost
+            # or counted twice
+            sums = Animal.aggregate_traits(
+                Animal.objects.filter(connectedclass=self, herd__isnull=False),
+                traitset,
+            )
+            accumulator.set_sums(sums, traitset)
+            accumulator.save()
 
-            for key, val in capture[nms.PTA_KEY].items():
-                capture[nms.PTA_KEY][key] = val / num_animals_alive
+            return accumulator.create_snapshot()
 
-            capture[nms.TIME_STAMP_KEY] = now().isoformat()
-            capture[nms.POPULATION_SIZE_KEY] = num_animals_alive
-            capture[nms.NETMERIT_KEY] = net_merit_capture
+    @staticmethod
+    @background_task.background(schedule=0)
+    def recompute_trend_sums(connectedclass_id: int):
+        """Recompute the running trend sums of a class from all living
+        animals.
+
+        The animals are aggregated without holding the accumulator's row
+        lock. If a difference was applied meanwhile the result is dropped,
+        and the recompute scheduled after the next
+        TrendAccumulator.RECOMPUTE_INTERVAL differences tries again."""
+
+        connectedclass = Class.objects.get(id=connectedclass_id)
+        traitset = get_traitset(connectedclass.traitset)
+
+        updates = (
+            TrendAccumulator.objects.filter(connectedclass=connectedclass)
+            .values_list("updates_since_recompute", flat=True)
+            .first()
+        )
+        if updates is None:
+            return
+
+        sums = Animal.aggregate_traits(
+            Animal.objects.filter(
+                connectedclass=connectedclass, herd__isnull=False
+            ),
+            traitset,
+        )
 
-        self.trend_log.append(capture)
+        with transaction.atomic():
+            accumulator = TrendAccumulator.objects.select_for_update().get(
+                connectedclass=connectedclass
+            )
+            if accumulator.updates_since_recompute != updates:
+                logger.info(
+                    f"Trend sums of class {connectedclass.id} changed while"
+                    + " being recomputed"
+                )
+                return
 
-        if save:
-            self.save()
+            accumulator.set_sums(sums, traitset)
+            accumulator.save()
 
     def get_animal_file_headers(self) -> list[str]:
         """Get file headers for animal csv file for class"""
 
-        traitset = Traitset(self.traitset)
+        traitset = get_traitset(self.traitset)
 
         return (
             [
@@ -273,7 +271,7 @@ class Class(models.Model):
         self,
     ) -> list[str | tuple[str, str]]:
         """Get animal file column ordering information"""
-        traitset = Traitset(self.traitset)
+        traitset = get_traitset(self.traitset)
         return (
             [
                 nms.ID_KEY,
@@ -295,37 +293,99 @@ class Class(models.Model):
         )
 
     @staticmethod
-    @background_task.background(schedule=0)
-    def recalculate_ptas(connectedclass: int, email: str, genomic_test: bool = False):
-        """Recalculate the PTAs on all male animals"""
-
-        connectedclass = Class.objects.get(id=connectedclass)
-        traitset = Traitset(connectedclass.traitset)
-        sire_daughters = models.Count(
-            "animal_sire", filter=models.Q(animal_sire__male=False)
-        )
-        dam_daughters = models.Count(
-            "animal_dam", filter=models.Q(animal_dam__male=False)
-        )
-        animals = (
-            Animal.objects.annotate(
-                number_of_daughters_sire=sire_daughters,
-                number_of_daughters_dam=dam_daughters,
+    def iter_pta_chunks(
+        connectedclass: "Class",
+        traitset: Traitset,
+        genomic_test: bool,
+        last_id: int = 0,
+        max_id: Optional[int] = None,
+    ) -> Iterator[PtaChunk]:
+        """Yield the living animals of a class after last_id (up to max_id)
+        in chunks, paging by id"""
+
+        animals = Animal.objects.filter(
+            connectedclass=connectedclass, herd__isnull=False
+        ).order_by("id")
+        if max_id is not None:
+            animals = animals.filter(id__lte=max_id)
+
+        while True:
+            rows = list(
+                animals.filter(id__gt=last_id).values_list(
+                    "id",
+                    "genotype_packed",
+                    "genomic_tests",
+                    "daughter_count",
+                )[: Class.PTA_CHUNK_SIZE]
+            )
+            if not rows:
+                return
+
+            ids, packed, genomic_tests, daughter_counts = map(list, zip(*rows))
+            last_id = ids[-1]
+
+            yield PtaChunk(
+                ids,
+                Animal.unpack_trait_rows(
+                    traitset, nms.GENOTYPE_KEY, ids, packed
+                ),
+                np.array(daughter_counts),
+                np.add(genomic_tests, 1 if genomic_test else 0),
             )
-            .defer("pedigree")
-            .filter(connectedclass=connectedclass, herd__isnull=False)
-        )
 
-        for animal in animals:
-            if genomic_test:
-                animal.genomic_tests += 1
+    @staticmethod
+    @background_task.background(schedule=0)
+    def recalculate_ptas(calculation: int, email: str):
+        """Recalculate the PTAs on all living animals, PTA_CHUNK_SIZE animals
+        at a time. Chunks are derived in settings.PTA_PROCESSES worker
+        processes.
+
+        Each chunk is saved together with the calculation's progress, so a
+        retried task resumes after the last saved chunk and never counts a
+        genomic test twice."""
+
+        calculation = PtaCalculation.objects.select_related(
+            "connectedclass"
+        ).get(id=calculation)
+        connectedclass = calculation.connectedclass
+        genomic_test = calculation.genomic_test
+        traitset = get_traitset(connectedclass.traitset)
+
+        chunks = Class.iter_pta_chunks(
+            connectedclass,
+            traitset,
+            genomic_test,
+            calculation.last_id,
+            calculation.max_id,
+        )
+        for chunk, ptas in iter_derived_ptas(
+            traitset.name, chunks, settings.PTA_PROCESSES
+        ):
+            animals = []
+            for animal_id, genomic_tests, values in zip(
+                chunk.ids, chunk.genomic_tests.tolist(), ptas
+            ):
+                animal = Animal(id=animal_id, genomic_tests=genomic_tests)
+                animal.ptas_packed = traitset.pack_trait_array(values)
+                animals.append(animal)
+
+            with transaction.atomic():
+                Animal.objects.bulk_update(
+                    animals, ["genomic_tests", "ptas_packed"]
+                )
+                calculation.add_chunk(chunk.ids)
 
-            animal.recalculate_pta_unsaved(
-                animal.number_of_daughters_sire + animal.number_of_daughters_dam,
-                traitset,
+            logger.info(
+                f"Recalculated PTAs of {calculation.done}/{calculation.total}"
+                + f" animals in class {connectedclass.id}"
             )
 
-        Animal.objects.bulk_update(animals, ["genomic_tests", "ptas"])
+        # Animals that died during the run were left out
+        if calculation.done != calculation.total:
+            calculation.total = calculation.done
+            calculation.save(update_fields=["total"])
+
+        Herd.increment_versions(Herd.objects.filter(connectedclass=connectedclass))
 
         send_mail(
             "Genomic Test Complete" if genomic_test else "PTA Calculation Complete",
@@ -351,9 +411,75 @@ class Herd(models.Model):
             self.recessive_deaths = recessive_deaths
             self.age_deaths = age_deaths
 
+    class Query:
+        """Selection, order and page of herd animals for json_dict"""
+
+        SORT_FIELDS = {
+            nms.ID_KEY: "id",
+            nms.NAME_KEY: "name",
+            nms.GENERATION_KEY: "generation",
+            nms.ASSIGNMENT_KEY: "assignment",
+            nms.INBREEDING_COEFFICIENT_KEY: "inbreeding",
+            nms.SIRE_ID_KEY: "sire_id",
+            nms.DAM_ID_KEY: "dam_id",
+            nms.NETMERIT_KEY: "net_merit",
+        }
+        SORT_TRAIT_KEYS = [
+            nms.GENOTYPE_KEY,
+            nms.PHENOTYPE_KEY,
+            nms.PTA_KEY,
+            nms.RECESSIVES_KEY,
+        ]
+        FIELDS = [
+            nms.ID_KEY,
+            nms.NAME_KEY,
+            nms.GENERATION_KEY,
+            nms.ASSIGNMENT_KEY,
+            nms.DAM_ID_KEY,
+            nms.SIRE_ID_KEY,
+            nms.INBREEDING_COEFFICIENT_KEY,
+            nms.MALE_KEY,
+            nms.NETMERIT_KEY,
+            nms.GENOTYPE_KEY,
+            nms.PHENOTYPE_KEY,
+            nms.PTA_KEY,
+            nms.RECESSIVES_KEY,
+        ]
+        DEFAULT_PER_PAGE = 100
+
+        page: Optional[int]
+        per_page: int
+        sort: str | tuple[str, str]
+        descending: bool
+        contains: str
+        male: Optional[bool]
+        animal_id: Optional[int]
+        fields: Optional[list[str]]
+
+        def __init__(
+            self,
+            page=None,
+            per_page=DEFAULT_PER_PAGE,
+            sort=nms.ID_KEY,
+            descending=False,
+            contains="",
+            male=None,
+            animal_id=None,
+            fields=None,
+        ):
+            self.page = page
+            self.per_page = per_page
+            self.sort = sort
+            self.descending = descending
+            self.contains = contains
+            self.male = male
+            self.animal_id = animal_id
+            self.fields = fields
+
     name = models.CharField(max_length=255)
     connectedclass = models.ForeignKey(to="Class", on_delete=models.CASCADE, null=True)
     breedings = models.IntegerField(default=0)
+    version = models.IntegerField(default=0)
     enrollment = models.ForeignKey(
         to="Enrollment",
         on_delete=models.CASCADE,
@@ -379,22 +505,15 @@ class Herd(models.Model):
         new = cls(name=name, connectedclass=connectedclass)
         new.save()
 
-        male_animals = [
-            Animal.generate_random_unsaved(True, new, traitset, connectedclass)
-            for _ in range(males)
-        ]
-
-        female_animals = [
-            Animal.generate_random_unsaved(False, new, traitset, connectedclass)
-            for _ in range(females)
-        ]
+        animals = Animal.generate_random_batch_unsaved(
+            [True] * males + [False] * females, new, traitset, connectedclass
+        )
 
-        Animal.objects.bulk_create(male_animals + female_animals)
-        for animal in male_animals + female_animals:
+        Animal.objects.bulk_create(animals)
+        for animal in animals:
             animal.finalize_animal_unsaved(new)
-        Animal.objects.bulk_update(
-            male_animals + female_animals, ["name", "pedigree", "inbreeding"]
-        )
+        Animal.objects.bulk_update(animals, ["name"])
+        Animal.add_to_ancestry_cache(animals)
 
         return new
 
@@ -437,120 +556,305 @@ class Herd(models.Model):
             NUMBER_OF_MALES, NUMBER_OF_FEMALES, len(mothers)
         )
 
-        traitset = Traitset(self.connectedclass.traitset)
+        traitset = get_traitset(self.connectedclass.traitset)
         self.breedings += 1
 
-        animals: list[Animal] = []
-        for i in range(total_to_be_born):
-            male = i < num_males
-            sire = sires[i % len(sires)]
-            dam = mothers[i]
-
-            animal = Animal.generate_from_breeding_unsaved(
-                male, self, traitset, self.connectedclass, sire, dam, assignment
-            )
-            animals.append(animal)
+        animals = Animal.generate_from_breeding_batch_unsaved(
+            [i < num_males for i in range(total_to_be_born)],
+            self,
+            traitset,
+            self.connectedclass,
+            [sires[i % len(sires)] for i in range(total_to_be_born)],
+            [mothers[i] for i in range(total_to_be_born)],
+            assignment,
+        )
 
         Animal.objects.bulk_create(animals)
         for animal in animals:
             animal.finalize_animal_unsaved(self)
-        Animal.objects.bulk_update(animals, ["name", "pedigree", "inbreeding"])
-
-        all_animals = Animal.objects.defer("pedigree").filter(herd=self)
-        recessive_deaths = self.collect_positive_fatal_recessive_animals(
-            all_animals, traitset
-        )
-        age_deaths = self.collect_deaths_from_age(all_animals, MAX_AGE)
-        total_dead = set(recessive_deaths + age_deaths)
-        for animal in total_dead:
-            animal.herd = None
+        Animal.objects.bulk_update(animals, ["name"])
+        Animal.add_daughters(animals)
+        Animal.add_to_ancestry_cache(animals)
 
-        Animal.objects.bulk_update(total_dead, ["herd"])
+        dead, results = self.remove_dead_animals(animals, traitset, MAX_AGE)
 
         self.connectedclass.update_trend_log(
-            new_animals=animals, old_animals=total_dead
+            new_animals=animals, old_animals=dead
         )
-        self.save()
+        self.save(update_fields=["breedings"])
+        self.increment_version()
 
-        return self.BreedingResults(len(recessive_deaths), len(age_deaths))
+        return results
 
-    def json_dict(self) -> dict[str, Any]:
-        """Get herd as json serializable dict"""
+    def increment_version(self) -> None:
+        """Mark the cached json of the herd as outdated"""
 
-        animals = (
-            Animal.objects.select_related("connectedclass")
-            .defer("pedigree", "connectedclass__trend_log")
-            .filter(herd=self)
-        )
-        num_animals = animals.count()
+        Herd.increment_versions(Herd.objects.filter(id=self.id))
+
+    @staticmethod
+    def increment_versions(herds: models.QuerySet["Herd"]) -> None:
+        """Mark the cached json of herds as outdated. Call after any change
+        that shows in Herd.json_dict."""
+
+        herds.update(version=models.F("version") + 1)
+
+    def get_json_key(self, query_string: str = "") -> str:
+        """Get a key for the json of this version of the herd, as fetched
+        with query_string"""
+
+        digest = sha1(query_string.encode()).hexdigest()[:16]
+        return f"{self.id}-{self.version}-{digest}"
+
+    def get_cached_json(
+        self, query: Optional[Query] = None, query_string: str = ""
+    ) -> bytes:
+        """Get json_dict(query) serialized, from the cache when this
+        version of the herd was serialized before"""
+
+        JSON_CACHE_SECONDS = 60 * 60
+
+        key = f"herd-json-{self.get_json_key(query_string)}"
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+        data = json.dumps(
+            self.json_dict(query), cls=DjangoJSONEncoder
+        ).encode()
+
+        # A change committed while serializing may be part of data, which
+        # must then not be cached under this version
+        if Herd.objects.filter(id=self.id, version=self.version).exists():
+            cache.set(key, data, JSON_CACHE_SECONDS)
+
+        return data
+
+    def get_summary(
+        self, sums: dict[str, np.ndarray | float], num_animals: int
+    ) -> dict[str, Any]:
+        """Get the visible trait means of the herd from its trait sums"""
+
+        traitset = get_traitset(self.connectedclass.traitset)
 
         summary = {
-            nms.GENOTYPE_KEY: defaultdict(int),
-            nms.PHENOTYPE_KEY: defaultdict(int),
-            nms.PTA_KEY: defaultdict(int),
+            nms.GENOTYPE_KEY: {},
+            nms.PHENOTYPE_KEY: {},
+            nms.PTA_KEY: {},
             nms.NETMERIT_KEY: 0,
         }
 
         if num_animals > 0:
-            for animal in animals:
-                summary[nms.NETMERIT_KEY] += animal.net_merit
-                for key, val in animal.genotype.items():
-                    if self.connectedclass.trait_visibility[key][0]:
-                        summary[nms.GENOTYPE_KEY][key] += val
-                for key, val in animal.phenotype.items():
-                    if self.connectedclass.trait_visibility[key][1]:
-                        summary[nms.PHENOTYPE_KEY][key] += val or 0
-                for key, val in animal.ptas.items():
-                    if self.connectedclass.trait_visibility[key][2]:
-                        summary[nms.PTA_KEY][key] += val
-
-            summary[nms.NETMERIT_KEY] = summary[nms.NETMERIT_KEY] / num_animals
-
-            for key, val in summary[nms.GENOTYPE_KEY].items():
-                summary[nms.GENOTYPE_KEY][key] = val / num_animals
+            visibility = self.connectedclass.trait_visibility
 
-            for key, val in summary[nms.PHENOTYPE_KEY].items():
-                summary[nms.PHENOTYPE_KEY][key] = val / num_animals
+            for visibility_idx, key in enumerate(
+                [nms.GENOTYPE_KEY, nms.PHENOTYPE_KEY, nms.PTA_KEY]
+            ):
+                summary[key] = {
+                    uid: float(sums[key][idx]) / num_animals
+                    for idx, uid in enumerate(traitset.trait_uids)
+                    if visibility[uid][visibility_idx]
+                }
 
-            for key, val in summary[nms.PTA_KEY].items():
-                summary[nms.PTA_KEY][key] = val / num_animals
+            summary[nms.NETMERIT_KEY] = sums[nms.NETMERIT_KEY] / num_animals
 
         if not self.connectedclass.net_merit_visibility:
             summary.pop(nms.NETMERIT_KEY)
 
+        return summary
+
+    def query_animal_ids(self, query: Query) -> list[int]:
+        """Get the ids of the animals of the herd selected and ordered by
+        query. Trait sorts run in the database on Postgres, elsewhere over
+        the packed traits with the order cached per herd version."""
+
+        animals = Animal.objects.filter(herd=self)
+
+        if query.contains:
+            animals = animals.filter(name__icontains=query.contains)
+
+        if query.male is not None:
+            animals = animals.filter(male=query.male)
+
+        if query.animal_id is not None:
+            animals = animals.filter(id=query.animal_id)
+
+        if type(query.sort) is not tuple:
+            expression = models.F(self.Query.SORT_FIELDS[query.sort])
+        elif query.sort[0] == nms.RECESSIVES_KEY:
+            expression = KT(f"{nms.RECESSIVES_KEY}__{query.sort[1]}")
+        elif connections[animals.db].vendor == "postgresql":
+            key, uid = query.sort
+            traitset = get_traitset(self.connectedclass.traitset)
+            expression = PackedTraitValue(
+                f"{key}_packed", traitset.trait_indexes[uid]
+            )
+        else:
+            order = self.get_cached_trait_order(query)
+            if (
+                query.contains
+                or query.male is not None
+                or query.animal_id is not None
+            ):
+                selected = set(animals.values_list("id", flat=True))
+                order = [x for x in order if x in selected]
+
+            return order
+
+        expression = (
+            expression.desc(nulls_last=True)
+            if query.descending
+            else expression.asc(nulls_last=True)
+        )
+
+        return list(
+            animals.order_by(expression, "id").values_list("id", flat=True)
+        )
+
+    def get_cached_trait_order(self, query: Query) -> list[int]:
+        """Get the ids of all animals of the herd ordered by the packed
+        trait values of query.sort, from the cache when this version of
+        the herd was sorted that way before. Like the database sorts,
+        unknown values come last and ties are ordered by id."""
+
+        SORT_CACHE_SECONDS = 60 * 60
+
+        key, uid = query.sort
+        cache_key = (
+            f"herd-sort-{self.id}-{self.version}-{key}-{uid}"
+            + f"-{int(query.descending)}"
+        )
+        order = cache.get(cache_key)
+        if order is not None:
+            return order
+
+        traitset = get_traitset(self.connectedclass.traitset)
+        rows = list(
+            Animal.objects.filter(herd=self)
+            .order_by("id")
+            .values_list("id", f"{key}_packed")
+        )
+        if not rows:
+            return []
+
+        ids, packed = map(list, zip(*rows))
+        values = Animal.unpack_trait_rows(traitset, key, ids, packed)[
+            :, traitset.trait_indexes[uid]
+        ]
+
+        # Sorts are stable and nan sorts last either way
+        order = np.array(ids)[
+            np.argsort(-values if query.descending else values, kind="stable")
+        ].tolist()
+
+        # As in get_cached_json, only cache an order of this version
+        if Herd.objects.filter(id=self.id, version=self.version).exists():
+            cache.set(cache_key, order, SORT_CACHE_SECONDS)
+
+        return order
+
+    def json_dict(self, query: Optional[Query] = None) -> dict[str, Any]:
+        """Get herd as json serializable dict.
+
+        With a query only the selected page of animals is included, in
+        query order (listed under "order"), with only the query fields.
+        The summary always covers the whole herd."""
+
+        traitset = get_traitset(self.connectedclass.traitset)
+
+        if query is None:
+            animals = list(Animal.objects.filter(herd=self))
+
+            return {
+                nms.NAME_KEY: self.name,
+                "connectedclass": self.connectedclass_id,
+                "breedings": self.breedings,
+                "animals": AnimalSerializer(self.connectedclass).serialize_all(
+                    animals
+                ),
+                "summary": self.get_summary(
+                    Animal.sum_traits(animals, traitset), len(animals)
+                ),
+            }
+
+        sums = Animal.aggregate_traits(
+            Animal.objects.filter(herd=self), traitset
+        )
+
+        ids = self.query_animal_ids(query)
+        count = len(ids)
+        if query.page is not None:
+            start = (query.page - 1) * query.per_page
+            ids = ids[start : start + query.per_page]
+
+        animals_by_id = Animal.objects.in_bulk(ids)
+        animals = [animals_by_id[x] for x in ids]
+        serializer = AnimalSerializer(self.connectedclass, query.fields)
+        serialized = serializer.serialize_all(animals)
+
         return {
             nms.NAME_KEY: self.name,
             "connectedclass": self.connectedclass_id,
             "breedings": self.breedings,
-            "animals": {x.id: x.json_dict() for x in animals},
-            "summary": summary,
+            "animals": serialized,
+            "order": [x.id for x in animals],
+            "count": count,
+            "page": query.page,
+            "pages": (
+                1
+                if query.page is None
+                else max(ceil(count / query.per_page), 1)
+            ),
+            "summary": self.get_summary(sums, sums[nms.POPULATION_SIZE_KEY]),
         }
 
-    def collect_positive_fatal_recessive_animals(
-        self, animals: list["Animal"], traitset: Traitset
-    ) -> list["Animal"]:
-        """Get a list of all animals with fatal genetic recessives"""
-
-        dead = []
-        for animal in animals:
-            for key, val in animal.recessives.items():
-                if val == HOMOZYGOUS_CARRIER_KEY:
-                    if traitset.find_recessive_or_null(key).fatal:
-                        dead.append(animal)
+    def remove_dead_animals(
+        self, calves: list["Animal"], traitset: Traitset, max_age: int
+    ) -> tuple[list["Animal"], BreedingResults]:
+        """Take the animals that die after a breeding out of the herd.
+
+        New calves are checked for fatal recessives in memory. The rest of
+        the herd is only read for animals that are too old or that still
+        carry a fatal recessive (starter herd animals), in one query."""
+
+        fatal = models.Q()
+        for uid in traitset.fatal_recessive_uids:
+            fatal |= models.Q(**{f"recessives__{uid}": HOMOZYGOUS_CARRIER_KEY})
+        too_old = models.Q(generation__lte=self.breedings - max_age)
+
+        older = (
+            Animal.objects.filter(herd=self)
+            .filter(too_old | fatal)
+            .exclude(id__in=[x.id for x in calves])
+            .only(
+                "generation",
+                "recessives",
+                "net_merit",
+                "genotype_packed",
+                "phenotype_packed",
+                "ptas_packed",
+            )
+        )
 
-        return dead
+        dead = [x for x in calves if self.has_fatal_recessive(x, traitset)]
+        recessive_deaths = len(dead)
+        age_deaths = 0
+        for animal in older:
+            dead.append(animal)
+            recessive_deaths += self.has_fatal_recessive(animal, traitset)
+            age_deaths += self.breedings - animal.generation >= max_age
 
-    def collect_deaths_from_age(
-        self, animals: list["Animal"], maxage: int
-    ) -> list["Animal"]:
-        """Get a list of all animals that are too old"""
+        Animal.objects.filter(id__in=[x.id for x in dead]).update(herd=None)
+        for animal in dead:
+            animal.herd = None
 
-        dead = []
-        for animal in animals:
-            if self.breedings - animal.generation >= maxage:
-                dead.append(animal)
+        return dead, self.BreedingResults(recessive_deaths, age_deaths)
 
-        return dead
+    @staticmethod
+    def has_fatal_recessive(animal: "Animal", traitset: Traitset) -> bool:
+        return any(
+            animal.recessives.get(x) == HOMOZYGOUS_CARRIER_KEY
+            for x in traitset.fatal_recessive_uids
+        )
 
 
 class Enrollment(models.Model):
@@ -584,7 +888,7 @@ class Enrollment(models.Model):
     def create_from_enrollment_request(
         cls, enrollment_request: "EnrollmentRequest"
     ) -> "Enrollment":
-        traitset = Traitset(enrollment_request.connectedclass.traitset)
+        traitset = get_traitset(enrollment_request.connectedclass.traitset)
 
         name = cls.generate_herd_from_team_name(
             enrollment_request.student.get_full_name()
@@ -604,8 +908,7 @@ class Enrollment(models.Model):
 
         enrollment_request.delete()
         new.connectedclass.update_trend_log(
-            save=False,
-            new_animals=Animal.objects.defer("pedigree").filter(herd=new.herd),
+            new_animals=Animal.objects.filter(herd=new.herd),
             old_animals=[],
         )
         new.connectedclass.decrement_enrollment_tokens()
@@ -635,7 +938,12 @@ class Enrollment(models.Model):
         json = {}
 
         assignments = Assignment.objects.prefetch_related(
-            "assignmentstep_assignment"
+            "assignmentstep_assignment",
+            models.Prefetch(
+                "assignmentfulfillment_set",
+                AssignmentFulfillment.objects.filter(enrollment=self),
+                to_attr="enrollment_fulfillments",
+            ),
         ).filter(
             connectedclass=self.connectedclass,
             startdate__lte=now(),
@@ -654,9 +962,9 @@ class Enrollment(models.Model):
                         key=lambda y: y.number,
                     )
                 ],
-                "fulfillment": AssignmentFulfillment.objects.get(
-                    enrollment=self, assignment=assignment
-                ).current_step,
+                "fulfillment": assignment.enrollment_fulfillments[
+                    0
+                ].current_step,
             }
 
         return json
@@ -711,12 +1019,21 @@ class Animal(models.Model):
     generation = models.IntegerField(default=0)
     male = models.BooleanField()
     genomic_tests = models.IntegerField(default=0)
-
-    genotype = models.JSONField()
-    phenotype = models.JSONField()
-    ptas = models.JSONField()
+    # Number of female offspring, kept up to date by Herd.breed_herd
+    daughter_count = models.IntegerField(default=0)
+
+    # Only kept for animals whose traits could not be packed, see
+    # get_trait_array. Read traits with get_trait_array or get_traits.
+    genotype = models.JSONField(null=True, blank=True)
+    phenotype = models.JSONField(null=True, blank=True)
+    ptas = models.JSONField(null=True, blank=True)
     recessives = models.JSONField()
 
+    # float64 genotype, phenotype & ptas in traitset trait order
+    genotype_packed = PackedTraitsField(null=True, blank=True)
+    phenotype_packed = PackedTraitsField(null=True, blank=True)
+    ptas_packed = PackedTraitsField(null=True, blank=True)
+
     sire = models.ForeignKey(
         to="Animal",
         on_delete=models.SET_NULL,
@@ -732,7 +1049,6 @@ class Animal(models.Model):
         related_name="animal_dam",
     )
 
-    pedigree = models.JSONField()
     inbreeding = models.FloatField(default=0)
     net_merit = models.FloatField()
 
@@ -745,67 +1061,344 @@ class Animal(models.Model):
     ) -> "Animal":
         new = cls(male=male, herd=herd, connectedclass=connectedclass)
 
-        new.genotype = traitset.get_random_genotype()
-        new.net_merit = traitset.derive_net_merit_from_genotype(new.genotype)
+        genotype = traitset.get_random_genotype()
+        new.net_merit = traitset.derive_net_merit_from_genotype(genotype)
 
-        new.phenotype = (
+        phenotype = (
             traitset.get_null_phenotype()
             if male
-            else traitset.derive_phenotype_from_genotype(new.genotype, new.inbreeding)
+            else traitset.derive_phenotype_from_genotype(genotype, new.inbreeding)
         )
 
-        new.ptas = traitset.derive_ptas_from_genotype(
-            new.genotype, 0, new.genomic_tests
+        ptas = traitset.derive_ptas_from_genotype(
+            genotype, 0, new.genomic_tests
         )
         new.recessives = traitset.get_random_recessives()
-        new.pedigree = {
-            nms.SIRE_ID_KEY: None,
-            nms.DAM_ID_KEY: None,
-            nms.ID_KEY: None,
-        }
+
+        new.genotype_packed = traitset.pack_traits(genotype)
+        new.phenotype_packed = traitset.pack_traits(phenotype)
+        new.ptas_packed = traitset.pack_traits(ptas)
 
         return new
 
     @classmethod
-    def generate_from_breeding_unsaved(
+    def generate_random_batch_unsaved(
         cls,
-        male: bool,
+        males: list[bool],
         herd: Herd,
         traitset: Traitset,
         connectedclass: Class,
-        sire: "Animal",
-        dam: "Animal",
+    ) -> list["Animal"]:
+        """Create a random animal for each entry of males using vectorized
+        traitset calls for the whole batch"""
+
+        genotypes = traitset.get_random_genotypes(len(males))
+        phenotypes = traitset.derive_phenotypes_from_genotypes(
+            genotypes, np.zeros(len(males))
+        )
+        ptas = traitset.derive_ptas_from_genotypes(genotypes, 0, 0)
+        net_merits = traitset.derive_net_merits_from_genotypes(genotypes)
+        null_phenotype = traitset.pack_traits(traitset.get_null_phenotype())
+
+        animals = []
+        for idx, male in enumerate(males):
+            new = cls(male=male, herd=herd, connectedclass=connectedclass)
+            new.genotype_packed = traitset.pack_trait_array(genotypes[idx])
+            new.net_merit = float(net_merits[idx])
+            new.phenotype_packed = (
+                null_phenotype
+                if male
+                else traitset.pack_trait_array(phenotypes[idx])
+            )
+            new.ptas_packed = traitset.pack_trait_array(ptas[idx])
+            new.recessives = traitset.get_random_recessives()
+            animals.append(new)
+
+        return animals
+
+    @classmethod
+    def generate_from_breeding_batch_unsaved(
+        cls,
+        males: list[bool],
+        herd: Herd,
+        traitset: Traitset,
+        connectedclass: Class,
+        sires: list["Animal"],
+        dams: list["Animal"],
         assignment: str,
-    ) -> "Animal":
-        new = cls(male=male, herd=herd, connectedclass=connectedclass)
-        new.pedigree = {
-            nms.SIRE_ID_KEY: sire.pedigree,
-            nms.DAM_ID_KEY: dam.pedigree,
-            nms.ID_KEY: None,
+    ) -> list["Animal"]:
+        """Breed sires[i] with dams[i] for each i using one vectorized
+        traitset.breed call for the whole batch"""
+
+        inbreedings = get_inbreeding_engine(
+            connectedclass.id
+        ).get_offspring_inbreedings(
+            (sire.id, dam.id) for sire, dam in zip(sires, dams, strict=True)
+        )
+
+        animals = []
+        for male, sire, dam, inbreeding in zip(
+            males, sires, dams, inbreedings, strict=True
+        ):
+            new = cls(male=male, herd=herd, connectedclass=connectedclass)
+            new.inbreeding = inbreeding
+            new.sire = sire
+            new.dam = dam
+            new.recessives = traitset.get_recessives_from_breeding(
+                sire.recessives, dam.recessives
+            )
+            new.generation = herd.breedings
+            new.assignment = assignment
+            animals.append(new)
+
+        batch = traitset.breed(
+            Animal.get_trait_matrix(sires, nms.GENOTYPE_KEY, traitset),
+            Animal.get_trait_matrix(dams, nms.GENOTYPE_KEY, traitset),
+            np.array([x.inbreeding for x in animals], dtype=np.float64),
+        )
+
+        for idx, new in enumerate(animals):
+            new.genotype_packed = traitset.pack_trait_array(
+                batch.genotypes[idx]
+            )
+            new.net_merit = float(batch.net_merits[idx])
+            new.phenotype_packed = traitset.pack_trait_array(
+                new.dam.get_trait_array(nms.PHENOTYPE_KEY, traitset)
+                if new.male
+                else batch.phenotypes[idx]
+            )
+            new.ptas_packed = traitset.pack_trait_array(batch.ptas[idx])
+
+        return animals
+
+    def get_trait_array(self, key: str, traitset: Traitset) -> np.ndarray:
+        """Get genotype, phenotype or ptas (by nms key) as an array in
+        traitset order. Unknown phenotypes are nan. Animals that could not
+        be packed by migration 0023 fall back to their json traits."""
+
+        packed = getattr(self, f"{key}_packed")
+        if packed is None:
+            return traitset.to_trait_array(getattr(self, key))
+
+        return traitset.unpack_traits(packed)
+
+    def get_traits(
+        self, key: str, traitset: Traitset
+    ) -> dict[str, float | None]:
+        """Get genotype, phenotype or ptas (by nms key) by trait uid.
+        Unknown phenotypes are None."""
+
+        return traitset.from_trait_array(self.get_trait_array(key, traitset))
+
+    @staticmethod
+    def sum_traits(
+        animals: Iterable["Animal"], traitset: Traitset
+    ) -> dict[str, np.ndarray | float]:
+        """Sum genotype, phenotype and ptas (as arrays in traitset order)
+        and net merit over animals. Unknown phenotypes count as 0."""
+
+        animals = list(animals)
+        sums = {
+            key: np.nansum(
+                Animal.get_trait_matrix(animals, key, traitset), axis=0
+            )
+            for key in [nms.GENOTYPE_KEY, nms.PHENOTYPE_KEY, nms.PTA_KEY]
         }
-        new.genotype = traitset.get_genotype_from_breeding(sire.genotype, dam.genotype)
-        new.net_merit = traitset.derive_net_merit_from_genotype(new.genotype)
-        new.inbreeding = inbreeding_calculator.InbreedingCalculator(
-            new.pedigree
-        ).get_coefficient()
-        new.sire = sire
-        new.dam = dam
-
-        new.phenotype = (
-            dam.phenotype
-            if male
-            else traitset.derive_phenotype_from_genotype(new.genotype, new.inbreeding)
+        sums[nms.NETMERIT_KEY] = sum(x.net_merit for x in animals)
+
+        return sums
+
+    @staticmethod
+    def aggregate_traits(
+        animals: models.QuerySet["Animal"], traitset: Traitset
+    ) -> dict[str, np.ndarray | float | int]:
+        """Like sum_traits, for a queryset, without loading the animals.
+        Also counts them under nms.POPULATION_SIZE_KEY. Sums run in the
+        database on Postgres and over the packed traits elsewhere."""
+
+        if connections[animals.db].vendor == "postgresql":
+            return Animal.aggregate_traits_in_database(animals, traitset)
+
+        return Animal.aggregate_packed_traits(animals, traitset)
+
+    @staticmethod
+    def aggregate_traits_in_database(
+        animals: models.QuerySet["Animal"], traitset: Traitset
+    ) -> dict[str, np.ndarray | float | int]:
+        keys = [nms.GENOTYPE_KEY, nms.PHENOTYPE_KEY, nms.PTA_KEY]
+
+        aggregates = {
+            f"{key}_{idx}": Coalesce(
+                models.Sum(PackedTraitValue(f"{key}_packed", idx)), 0.0
+            )
+            for key in keys
+            for idx in range(len(traitset.trait_uids))
+        }
+        aggregates["net_merit_sum"] = Coalesce(models.Sum("net_merit"), 0.0)
+        aggregates["population"] = models.Count("id")
+
+        result = (
+            animals.filter(genotype_packed__isnull=False)
+            .order_by()
+            .aggregate(**aggregates)
         )
 
-        new.ptas = traitset.derive_ptas_from_genotype(new.genotype, 0, 0)
+        sums = {
+            key: np.array(
+                [
+                    result[f"{key}_{idx}"]
+                    for idx in range(len(traitset.trait_uids))
+                ],
+                dtype=np.float64,
+            )
+            for key in keys
+        }
+        sums[nms.NETMERIT_KEY] = result["net_merit_sum"]
+        sums[nms.POPULATION_SIZE_KEY] = result["population"]
+
+        Animal.add_unpacked_sums(sums, animals, traitset)
+
+        return sums
+
+    @staticmethod
+    def aggregate_packed_traits(
+        animals: models.QuerySet["Animal"], traitset: Traitset
+    ) -> dict[str, np.ndarray | float | int]:
+        CHUNK_SIZE = 5_000
+
+        keys = [nms.GENOTYPE_KEY, nms.PHENOTYPE_KEY, nms.PTA_KEY]
+        packed_fields = [f"{key}_packed" for key in keys]
+
+        sums = {key: np.zeros(len(traitset.trait_uids)) for key in keys}
+        sums[nms.NETMERIT_KEY] = 0.0
+        sums[nms.POPULATION_SIZE_KEY] = 0
+
+        def add(chunk):
+            for idx, key in enumerate(keys):
+                sums[key] += np.nansum(
+                    traitset.unpack_trait_matrix([x[idx] for x in chunk]),
+                    axis=0,
+                )
+            sums[nms.NETMERIT_KEY] += sum(x[-1] for x in chunk)
+            sums[nms.POPULATION_SIZE_KEY] += len(chunk)
+
+        chunk = []
+        for row in (
+            animals.filter(genotype_packed__isnull=False)
+            .order_by()
+            .values_list(*packed_fields, "net_merit")
+            .iterator(chunk_size=CHUNK_SIZE)
+        ):
+            chunk.append(row)
+            if len(chunk) >= CHUNK_SIZE:
+                add(chunk)
+                chunk = []
+
+        if chunk:
+            add(chunk)
+
+        Animal.add_unpacked_sums(sums, animals, traitset)
 
-        new.recessives = traitset.get_recessives_from_breeding(
-            sire.recessives, dam.recessives
+        return sums
+
+    @staticmethod
+    def add_unpacked_sums(
+        sums: dict[str, np.ndarray | float | int],
+        animals: models.QuerySet["Animal"],
+        traitset: Traitset,
+    ) -> None:
+        """Add the animals that could not be packed to sums of the packed
+        ones, from their json traits"""
+
+        keys = [nms.GENOTYPE_KEY, nms.PHENOTYPE_KEY, nms.PTA_KEY]
+
+        unpacked = animals.filter(genotype_packed__isnull=True).only(
+            "net_merit", *keys, *[f"{key}_packed" for key in keys]
         )
-        new.generation = herd.breedings
-        new.assignment = assignment
+        unpacked_sums = Animal.sum_traits(unpacked, traitset)
+        for key in keys + [nms.NETMERIT_KEY]:
+            sums[key] += unpacked_sums[key]
+        sums[nms.POPULATION_SIZE_KEY] += len(unpacked)
 
-        return new
+    @staticmethod
+    def add_daughters(animals: Iterable["Animal"]) -> None:
+        """Count new animals in the daughter_count of their parents"""
+
+        daughters = Counter(
+            parent_id
+            for animal in animals
+            if not animal.male
+            for parent_id in [animal.sire_id, animal.dam_id]
+            if parent_id is not None
+        )
+
+        parents_by_count = defaultdict(list)
+        for parent_id, count in daughters.items():
+            parents_by_count[count].append(parent_id)
+
+        for count, parent_ids in parents_by_count.items():
+            Animal.objects.filter(id__in=parent_ids).update(
+                daughter_count=models.F("daughter_count") + count
+            )
+
+    @staticmethod
+    def rebuild_daughter_counts(animals: models.QuerySet["Animal"]) -> int:
+        """Recount the daughters of animals from their offspring. Returns
+        the number of animals updated."""
+
+        def count_daughters(parent: str):
+            daughters = (
+                Animal.objects.filter(male=False, **{parent: models.OuterRef("pk")})
+                .order_by()
+                .values(parent)
+                .annotate(count=models.Count("id"))
+                .values("count")
+            )
+            return Coalesce(models.Subquery(daughters), 0)
+
+        return animals.update(
+            daughter_count=count_daughters("sire") + count_daughters("dam")
+        )
+
+    @staticmethod
+    def unpack_trait_rows(
+        traitset: Traitset,
+        key: str,
+        ids: list[int],
+        packed: list[Optional[bytes | memoryview]],
+    ) -> np.ndarray:
+        """Get the (animals x traits) matrix of key for animals ids from
+        their packed values. Animals without packed values fall back to
+        their trait dicts."""
+
+        missing = [x for x, values in zip(ids, packed) if values is None]
+        if missing:
+            values = dict(
+                Animal.objects.filter(id__in=missing).values_list("id", key)
+            )
+            packed = [
+                traitset.pack_traits(values[x]) if y is None else y
+                for x, y in zip(ids, packed)
+            ]
+
+        return traitset.unpack_trait_matrix(packed)
+
+    @staticmethod
+    def get_trait_matrix(
+        animals: Iterable["Animal"], key: str, traitset: Traitset
+    ) -> np.ndarray:
+        """Get genotype, phenotype or ptas (by nms key) of animals as an
+        (animals x traits) matrix"""
+
+        animals = list(animals)
+        packed = [getattr(x, f"{key}_packed") for x in animals]
+        if all(x is not None for x in packed):
+            return traitset.unpack_trait_matrix(packed)
+
+        return np.array(
+            [x.get_trait_array(key, traitset) for x in animals],
+            dtype=np.float64,
+        ).reshape(len(animals), len(traitset.trait_uids))
 
     def finalize_animal_unsaved(self, herd: Herd) -> None:
         if herd.name[-1].lower() == "s":
@@ -813,7 +1406,37 @@ class Animal(models.Model):
         else:
             self.name = herd.name + "'s " + str(self.id)
 
-        self.pedigree["id"] = self.id
+    @staticmethod
+    def add_to_ancestry_cache(animals: list["Animal"]) -> None:
+        """Add newly created animals to the cached ancestry indexes and
+        inbreeding engines of their classes once the transaction creating
+        them commits, as their ids are not kept if it rolls back"""
+
+        entries = [
+            (x.connectedclass_id, x.id, x.sire_id, x.dam_id, x.inbreeding)
+            for x in animals
+        ]
+
+        def add():
+            for connectedclass_id, animal_id, sire_id, dam_id, inbreeding in (
+                entries
+            ):
+                get_ancestry_index(connectedclass_id).add(
+                    animal_id, sire_id, dam_id
+                )
+                get_inbreeding_engine(connectedclass_id).add(
+                    animal_id, inbreeding
+                )
+
+        transaction.on_commit(add)
+
+    def get_pedigree(self, depth: Optional[int] = None) -> dict[str, Any]:
+        """Get the nested {sire, dam, id} pedigree, depth generations back
+        (all generations if depth is None)"""
+
+        return get_ancestry_index(self.connectedclass_id).get_pedigree(
+            self.id, depth
+        )
 
     def resolve_data_key(
         self,
@@ -821,63 +1444,62 @@ class Animal(models.Model):
         connectedclass: Optional[Class] = None,
     ) -> Any:
         class_traitset = (
-            None if connectedclass is None else Traitset(connectedclass.traitset)
+            None if connectedclass is None else get_traitset(connectedclass.traitset)
         )
 
+        def get_traits(key):
+            animal_traitset = (
+                get_traitset(self.connectedclass.traitset)
+                if class_traitset is None
+                else class_traitset
+            )
+            return self.get_traits(key, animal_traitset)
+
+        def get_trait_filter(uid):
+            return class_traitset.traits_by_uid[uid].animals[
+                connectedclass.default_animal
+            ]
+
         def adjust_gen(val, uid):
             return (
                 val
                 if class_traitset is None
-                else val
-                * class_traitset.find_trait_or_null(uid)
-                .animals[connectedclass.default_animal]
-                .standard_deviation
+                else val * get_trait_filter(uid).standard_deviation
             )
 
         def adjust_phen(val, uid):
+            if class_traitset is None or val is None:
+                return val
+
+            trait_filter = get_trait_filter(uid)
             return (
-                val
-                if class_traitset is None
-                else (
-                    val
-                    * class_traitset.find_trait_or_null(uid)
-                    .animals[connectedclass.default_animal]
-                    .standard_deviation
-                    * 2
-                    + class_traitset.find_trait_or_null(uid)
-                    .animals[connectedclass.default_animal]
-                    .phenotype_average
-                    if val is not None
-                    else None
-                )
+                val * trait_filter.standard_deviation * 2
+                + trait_filter.phenotype_average
             )
 
         def adjust_pta(val, uid):
+            if class_traitset is None:
+                return val
+
+            trait_filter = get_trait_filter(uid)
             return (
-                val
-                if class_traitset is None
-                else val
-                * class_traitset.find_trait_or_null(uid)
-                .animals[connectedclass.default_animal]
-                .standard_deviation
-                * 2
-                + class_traitset.find_trait_or_null(uid)
-                .animals[connectedclass.default_animal]
-                .phenotype_average
+                val * trait_filter.standard_deviation * 2
+                + trait_filter.phenotype_average
             )
 
         if type(data_key) is tuple:
-            match data_key[0]:
+            key, uid = data_key
+            match key:
                 case nms.GENOTYPE_KEY:
-                    return adjust_gen(self.genotype[data_key[1]], data_key[1])
+                    return adjust_gen(get_traits(key)[uid], uid)
                 case nms.PHENOTYPE_KEY:
-                    return adjust_phen(self.phenotype[data_key[1]], data_key[1])
+                    return adjust_phen(get_traits(key)[uid], uid)
                 case nms.RECESSIVES_KEY:
-                    return self.recessives[data_key[1]]
+                    return self.recessives[uid]
                 case nms.PTA_KEY:
-                    return adjust_pta(self.ptas[data_key[1]], data_key[1])
+                    return adjust_pta(get_traits(key)[uid], uid)
                 case nms.FORMATTED_RECESSIVES_KEY:
-                    match self.recessives[data_key[1]]:
+                    match self.recessives[uid]:
                         case traitset.HOMOZYGOUS_FREE_KEY:
                             return "Tested Free"
                         case traitset.HOMOZYGOUS_CARRIER_KEY:
@@ -908,10 +1530,8 @@ class Animal(models.Model):
                     return self.inbreeding
                 case nms.INBREEDING_PERCENTAGE_KEY:
                     return self.inbreeding * 100
-                case nms.GENOTYPE_KEY:
-                    return self.genotype
-                case nms.PHENOTYPE_KEY:
-                    return self.phenotype
+                case nms.GENOTYPE_KEY | nms.PHENOTYPE_KEY:
+                    return get_traits(data_key)
                 case nms.RECESSIVES_KEY:
                     return self.recessives
                 case nms.MALE_KEY:
@@ -940,20 +1560,26 @@ class Animal(models.Model):
         for data_key in data_keys:
             json[data_key] = self.resolve_data_key(data_key)
 
+        traitset = get_traitset(self.connectedclass.traitset)
+        genotype, phenotype, ptas = (
+            self.get_traits(x, traitset)
+            for x in [nms.GENOTYPE_KEY, nms.PHENOTYPE_KEY, nms.PTA_KEY]
+        )
+
         return json | {
             nms.GENOTYPE_KEY: {
                 key: val
-                for key, val in self.genotype.items()
+                for key, val in genotype.items()
                 if self.connectedclass.trait_visibility[key][0]
             },
             nms.PHENOTYPE_KEY: {
                 key: val
-                for key, val in self.phenotype.items()
+                for key, val in phenotype.items()
                 if self.connectedclass.trait_visibility[key][1]
             },
             nms.PTA_KEY: {
                 key: val
-                for key, val in self.ptas.items()
+                for key, val in ptas.items()
                 if self.connectedclass.trait_visibility[key][2]
                 and (self.male or not self.connectedclass.hide_female_pta)
             },
@@ -965,9 +1591,12 @@ class Animal(models.Model):
         }
 
     def recalculate_pta_unsaved(self, number_of_daughters: int, traitset: Traitset):
-        self.ptas = traitset.derive_ptas_from_genotype(
-            self.genotype, number_of_daughters, self.genomic_tests
+        ptas = traitset.derive_ptas_from_genotype(
+            self.get_traits(nms.GENOTYPE_KEY, traitset),
+            number_of_daughters,
+            self.genomic_tests,
         )
+        self.ptas_packed = traitset.pack_traits(ptas)
 
 
 class Assignment(models.Model):
@@ -1059,3 +1688,266 @@ class AssignmentFulfillment(models.Model):
 
     def __str__(self) -> str:
         return f"{self.id} | {self.assignment.name} for {self.enrollment.student.email}"
+
+    @classmethod
+    def get_current_step(
+        cls, assignmentid: int, enrollment: Enrollment
+    ) -> Optional[tuple["AssignmentFulfillment", AssignmentStep]]:
+        """Get the fulfillment of an assignment by an enrollment, with its
+        assignment, and the step it is on in one joined query"""
+
+        steps = "assignment__assignmentstep_assignment"
+        fulfillment = (
+            cls.objects.select_related("assignment")
+            .filter(
+                assignment_id=assignmentid,
+                enrollment=enrollment,
+                **{f"{steps}__number": models.F("current_step")},
+            )
+            .annotate(
+                step_id=models.F(f"{steps}__id"),
+                step_key=models.F(f"{steps}__step"),
+            )
+            .first()
+        )
+
+        if fulfillment is None:
+            return None
+
+        fulfillment.enrollment = enrollment
+        step = AssignmentStep(
+            id=fulfillment.step_id,
+            assignment=fulfillment.assignment,
+            step=fulfillment.step_key,
+            number=fulfillment.current_step,
+        )
+
+        return fulfillment, step
+
+
+class TrendSnapshot(models.Model):
+    "One capture of the trait means of a class"
+
+    class Admin(ModelAdmin):
+        list_display = ["connectedclass", "timestamp", "population_size"]
+
+    connectedclass = models.ForeignKey(
+        to="Class", on_delete=models.CASCADE, related_name="trend_snapshots"
+    )
+    timestamp = models.DateTimeField()
+    population_size = models.IntegerField()
+    net_merit = models.FloatField()
+    genotype = models.JSONField(default=dict)
+    phenotype = models.JSONField(default=dict)
+    ptas = models.JSONField(default=dict)
+
+    def __str__(self) -> str:
+        return f"{self.id} | {self.connectedclass_id} at {self.timestamp}"
+
+
+class TrendAccumulator(models.Model):
+    "Running trait sums over the living animals of a class"
+
+    class Admin(ModelAdmin):
+        list_display = ["connectedclass", "population_size"]
+
+    # Differences applied between background recomputes from all living
+    # animals, see Class.recompute_trend_sums
+    RECOMPUTE_INTERVAL = 20
+
+    connectedclass = models.OneToOneField(
+        to="Class", on_delete=models.CASCADE, related_name="trend_accumulator"
+    )
+    population_size = models.IntegerField(default=0)
+    net_merit = models.FloatField(default=0)
+    genotype = models.JSONField(default=dict)
+    phenotype = models.JSONField(default=dict)
+    ptas = models.JSONField(default=dict)
+    updates_since_recompute = models.IntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.id} | {self.connectedclass_id}"
+
+    def set_sums(
+        self, sums: dict[str, np.ndarray | float | int], traitset: Traitset
+    ) -> None:
+        """Replace the sums with sums from Animal.aggregate_traits"""
+
+        self.population_size = 0
+        self.net_merit = 0
+        self.updates_since_recompute = 0
+        self.genotype = {}
+        self.phenotype = {}
+        self.ptas = {}
+        self.add_sums(sums, traitset)
+
+    def add_sums(
+        self,
+        sums: dict[str, np.ndarray | float | int],
+        traitset: Traitset,
+        sign: int = 1,
+    ) -> None:
+        """Add (or with sign -1 remove) sums from Animal.aggregate_traits"""
+
+        self.population_size += sign * sums[nms.POPULATION_SIZE_KEY]
+        self.net_merit += sign * float(sums[nms.NETMERIT_KEY])
+
+        for key in [nms.GENOTYPE_KEY, nms.PHENOTYPE_KEY, nms.PTA_KEY]:
+            totals = getattr(self, key)
+            for idx, uid in enumerate(traitset.trait_uids):
+                totals[uid] = totals.get(uid, 0) + sign * float(sums[key][idx])
+
+    def create_snapshot(self) -> TrendSnapshot:
+        """Save the current means as a trend log entry"""
+
+        def get_means(sums):
+            return {uid: x / self.population_size for uid, x in sums.items()}
+
+        return TrendSnapshot.objects.create(
+            connectedclass_id=self.connectedclass_id,
+            timestamp=now(),
+            population_size=self.population_size,
+            net_merit=self.net_merit / self.population_size,
+            genotype=get_means(self.genotype),
+            phenotype=get_means(self.phenotype),
+            ptas=get_means(self.ptas),
+        )
+
+
+class PtaCalculation(models.Model):
+    "Progress of one PTA recalculation (or genomic test) of a class"
+
+    class Admin(ModelAdmin):
+        list_display = ["connectedclass", "genomic_test", "done", "total"]
+
+    connectedclass = models.ForeignKey(
+        to="Class", on_delete=models.CASCADE, related_name="pta_calculations"
+    )
+    genomic_test = models.BooleanField(default=False)
+    # Animals are recalculated in id order, last_id is the last one saved.
+    # Animals born after the calculation was created (after max_id) are
+    # left out.
+    last_id = models.BigIntegerField(default=0)
+    max_id = models.BigIntegerField(null=True, blank=True)
+    done = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.id} | {self.done}/{self.total} in {self.connectedclass_id}"
+
+    @classmethod
+    def create_new(
+        cls, connectedclass: Class, genomic_test: bool = False
+    ) -> "PtaCalculation":
+        living = Animal.objects.filter(
+            connectedclass=connectedclass, herd__isnull=False
+        ).aggregate(total=models.Count("id"), max_id=models.Max("id"))
+
+        return cls.objects.create(
+            connectedclass=connectedclass,
+            genomic_test=genomic_test,
+            total=living["total"],
+            max_id=living["max_id"] or 0,
+        )
+
+    @classmethod
+    def get_latest(cls, connectedclass: Class) -> Optional["PtaCalculation"]:
+        return (
+            cls.objects.filter(connectedclass=connectedclass)
+            .order_by("-id")
+            .first()
+        )
+
+    def add_chunk(self, ids: list[int]) -> None:
+        """Record a saved chunk. Call in the transaction that saves it."""
+
+        self.last_id = ids[-1]
+        self.done += len(ids)
+        self.save(update_fields=["last_id", "done"])
+
+
+class AnimalSerializer:
+    """Animal.json_dict for many animals of one class.
+
+    The class's visibility settings are resolved once into the list of
+    fields to write and the sets of visible traits, so each animal is
+    serialized without looking them up again."""
+
+    FIELD_ATTRIBUTES = {
+        nms.ID_KEY: "id",
+        nms.NAME_KEY: "name",
+        nms.GENERATION_KEY: "generation",
+        nms.ASSIGNMENT_KEY: "assignment",
+        nms.DAM_ID_KEY: "dam_id",
+        nms.SIRE_ID_KEY: "sire_id",
+        nms.INBREEDING_COEFFICIENT_KEY: "inbreeding",
+        nms.MALE_KEY: "male",
+        nms.NETMERIT_KEY: "net_merit",
+    }
+    TRAIT_FIELDS = [
+        nms.GENOTYPE_KEY,
+        nms.PHENOTYPE_KEY,
+        nms.PTA_KEY,
+        nms.RECESSIVES_KEY,
+    ]
+
+    columns: list[tuple[str, str, Optional[frozenset[str]]]]
+    hide_female_pta: bool
+    traitset: Traitset
+
+    def __init__(self, connectedclass: Class, fields: Optional[list[str]] = None):
+        """Serialize the animals of connectedclass, optionally with only
+        fields (in that order)"""
+
+        if fields is None:
+            fields = list(self.FIELD_ATTRIBUTES) + self.TRAIT_FIELDS
+
+        visible = {
+            key: frozenset(
+                uid
+                for uid, visibility in connectedclass.trait_visibility.items()
+                if visibility[idx]
+            )
+            for idx, key in enumerate(
+                [nms.GENOTYPE_KEY, nms.PHENOTYPE_KEY, nms.PTA_KEY]
+            )
+        }
+        visible[nms.RECESSIVES_KEY] = frozenset(
+            uid
+            for uid, is_visible in connectedclass.recessive_visibility.items()
+            if is_visible
+        )
+
+        # (json key, attribute, visible keys for dict fields)
+        self.columns = [
+            (x, self.FIELD_ATTRIBUTES.get(x, x), visible.get(x))
+            for x in fields
+            if x != nms.NETMERIT_KEY or connectedclass.net_merit_visibility
+        ]
+        self.hide_female_pta = connectedclass.hide_female_pta
+        self.traitset = get_traitset(connectedclass.traitset)
+
+    def serialize(self, animal: "Animal") -> dict[str, Any]:
+        hide_pta = self.hide_female_pta and not animal.male
+
+        json = {}
+        for key, attribute, visible in self.columns:
+            if visible is None:
+                json[key] = getattr(animal, attribute)
+                continue
+
+            if hide_pta and key == nms.PTA_KEY:
+                json[key] = {}
+                continue
+
+            if key == nms.RECESSIVES_KEY:
+                value = animal.recessives
+            else:
+                value = animal.get_traits(key, self.traitset)
+
+            json[key] = {x: y for x, y in value.items() if x in visible}
+
+        return json
+
+    def serialize_all(self, animals: Iterable["Animal"]) -> dict[int, dict]:
+        return {x.id: self.serialize(x) for x in animals}
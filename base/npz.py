@@ -0,0 +1,200 @@
+from itertools import islice
+import json
+from random import choice
+from typing import Any
+
+from background_task import background
+from django.conf import settings
+from django.core.mail import send_mail
+import numpy as np
+
+from base import models
+from base import names as nms
+from base.csv import AnimalFileWriter
+from base.sinks import SinkFile, get_export_sink
+
+MISSING_ID = -1
+# Formatted recessives are stored as indexes into RECESSIVE_CODES
+RECESSIVE_CODES = [None, *AnimalFileWriter.FORMATTED_RECESSIVES.values()]
+RECESSIVE_INDEXES = {
+    code: RECESSIVE_CODES.index(formatted)
+    for code, formatted in AnimalFileWriter.FORMATTED_RECESSIVES.items()
+}
+STRING_KEYS = {
+    nms.NAME_KEY,
+    nms.HERD_NAME_KEY,
+    nms.CLASS_NAME_KEY,
+    nms.ASSIGNMENT_KEY,
+    nms.SEX_KEY,
+}
+ID_KEYS = {nms.HERD_ID_KEY, nms.SIRE_ID_KEY, nms.DAM_ID_KEY}
+
+
+def get_column_array(data_key: str, values: list[Any]) -> np.ndarray:
+    """Get a typed array for a non trait column of the animal file"""
+
+    if data_key in STRING_KEYS:
+        if data_key == nms.SEX_KEY:
+            values = ["male" if x else "female" for x in values]
+
+        return np.array(
+            ["" if x is None else x for x in values], dtype=np.str_
+        )
+
+    if data_key in ID_KEYS:
+        return np.array(
+            [MISSING_ID if x is None else x for x in values], dtype=np.int64
+        )
+
+    if data_key in AnimalFileWriter.FLOAT_KEYS:
+        array = np.array(values, dtype=np.float64)
+        if data_key == nms.INBREEDING_PERCENTAGE_KEY:
+            array *= 100
+
+        return array
+
+    if data_key == nms.MALE_KEY:
+        return np.array(values, dtype=np.bool_)
+
+    return np.array(values, dtype=np.int64)
+
+
+def get_animal_arrays(
+    connectedclass: models.Class, rows_per_chunk: int = 5_000
+) -> tuple[dict[str, np.ndarray], dict[str, Any]]:
+    """Get the animal file of a class as typed arrays and their schema.
+
+    Every non trait column of the animal file is one array named by its
+    data key. Trait columns are (animals x traits) float matrices named
+    genotype, phenotype and ptas. Formatted recessives are a uint8 matrix
+    of indexes into the schema's codes."""
+
+    writer = AnimalFileWriter(connectedclass)
+    headers = dict(
+        zip(
+            writer.data_keys,
+            connectedclass.get_animal_file_headers(),
+            strict=True,
+        )
+    )
+
+    columns = [x for x in writer.data_keys if type(x) is not tuple]
+    matrices: dict[str, list[str]] = {}
+    for key, uid in (x for x in writer.data_keys if type(x) is tuple):
+        matrices.setdefault(key, []).append(uid)
+
+    chunks: dict[str, list[np.ndarray]] = {
+        key: [] for key in [*columns, *matrices]
+    }
+    rows = (
+        models.Animal.objects.filter(connectedclass=connectedclass)
+        .values_list(*writer.fields)
+        .iterator(chunk_size=rows_per_chunk)
+    )
+
+    # Always at least one (possibly empty) chunk so every array exists
+    chunk = list(islice(rows, rows_per_chunk))
+    while True:
+        add_chunk(writer, chunk, columns, matrices, chunks)
+        if not (chunk := list(islice(rows, rows_per_chunk))):
+            break
+
+    arrays = {key: np.concatenate(value) for key, value in chunks.items()}
+    schema = {
+        "class": connectedclass.name,
+        "traitset": connectedclass.traitset,
+        "animals": len(arrays[nms.ID_KEY]),
+        "arrays": {},
+    }
+
+    for key, array in arrays.items():
+        entry = {"dtype": array.dtype.str, "shape": list(array.shape)}
+
+        if key in matrices:
+            entry["columns"] = matrices[key]
+            entry["headers"] = [headers[(key, x)] for x in matrices[key]]
+        else:
+            entry["header"] = headers[key]
+
+        if key in ID_KEYS:
+            entry["missing"] = MISSING_ID
+        elif key in STRING_KEYS:
+            entry["missing"] = ""
+        elif array.dtype == np.float64:
+            entry["missing"] = "nan"
+        elif key == nms.FORMATTED_RECESSIVES_KEY:
+            entry["codes"] = RECESSIVE_CODES
+
+        schema["arrays"][key] = entry
+
+    return arrays, schema
+
+
+def add_chunk(
+    writer: AnimalFileWriter,
+    chunk: list[tuple],
+    columns: list[str],
+    matrices: dict[str, list[str]],
+    chunks: dict[str, list[np.ndarray]],
+) -> None:
+    values = dict(zip(writer.fields, zip(*chunk)))
+
+    for key in columns:
+        chunks[key].append(
+            get_column_array(key, list(values.get(writer.get_field(key), [])))
+        )
+
+    for key, uids in matrices.items():
+        if key in writer.TRAIT_KEYS:
+            indexes = [writer.traitset.trait_indexes[x] for x in uids]
+            chunks[key].append(writer.get_trait_matrix(key, chunk)[:, indexes])
+            continue
+
+        recessives = values.get(nms.RECESSIVES_KEY, [])
+        if key == nms.FORMATTED_RECESSIVES_KEY:
+            chunks[key].append(
+                np.array(
+                    [
+                        [RECESSIVE_INDEXES.get(x[uid], 0) for uid in uids]
+                        for x in recessives
+                    ],
+                    dtype=np.uint8,
+                ).reshape(len(chunk), len(uids))
+            )
+        else:
+            chunks[key].append(
+                np.array(
+                    [[x[uid] for uid in uids] for x in recessives],
+                    dtype=np.str_,
+                ).reshape(len(chunk), len(uids))
+            )
+
+
+@background(schedule=0)
+def create_animal_npz(classid: int, userid: int):
+    uid = "".join(choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(10))
+    connectedclass = models.Class.objects.get(id=classid)
+    arrays, schema = get_animal_arrays(connectedclass)
+
+    # Uncompressed so each member is a plain .npy file
+    sink = get_export_sink(f"animal_charts/AnimalData-{uid}.npz", userid)
+    np.savez(SinkFile(sink), **arrays)
+    link = sink.close()
+
+    schema_sink = get_export_sink(
+        f"animal_charts/AnimalData-{uid}.json", userid
+    )
+    schema_sink.write(json.dumps(schema, indent=4).encode("utf-8"))
+    schema_link = schema_sink.close()
+
+    user = models.User.objects.get(id=userid)
+
+    send_mail(
+        "Animal Data Ready",
+        "The animal data you requested from HerdGenetics is ready."
+        + f" You can download the arrays at {link}"
+        + f" and their description at {schema_link}",
+        settings.EMAIL_HOST_USER,
+        [user.email],
+        fail_silently=False,
+    )
@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Iterable, Optional
+
+from . import names as nms
+
+MAX_CACHED_CLASSES = 64
+DEFAULT_PEDIGREE_DEPTH = 8
+MAX_PEDIGREE_DEPTH = 16
+
+
+class AncestryIndex:
+    """Compact map of animal id -> (sire id, dam id) for one class.
+
+    Built from the sire and dam foreign keys. Animals are fetched a
+    generation at a time and only when they are not indexed yet, so
+    repeated lookups in the same class share previous work. Parents of an
+    animal never change once it is born, so entries stay valid."""
+
+    connectedclass_id: int
+    parents: dict[int, tuple[Optional[int], Optional[int]]]
+
+    def __init__(self, connectedclass_id: int):
+        self.connectedclass_id = connectedclass_id
+        self.parents = {}
+
+    def add(
+        self, animal_id: int, sire_id: Optional[int], dam_id: Optional[int]
+    ) -> None:
+        self.parents[animal_id] = (sire_id, dam_id)
+
+    def load(
+        self, animal_ids: Iterable[Optional[int]], depth: Optional[int] = None
+    ) -> None:
+        """Index animal_ids and their ancestors up to depth generations
+        back (all ancestors if depth is None)"""
+
+        from .models import Animal
+
+        generation = {x for x in animal_ids if x is not None}
+        while generation and (depth is None or depth >= 0):
+            missing = generation.difference(self.parents)
+            if missing:
+                rows = Animal.objects.filter(
+                    connectedclass_id=self.connectedclass_id, id__in=missing
+                ).values_list("id", "sire_id", "dam_id")
+                for animal_id, sire_id, dam_id in rows:
+                    self.add(animal_id, sire_id, dam_id)
+
+                # Deleted or foreign animals are indexed without parents
+                for animal_id in missing.difference(self.parents):
+                    self.add(animal_id, None, None)
+
+            generation = {
+                parent
+                for animal_id in generation
+                for parent in self.parents[animal_id]
+                if parent is not None
+            }
+            if depth is not None:
+                depth -= 1
+
+    def get_pedigree(
+        self, animal_id: Optional[int], depth: Optional[int] = None
+    ) -> Optional[dict[str, Any]]:
+        """Get the nested {sire, dam, id} pedigree of an animal, depth
+        generations back (all generations if depth is None). Ancestors
+        reached through several paths share a single dict."""
+
+        if animal_id is None:
+            return None
+
+        self.load([animal_id], depth)
+        built = {}
+
+        def build(animal_id, depth):
+            if animal_id is None:
+                return None
+
+            if (animal_id, depth) in built:
+                return built[(animal_id, depth)]
+
+            sire_id, dam_id = self.parents[animal_id]
+            if depth == 0:
+                sire_id, dam_id = None, None
+
+            next_depth = None if depth is None else depth - 1
+            pedigree = {
+                nms.SIRE_ID_KEY: build(sire_id, next_depth),
+                nms.DAM_ID_KEY: build(dam_id, next_depth),
+                nms.ID_KEY: animal_id,
+            }
+            built[(animal_id, depth)] = pedigree
+
+            return pedigree
+
+        return build(animal_id, depth)
+
+
+class AncestryIndexCache:
+    """Process wide, size bounded store of ancestry indexes by class"""
+
+    _indexes: OrderedDict[int, AncestryIndex]
+    _lock: Lock
+
+    def __init__(self, max_size: int = MAX_CACHED_CLASSES):
+        self.max_size = max_size
+        self._indexes = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, connectedclass_id: int) -> AncestryIndex:
+        with self._lock:
+            index = self._indexes.get(connectedclass_id)
+            if index is None:
+                index = AncestryIndex(connectedclass_id)
+                self._indexes[connectedclass_id] = index
+            self._indexes.move_to_end(connectedclass_id)
+
+            while len(self._indexes) > self.max_size:
+                self._indexes.popitem(last=False)
+
+        return index
+
+    def discard(self, connectedclass_id: int) -> None:
+        with self._lock:
+            self._indexes.pop(connectedclass_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+
+
+ancestry_indexes = AncestryIndexCache()
+
+
+def get_ancestry_index(connectedclass_id: int) -> AncestryIndex:
+    """Get the shared ancestry index of a class"""
+
+    return ancestry_indexes.get(connectedclass_id)
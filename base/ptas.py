@@ -0,0 +1,95 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Iterable, Iterator, Optional
+
+import numpy as np
+
+from .traitsets import get_traitset
+
+# Chunks submitted to the pool ahead of the one being saved, per process
+CHUNKS_AHEAD = 2
+
+
+class PtaChunk:
+    """Living animals of one class whose PTAs are recalculated together.
+    Rows of genotypes match ids."""
+
+    ids: list[int]
+    genotypes: np.ndarray
+    number_of_daughters: np.ndarray
+    genomic_tests: np.ndarray
+
+    def __init__(
+        self,
+        ids: list[int],
+        genotypes: np.ndarray,
+        number_of_daughters: np.ndarray,
+        genomic_tests: np.ndarray,
+    ):
+        self.ids = ids
+        self.genotypes = genotypes
+        self.number_of_daughters = number_of_daughters
+        self.genomic_tests = genomic_tests
+
+
+def derive_ptas(
+    traitset_name: str,
+    genotypes: np.ndarray,
+    number_of_daughters: np.ndarray,
+    genomic_tests: np.ndarray,
+    rng: Optional[np.random.Generator] = None,
+) -> np.ndarray:
+    """Derive a PTA matrix. Only takes picklable arguments and does not use
+    the database so it can run in a worker process."""
+
+    return get_traitset(traitset_name).derive_ptas_from_genotypes(
+        genotypes, number_of_daughters, genomic_tests, rng
+    )
+
+
+def iter_derived_ptas(
+    traitset_name: str, chunks: Iterable[PtaChunk], processes: int = 1
+) -> Iterator[tuple[PtaChunk, np.ndarray]]:
+    """Yield each chunk with its PTA matrix, in order.
+
+    With more than one process chunks are derived in a process pool, each
+    with its own seeded generator so workers never share random state.
+    Only a few chunks are read ahead of the one being yielded so memory
+    stays bounded by the chunk size."""
+
+    if processes <= 1:
+        for chunk in chunks:
+            yield (
+                chunk,
+                derive_ptas(
+                    traitset_name,
+                    chunk.genotypes,
+                    chunk.number_of_daughters,
+                    chunk.genomic_tests,
+                ),
+            )
+
+        return
+
+    seeds = np.random.SeedSequence()
+    pending: deque[tuple[PtaChunk, Future[Any]]] = deque()
+
+    with ProcessPoolExecutor(processes) as pool:
+        for chunk in chunks:
+            future = pool.submit(
+                derive_ptas,
+                traitset_name,
+                chunk.genotypes,
+                chunk.number_of_daughters,
+                chunk.genomic_tests,
+                np.random.default_rng(seeds.spawn(1)[0]),
+            )
+            pending.append((chunk, future))
+
+            if len(pending) > processes * CHUNKS_AHEAD:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
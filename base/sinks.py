@@ -0,0 +1,169 @@
+from abc import ABC, abstractmethod
+from io import BytesIO, RawIOBase
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+S3_SINK = "s3"
+LOCAL_SINK = "local"
+STORAGE_SINK = "storage"
+
+LOCAL_EXPORT_SALT = "base.sinks.local-export"
+
+
+class ExportSink(ABC):
+    """Destination of an exported file. The file is written in chunks with
+    write and close returns a link to the finished file."""
+
+    file_name: str
+    userid: int
+
+    def __init__(self, file_name: str, userid: int):
+        self.file_name = file_name
+        self.userid = userid
+
+    @abstractmethod
+    def write(self, data: bytes) -> None: ...
+
+    @abstractmethod
+    def close(self) -> str: ...
+
+
+class S3Sink(ExportSink):
+    "Multipart upload to the AWS storage bucket"
+
+    MIN_PART_SIZE = 5 * 1024 * 1024  # 5MB
+
+    def __init__(self, file_name: str, userid: int):
+        import boto3
+
+        super().__init__(file_name, userid)
+        self.s3 = boto3.client("s3")
+        self.bucketname = settings.AWS_STORAGE_BUCKET_NAME
+        self.upload_id = self.s3.create_multipart_upload(
+            Bucket=self.bucketname, Key=file_name
+        )["UploadId"]
+        self.parts = []
+        self.buffer = BytesIO()
+
+    def upload_part(self) -> None:
+        part_number = len(self.parts) + 1
+
+        self.buffer.seek(0)
+        response = self.s3.upload_part(
+            Bucket=self.bucketname,
+            Key=self.file_name,
+            PartNumber=part_number,
+            UploadId=self.upload_id,
+            Body=self.buffer,
+        )
+        self.parts.append(
+            {"PartNumber": part_number, "ETag": response["ETag"]}
+        )
+        self.buffer = BytesIO()
+
+    def write(self, data: bytes) -> None:
+        self.buffer.write(data)
+
+        if self.buffer.tell() >= self.MIN_PART_SIZE:
+            self.upload_part()
+
+    def close(self) -> str:
+        if self.buffer.tell() > 0:
+            self.upload_part()
+
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucketname,
+            Key=self.file_name,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": self.parts},
+        )
+
+        return f"https://{self.bucketname}.s3.amazonaws.com/{self.file_name}"
+
+
+class LocalSink(ExportSink):
+    """File in settings.EXPORT_DIRECTORY. The link is a signed download url
+    only the user the file was exported for can open."""
+
+    def __init__(self, file_name: str, userid: int):
+        super().__init__(file_name, userid)
+        self.path = get_local_export_path(file_name)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "wb")
+
+    def write(self, data: bytes) -> None:
+        self.file.write(data)
+
+    def close(self) -> str:
+        self.file.close()
+
+        token = signing.dumps(
+            [self.userid, self.file_name], salt=LOCAL_EXPORT_SALT
+        )
+        return f"{settings.EXPORT_BASE_URL.rstrip('/')}/exports/{token}"
+
+
+class StorageSink(ExportSink):
+    "File saved through Django's default storage"
+
+    MAX_MEMORY_SIZE = 5 * 1024 * 1024  # 5MB
+
+    def __init__(self, file_name: str, userid: int):
+        super().__init__(file_name, userid)
+        self.file = SpooledTemporaryFile(max_size=self.MAX_MEMORY_SIZE)
+
+    def write(self, data: bytes) -> None:
+        self.file.write(data)
+
+    def close(self) -> str:
+        self.file.seek(0)
+        name = default_storage.save(self.file_name, File(self.file))
+        self.file.close()
+
+        return default_storage.url(name)
+
+
+class SinkFile(RawIOBase):
+    """Write only, unseekable file over an export sink so libraries that
+    write to files can write to a sink"""
+
+    def __init__(self, sink: ExportSink):
+        self.sink = sink
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self.sink.write(bytes(data))
+        return len(data)
+
+
+SINKS: dict[str, type[ExportSink]] = {
+    S3_SINK: S3Sink,
+    LOCAL_SINK: LocalSink,
+    STORAGE_SINK: StorageSink,
+}
+
+
+def get_export_sink(file_name: str, userid: int) -> ExportSink:
+    """Open file_name, exported for userid, in the sink chosen by
+    settings.EXPORT_SINK"""
+
+    return SINKS[settings.EXPORT_SINK](file_name, userid)
+
+
+def get_local_export_path(file_name: str) -> Path:
+    return Path(settings.EXPORT_DIRECTORY) / file_name
+
+
+def load_local_export_token(token: str) -> tuple[int, str]:
+    """Get the user and file name of a local export download link.
+    Raises signing.BadSignature if the token was not made by LocalSink."""
+
+    userid, file_name = signing.loads(token, salt=LOCAL_EXPORT_SALT)
+    return userid, file_name
@@ -4,93 +4,87 @@ var CurrentAssignmentStep;
 var RevalidateMalesForBreeding = false;
 var ValidatingMalesForBreeding = false;
 var MalesValidatedForBreeding = false;
+var HerdQuery = { sort: "id", descending: true, contains: "" };
+var HerdQueryVersion = 0;
 const PTA_DECIMALS = 3;
+const ANIMALS_PER_PAGE = 100;
+const ANIMAL_LIST_FIELDS = "id,name,male";
 
-async function getHerd(classId, herdId) {
-    Herd = await $.ajax({
+async function getHerd(classId, herdId, query) {
+    return await $.ajax({
         url: `/class/${classId}/herd/${herdId}/get`,
         dataType: "json",
-    }).fail("Error: Could not load herd data.");
+        data: query,
+    }).fail(() => sendMessage("Error: Could not load herd data.", null, true));
 };
 
-function createAnimalCard(animalId, animalName, animal, classId, herdId) {
+function createAnimalCard(animalId, animalName, classId, herdId) {
     let btn = $("<button></button>", { id: `anim-${animalId}`, class: "animal-btn", autofilter: true });
     btn.text(animalName);
-    btn.click(() => {
+    btn.click(async () => {
         $(".animal-btn.selected").removeClass("selected");
         btn.addClass("selected");
-        animalSelected(animal, classId, herdId);
+
+        let data = await getHerd(classId, herdId, { id: animalId });
+        animalSelected(data["animals"][animalId], classId, herdId);
     });
 
     return btn;
 }
 
-function resolveSortKey(sortKey, animal) {
-    let sortKeyCp = [...sortKey];
-    let key = sortKeyCp.shift();
-    animal = animal[key];
-
-    if (sortKeyCp.length == 0) {
-        let val = animal;
-        return val;
-    }
-    else {
-        return resolveSortKey(sortKeyCp, animal);
-    }
-
-}
+async function loadAnimalPage(sex, page, classId, herdId) {
+    let version = HerdQueryVersion;
+    let list = $(sex === "male" ? "#males" : "#females");
+    let query = {
+        page: page,
+        per_page: ANIMALS_PER_PAGE,
+        sex: sex,
+        sort: HerdQuery.sort,
+        descending: HerdQuery.descending,
+        contains: HerdQuery.contains,
+        fields: ANIMAL_LIST_FIELDS,
+    };
+
+    // Hidden female PTAs can not be sorted by
+    if (sex === "female" && HideFemalePta && query.sort.startsWith("ptas,"))
+        query.sort = "id";
+
+    let data = await getHerd(classId, herdId, query);
+
+    // A newer sort or search was started while loading
+    if (version !== HerdQueryVersion)
+        return;
 
-function compareValuesForSort(a, b) {
-    if (typeof a === "string") {
-        return a.localeCompare(b);
-    } else {
-        return Math.abs(a - b) / (a - b);
-    }
-}
+    if (page === 1)
+        list.html("");
+    list.find(".load-more").remove();
 
-function loadHerd(sortKey, reversed, contains, classId, herdId) {
-    $("#males").html("");
-    $("#females").html("");
-
-    let animals = [];
-    for (let animal in Herd["animals"]) {
-        if (contains) {
-            let name = Herd["animals"][animal]["name"];
-            for (c of contains) {
-                if (name.includes(c)) {
-                    animals.push(Herd["animals"][animal]);
-                }
-                break;
-            };
-        } else {
-            animals.push(Herd["animals"][animal]);
-        }
+    for (let animalId of data["order"]) {
+        let animal = data["animals"][animalId];
+        list.append(createAnimalCard(animal["id"], animal["name"], classId, herdId));
     }
 
-    let males = animals.filter(a => a.male);
-    let females = animals.filter(a => !a.male);
-
-    males.sort((a, b) => {
-        a = resolveSortKey(sortKey, a);
-        b = resolveSortKey(sortKey, b);
-        let comp = compareValuesForSort(a, b);
-        return comp;
-    });
-
-    females.sort((a, b) => {
-        a = resolveSortKey(sortKey, a);
-        b = resolveSortKey(sortKey, b);
-        let comp = compareValuesForSort(a, b);
-        return comp;
-    });
-
-    if (!reversed) {
-        males.reverse();
-        females.reverse();
+    if (data["page"] < data["pages"]) {
+        let button = $("<button></button>", {
+            class: ["load-more", "as-btn", "background-a", "pad", "border-radius"].join(" "),
+            type: "button"
+        });
+        button.text("Load More");
+        button.click(async () => {
+            button.attr("disabled", true);
+            await loadAnimalPage(sex, page + 1, classId, herdId);
+            filterAll();
+        });
+        list.append(button);
     }
+}
 
-    males.forEach(animal => $("#males").append(createAnimalCard(animal["id"], animal["name"], animal, classId, herdId)));
-    females.forEach(animal => $("#females").append(createAnimalCard(animal["id"], animal["name"], animal, classId, herdId)));
+async function loadHerd(classId, herdId) {
+    HerdQueryVersion++;
+    await Promise.all([
+        loadAnimalPage("male", 1, classId, herdId),
+        loadAnimalPage("female", 1, classId, herdId),
+    ]);
 }
 
 function createSortOptionCard(text, value) {
@@ -133,8 +127,9 @@ function loadSortOptions() {
 }
 
 async function setUpHerd(classId, herdId) {
-    await getHerd(classId, herdId);
-    loadHerd(["id"], false, false, classId, herdId);
+    // Name and summary of the herd, with one animal for its recessives
+    Herd = await getHerd(classId, herdId, { page: 1, per_page: 1, fields: "recessives" });
+    await loadHerd(classId, herdId);
     showSummary();
     loadSortOptions();
     clearLoadingSymbol("herd");
@@ -274,7 +269,7 @@ function animalSelected(animal, classId, herdId) {
         }
     } else {
         if (CurrentAssignmentStep && CurrentAssignmentStep["key"] == "fsub") {
-            let form = createAnimalCard(animal, classId, herdId);
+            let form = createSubmitFormCard(animal, classId, herdId);
             info.append(form);
         }
     }
@@ -349,11 +344,11 @@ function animalSelected(animal, classId, herdId) {
     filterAll();
 }
 
-function resortAnimals(classId, herdId) {
-    let sortKey = $("#sort-options").val().split(",");
-    let reversed = $("#sort-order").val() === "ascending";
-    let contains = $("#contains").val().split(" ");
-    loadHerd(sortKey, reversed, contains, classId, herdId);
+async function resortAnimals(classId, herdId) {
+    HerdQuery.sort = $("#sort-options").val();
+    HerdQuery.descending = $("#sort-order").val() !== "ascending";
+    HerdQuery.contains = $("#contains").val().trim();
+    await loadHerd(classId, herdId);
     filterAll();
 }
 
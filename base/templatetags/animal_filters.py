@@ -1,9 +1,11 @@
+from functools import lru_cache
 from json import dumps
+import re
 from django import template
 from django.utils.safestring import SafeString
 from typing import Any
 
-from ..traitsets import Traitset
+from ..traitsets import Traitset, get_traitset
 from ..traitsets.traitset import TraitsetAnimalFilter
 
 from typing import TYPE_CHECKING
@@ -24,25 +26,31 @@ class ContextCast:
             return
 
         if enrollment := context.get("enrollment", None):
-            self.traitset = Traitset(enrollment.connectedclass.traitset)
+            self.traitset = get_traitset(enrollment.connectedclass.traitset)
             self.animal = enrollment.animal
 
         elif connectedclass := context.get("connectedclass", None):
-            self.traitset = Traitset(connectedclass.traitset)
+            self.traitset = get_traitset(connectedclass.traitset)
             self.animal = connectedclass.default_animal
 
         elif connectedclass := context.get("class", None):
-            self.traitset = Traitset(connectedclass.traitset)
+            self.traitset = get_traitset(connectedclass.traitset)
             self.animal = connectedclass.default_animal
 
         self.animalfilter = self.traitset.animals[self.animal]
 
     @classmethod
     def from_class(cls, connectedclass: "Class") -> "ContextCast":
+        return cls.from_animal(
+            get_traitset(connectedclass.traitset), connectedclass.default_animal
+        )
+
+    @classmethod
+    def from_animal(cls, traitset: Traitset, animal: str) -> "ContextCast":
         new = cls(None)
 
-        new.traitset = Traitset(connectedclass.traitset)
-        new.animal = connectedclass.default_animal
+        new.traitset = traitset
+        new.animal = animal
         new.animalfilter = new.traitset.animals[new.animal]
         return new
 
@@ -93,34 +101,92 @@ def get_filter_dict(
     )
 
 
-@register.simple_tag(takes_context=True)
-def load_filter_dict(context: dict[str, Any]) -> SafeString:
-    contextcast = ContextCast(context)
-    safe_text = f"<script>var Filter = {dumps(get_filter_dict(contextcast))}</script>"
+class FilterTable:
+    """Filter dict of one animal of a traitset, with its script tag and
+    text replacements prepared once. Get through get_filter_table."""
 
-    return SafeString(safe_text)
+    # Anything between a pair of angle brackets
+    PLACEHOLDER = re.compile(r"<([^<>]*)>")
 
+    filter_dict: dict[str, dict[str, Any] | str]
+    script: SafeString
+    replacements: tuple[tuple[str, str], ...]
+    names: dict[str, str]
+    single_pass: bool
 
-@register.simple_tag(takes_context=True)
-def auto_filter_text(context: dict[str, Any], text: str) -> str:
-    contextcast = ContextCast(context)
+    def __init__(self, filter_dict: dict[str, dict[str, Any] | str]):
+        self.filter_dict = filter_dict
+        self.script = SafeString(
+            f"<script>var Filter = {dumps(self.filter_dict)}</script>"
+        )
+        self.replacements = tuple(
+            (f"<{key}>", val["name"] if type(val) is dict else val)
+            for key, val in self.filter_dict.items()
+        )
+        self.names = {x[1:-1]: y for x, y in self.replacements}
 
-    for key, val in get_filter_dict(contextcast).items():
-        if type(val) is dict:
-            text = text.replace(f"<{key}>", val["name"])
-        else:
-            text = text.replace(f"<{key}>", val)
+        # Names with angle brackets can form placeholders while replacing
+        self.single_pass = not any(
+            "<" in x or ">" in x for x in self.names.values()
+        )
 
-    return text
+    def replace_each(self, text: str) -> str:
+        """Replace placeholders one key at a time, in filter dict order"""
 
+        for placeholder, replacement in self.replacements:
+            text = text.replace(placeholder, replacement)
 
-def filter_text_to_default(text: str, connectedclass: "Class"):
-    contextcast = ContextCast.from_class(connectedclass)
+        return text
+
+    def apply(self, text: str) -> str:
+        """Replace <key> placeholders in text with their names.
+
+        Placeholders are found in one regex pass and looked up in names.
+        The result is the same as replace_each: a name next to stray
+        brackets can form a new placeholder, which replace_each may go on
+        to replace, so that rare case falls back to it."""
+
+        if "<" not in text:
+            return text
+
+        if not self.single_pass:
+            return self.replace_each(text)
+
+        result = self.PLACEHOLDER.sub(
+            lambda x: self.names.get(x[1], x[0]), text
+        )
+
+        if "<" in result and any(
+            x[1] in self.names for x in self.PLACEHOLDER.finditer(result)
+        ):
+            return self.replace_each(text)
+
+        return result
 
-    for key, val in get_filter_dict(contextcast).items():
-        if type(val) is dict:
-            text = text.replace(f"<{key}>", val["name"])
-        else:
-            text = text.replace(f"<{key}>", val)
 
-    return text
+@lru_cache(maxsize=64)
+def _get_filter_table(traitset: Traitset, animal: str) -> FilterTable:
+    contextcast = ContextCast.from_animal(traitset, animal)
+    return FilterTable(get_filter_dict(contextcast))
+
+
+def get_filter_table(contextcast: ContextCast) -> FilterTable:
+    """Get the shared filter table of the context's traitset and animal.
+    Tables are keyed by traitset instance, so a reloaded traitset gets a
+    new table."""
+
+    return _get_filter_table(contextcast.traitset, contextcast.animal)
+
+
+@register.simple_tag(takes_context=True)
+def load_filter_dict(context: dict[str, Any]) -> SafeString:
+    return get_filter_table(ContextCast(context)).script
+
+
+@register.simple_tag(takes_context=True)
+def auto_filter_text(context: dict[str, Any], text: str) -> str:
+    return get_filter_table(ContextCast(context)).apply(text)
+
+
+def filter_text_to_default(text: str, connectedclass: "Class"):
+    return get_filter_table(ContextCast.from_class(connectedclass)).apply(text)
@@ -0,0 +1,98 @@
+from json import dumps
+from types import SimpleNamespace
+
+from django.test import TestCase
+
+from ..templatetags.animal_filters import (
+    ContextCast,
+    FilterTable,
+    auto_filter_text,
+    get_filter_dict,
+    get_filter_table,
+    load_filter_dict,
+)
+from ..traitsets import REGISTERED, get_traitset
+
+
+class TestAnimalFilters(TestCase):
+    @staticmethod
+    def replace_each(text: str, contextcast: ContextCast) -> str:
+        for key, val in get_filter_dict(contextcast).items():
+            if type(val) is dict:
+                text = text.replace(f"<{key}>", val["name"])
+            else:
+                text = text.replace(f"<{key}>", val)
+
+        return text
+
+    def get_contextcasts(self):
+        for registration in REGISTERED:
+            traitset = get_traitset(registration.name)
+            for animal, _ in traitset.animal_choices:
+                yield ContextCast.from_animal(traitset, animal)
+
+    def get_texts(self, contextcast: ContextCast) -> list[str]:
+        trait = contextcast.traitset.traits[0].uid
+        recessive = contextcast.traitset.recessives[0].uid
+
+        return [
+            "",
+            "No placeholders",
+            f"gen: <{trait}>",
+            f"<Herd> of <males> and <{recessive}> <{recessive}>",
+            f"<<herd>> <unknown> <{trait}<sire>> <herd",
+            "<sire><dam><Sires>",
+        ]
+
+    def test_filter_table_matches_filter_dict(self):
+        for contextcast in self.get_contextcasts():
+            table = get_filter_table(contextcast)
+
+            self.assertEqual(table.filter_dict, get_filter_dict(contextcast))
+            for text in self.get_texts(contextcast):
+                self.assertEqual(
+                    table.apply(text), self.replace_each(text, contextcast)
+                )
+
+    def test_filter_table_formed_placeholders(self):
+        table = FilterTable(
+            {"a": "<b>", "b": "B", "c": "x", "xy": "XY", "yx": "YX"}
+        )
+        self.assertFalse(table.single_pass)
+        self.assertEqual(table.apply("<a> <b>"), table.replace_each("<a> <b>"))
+
+        table = FilterTable(
+            {"yx": "YX", "c": {"name": "x"}, "xy": "XY", "d": "y"}
+        )
+        self.assertTrue(table.single_pass)
+        for text in ["<<c>y>", "<y<c>>", "<<d><c>>", "<<c><d>>", "<c><d>"]:
+            self.assertEqual(table.apply(text), table.replace_each(text))
+
+    def test_filter_table_is_shared(self):
+        traitset = get_traitset(REGISTERED[0].name)
+        animal = traitset.animal_choices[0][0]
+
+        self.assertIs(
+            get_filter_table(ContextCast.from_animal(traitset, animal)),
+            get_filter_table(ContextCast.from_animal(traitset, animal)),
+        )
+
+    def test_tags(self):
+        traitset = get_traitset(REGISTERED[0].name)
+        animal = traitset.animal_choices[0][0]
+        contextcast = ContextCast.from_animal(traitset, animal)
+
+        enrollment = SimpleNamespace(
+            connectedclass=SimpleNamespace(traitset=traitset.name),
+            animal=animal,
+        )
+        context = {"enrollment": enrollment}
+
+        self.assertEqual(
+            load_filter_dict(context),
+            f"<script>var Filter = {dumps(get_filter_dict(contextcast))}</script>",
+        )
+        self.assertEqual(
+            auto_filter_text(context, "<Herd>"),
+            self.replace_each("<Herd>", contextcast),
+        )
@@ -0,0 +1,391 @@
+from io import StringIO
+from typing import Iterable
+from unittest.mock import patch
+
+from background_task.models import Task
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import TestCase, override_settings
+import numpy as np
+
+from .. import models
+from .. import names as nms
+from ..pedigree import ancestry_indexes
+from ..traitsets import get_traitset
+
+
+class TestAnimals(TestCase):
+    def setUp(self):
+        ancestry_indexes.clear()
+        teacher = User.objects.create_user("teacher", "teacher@test.com")
+        self.connectedclass = models.Class.create_new(
+            teacher, "Class", "ANIMAL_SCIENCE_422", "", 5, 10
+        )
+        self.traitset = get_traitset(self.connectedclass.traitset)
+
+    def unpack_traits(self, animals: Iterable[models.Animal]) -> None:
+        "Store traits as json, like animals that could not be packed"
+
+        for animal in animals:
+            for key in [nms.GENOTYPE_KEY, nms.PHENOTYPE_KEY, nms.PTA_KEY]:
+                setattr(animal, key, animal.get_traits(key, self.traitset))
+                setattr(animal, f"{key}_packed", None)
+            animal.save()
+
+    def test_traits_are_only_packed(self):
+        animals = models.Animal.objects.filter(
+            connectedclass=self.connectedclass
+        )
+
+        for animal in animals:
+            for key in [nms.GENOTYPE_KEY, nms.PHENOTYPE_KEY, nms.PTA_KEY]:
+                self.assertIsNone(getattr(animal, key))
+                traits = animal.get_traits(key, self.traitset)
+                self.assertEqual(tuple(traits), self.traitset.trait_uids)
+
+                if key == nms.PHENOTYPE_KEY and animal.male:
+                    self.assertEqual(set(traits.values()), {None})
+                else:
+                    np.testing.assert_array_equal(
+                        list(traits.values()),
+                        animal.get_trait_array(key, self.traitset),
+                    )
+
+    def test_get_trait_matrix_without_packed_traits(self):
+        animals = models.Animal.objects.filter(
+            connectedclass=self.connectedclass
+        )
+        packed = models.Animal.get_trait_matrix(
+            animals, nms.GENOTYPE_KEY, self.traitset
+        )
+
+        self.unpack_traits(animals)
+
+        unpacked = models.Animal.get_trait_matrix(
+            animals, nms.GENOTYPE_KEY, self.traitset
+        )
+
+        self.assertEqual(packed.shape, (15, len(self.traitset.traits)))
+        np.testing.assert_array_equal(packed, unpacked)
+
+    def assert_pedigree_matches_parents(self, pedigree, animal):
+        self.assertEqual(pedigree[nms.ID_KEY], animal.id)
+
+        for key, parent in [
+            (nms.SIRE_ID_KEY, animal.sire),
+            (nms.DAM_ID_KEY, animal.dam),
+        ]:
+            if parent is None:
+                self.assertIsNone(pedigree[key])
+            else:
+                self.assert_pedigree_matches_parents(pedigree[key], parent)
+
+    def test_get_pedigree(self):
+        herd = self.connectedclass.class_herd
+        sires = list(models.Animal.objects.filter(herd=herd, male=True))
+        herd.breed_herd(sires, "")
+        herd.breed_herd(sires, "")
+
+        animal = models.Animal.objects.filter(herd=herd, generation=2).first()
+        ancestry_indexes.clear()
+
+        self.assert_pedigree_matches_parents(animal.get_pedigree(), animal)
+
+        truncated = animal.get_pedigree(1)
+        self.assertIsNotNone(truncated[nms.SIRE_ID_KEY])
+        self.assertIsNone(truncated[nms.SIRE_ID_KEY][nms.SIRE_ID_KEY])
+        self.assertIsNone(truncated[nms.DAM_ID_KEY][nms.DAM_ID_KEY])
+
+    def test_aggregate_traits(self):
+        animals = models.Animal.objects.filter(
+            connectedclass=self.connectedclass
+        )
+        self.unpack_traits(animals.filter(male=True))
+
+        expected = models.Animal.sum_traits(animals, self.traitset)
+        sums = models.Animal.aggregate_traits(animals, self.traitset)
+
+        self.assertEqual(sums[nms.POPULATION_SIZE_KEY], 15)
+        self.assertAlmostEqual(
+            sums[nms.NETMERIT_KEY], expected[nms.NETMERIT_KEY]
+        )
+        for key in [nms.GENOTYPE_KEY, nms.PHENOTYPE_KEY, nms.PTA_KEY]:
+            np.testing.assert_allclose(sums[key], expected[key])
+
+    def test_packed_traits_field_postgres_arrays(self):
+        field = models.Animal._meta.get_field("phenotype_packed")
+        packed = self.traitset.pack_traits(self.traitset.get_null_phenotype())
+
+        with patch.object(connection, "vendor", "postgresql"):
+            values = field.get_db_prep_value(packed, connection)
+            self.assertEqual(values, [None] * len(self.traitset.traits))
+            self.assertEqual(
+                field.from_db_value(values, None, connection), packed
+            )
+            self.assertEqual(
+                field.get_placeholder(values, None, connection),
+                "%s::double precision[]",
+            )
+
+    def test_update_trend_log(self):
+        herd = self.connectedclass.class_herd
+        sires = list(models.Animal.objects.filter(herd=herd, male=True))
+        herd.breed_herd(sires, "")
+
+        incremental = self.connectedclass.trend_snapshots.latest("id")
+        full = self.connectedclass.update_trend_log()
+
+        self.assertEqual(self.connectedclass.trend_snapshots.count(), 3)
+        self.assertEqual(incremental.population_size, full.population_size)
+        self.assertAlmostEqual(incremental.net_merit, full.net_merit)
+        for key in [nms.GENOTYPE_KEY, nms.PHENOTYPE_KEY, nms.PTA_KEY]:
+            for uid, mean in getattr(full, key).items():
+                self.assertAlmostEqual(getattr(incremental, key)[uid], mean)
+
+    def test_trend_accumulator_applies_every_update(self):
+        herd = self.connectedclass.class_herd
+        animals = list(models.Animal.objects.filter(herd=herd))
+
+        # Separately loaded instances, as in two concurrent requests
+        first = models.Class.objects.get(id=self.connectedclass.id)
+        second = models.Class.objects.get(id=self.connectedclass.id)
+        first.update_trend_log(new_animals=[], old_animals=animals[:2])
+        second.update_trend_log(new_animals=[], old_animals=animals[2:5])
+
+        self.connectedclass.trend_accumulator.refresh_from_db()
+        self.assertEqual(
+            self.connectedclass.trend_accumulator.population_size, 10
+        )
+        self.assertEqual(
+            self.connectedclass.trend_snapshots.latest("id").population_size,
+            10,
+        )
+
+    def test_trend_accumulator_recomputes(self):
+        accumulator = self.connectedclass.trend_accumulator
+        accumulator.population_size += 1_000
+        accumulator.net_merit += 1_000
+        accumulator.save()
+        tasks = Task.objects.filter(
+            task_name="base.models.recompute_trend_sums"
+        )
+
+        # Incremental updates keep any error and only schedule a recompute
+        interval = models.TrendAccumulator.RECOMPUTE_INTERVAL
+        for updates in range(1, interval + 1):
+            self.connectedclass.update_trend_log([], [])
+            accumulator.refresh_from_db()
+            self.assertEqual(accumulator.updates_since_recompute, updates)
+            self.assertEqual(accumulator.population_size, 1_015)
+            self.assertEqual(tasks.count(), 1 if updates == interval else 0)
+
+        self.assertEqual(tasks.get().params(), ([self.connectedclass.id], {}))
+
+        # A recompute that races an update is dropped
+        aggregate_traits = models.Animal.aggregate_traits
+
+        def aggregate_during_update(animals, traitset):
+            self.connectedclass.update_trend_log([], [])
+            return aggregate_traits(animals, traitset)
+
+        with patch.object(
+            models.Animal, "aggregate_traits", aggregate_during_update
+        ):
+            models.Class.recompute_trend_sums.now(self.connectedclass.id)
+
+        accumulator.refresh_from_db()
+        self.assertEqual(accumulator.updates_since_recompute, interval + 1)
+        self.assertEqual(accumulator.population_size, 1_015)
+
+        models.Class.recompute_trend_sums.now(self.connectedclass.id)
+        accumulator.refresh_from_db()
+        self.assertEqual(accumulator.updates_since_recompute, 0)
+        self.assertEqual(accumulator.population_size, 15)
+        self.assertAlmostEqual(
+            accumulator.net_merit,
+            sum(
+                models.Animal.objects.filter(
+                    connectedclass=self.connectedclass
+                ).values_list("net_merit", flat=True)
+            ),
+        )
+
+    def recalculate_ptas(
+        self,
+        genomic_test: bool = False,
+        calculation: models.PtaCalculation | None = None,
+    ) -> dict[int, models.Animal]:
+        if calculation is None:
+            calculation = models.PtaCalculation.create_new(
+                self.connectedclass, genomic_test
+            )
+
+        models.Class.recalculate_ptas.now(calculation.id, "teacher@test.com")
+
+        return {
+            x.id: x
+            for x in models.Animal.objects.filter(
+                connectedclass=self.connectedclass
+            )
+        }
+
+    def test_recalculate_ptas_in_chunks(self):
+        animals = models.Animal.objects.filter(
+            connectedclass=self.connectedclass
+        )
+        animals.filter(id__in=animals.values("id")[:3]).update(herd=None)
+        dead = list(
+            animals.filter(herd__isnull=True).values_list("id", "ptas_packed")
+        )
+
+        with patch.object(models.Class, "PTA_CHUNK_SIZE", 4):
+            animals = self.recalculate_ptas(genomic_test=True)
+
+        for animal_id, ptas in dead:
+            self.assertEqual(
+                bytes(animals[animal_id].ptas_packed), bytes(ptas)
+            )
+            self.assertEqual(animals[animal_id].genomic_tests, 0)
+
+        living = [x for x in animals.values() if x.herd_id is not None]
+        for animal in living:
+            self.assertEqual(animal.genomic_tests, 1)
+            self.assertIsNone(animal.ptas)
+
+        calculation = models.PtaCalculation.get_latest(self.connectedclass)
+        self.assertEqual(calculation.done, len(living))
+        self.assertEqual(calculation.total, len(living))
+        self.assertEqual(calculation.last_id, max(x.id for x in living))
+        self.assertEqual(mail.outbox[-1].subject, "Genomic Test Complete")
+
+    def test_retried_genomic_test_resumes(self):
+        calculation = models.PtaCalculation.create_new(
+            self.connectedclass, genomic_test=True
+        )
+
+        # The task fails after saving its second chunk
+        with (
+            patch.object(models.Class, "PTA_CHUNK_SIZE", 4),
+            patch.object(
+                models.logger, "info", side_effect=[None, RuntimeError]
+            ),
+            self.assertRaises(RuntimeError),
+        ):
+            self.recalculate_ptas(calculation=calculation)
+
+        calculation.refresh_from_db()
+        self.assertEqual(calculation.done, 8)
+
+        with patch.object(models.Class, "PTA_CHUNK_SIZE", 4):
+            animals = self.recalculate_ptas(calculation=calculation)
+
+        calculation.refresh_from_db()
+        self.assertEqual(calculation.done, calculation.total)
+        self.assertEqual(calculation.total, len(animals))
+        for animal in animals.values():
+            self.assertEqual(animal.genomic_tests, 1)
+
+        self.client.force_login(self.connectedclass.teacher)
+        response = self.client.get(
+            f"/class/{self.connectedclass.id}/running-genomic-test"
+        )
+        self.assertContains(
+            response, f"{len(animals)} of {len(animals)} animals done."
+        )
+
+    def test_genomic_test_leaves_out_later_calves(self):
+        calculation = models.PtaCalculation.create_new(
+            self.connectedclass, genomic_test=True
+        )
+        herd = self.connectedclass.class_herd
+        sires = list(models.Animal.objects.filter(herd=herd, male=True))
+        herd.breed_herd(sires, "")
+        models.Animal.objects.filter(id=calculation.max_id).update(herd=None)
+
+        with patch.object(models.Class, "PTA_CHUNK_SIZE", 4):
+            animals = self.recalculate_ptas(calculation=calculation)
+
+        calculation.refresh_from_db()
+        tested = [x for x in animals.values() if x.genomic_tests == 1]
+        self.assertEqual(calculation.done, len(tested))
+        self.assertEqual(calculation.total, len(tested))
+        self.assertEqual(
+            {x.id for x in tested},
+            {
+                x.id
+                for x in animals.values()
+                if x.herd_id is not None and x.id < calculation.max_id
+            },
+        )
+
+    def test_recalculate_ptas_in_chunks_matches_single_chunk(self):
+        np.random.seed(0)
+        expected = self.recalculate_ptas()
+
+        np.random.seed(0)
+        with patch.object(models.Class, "PTA_CHUNK_SIZE", 4):
+            animals = self.recalculate_ptas()
+
+        for animal_id, animal in animals.items():
+            np.testing.assert_array_equal(
+                animal.get_trait_array(nms.PTA_KEY, self.traitset),
+                expected[animal_id].get_trait_array(
+                    nms.PTA_KEY, self.traitset
+                ),
+            )
+
+    @override_settings(PTA_PROCESSES=2)
+    def test_recalculate_ptas_in_processes(self):
+        before = {
+            x.id: x.get_trait_array(nms.PTA_KEY, self.traitset)
+            for x in models.Animal.objects.filter(
+                connectedclass=self.connectedclass
+            )
+        }
+
+        with patch.object(models.Class, "PTA_CHUNK_SIZE", 4):
+            animals = self.recalculate_ptas()
+
+        for animal_id, animal in animals.items():
+            self.assertFalse(
+                np.array_equal(
+                    animal.get_trait_array(nms.PTA_KEY, self.traitset),
+                    before[animal_id],
+                )
+            )
+
+    def test_daughter_counts(self):
+        herd = self.connectedclass.class_herd
+        sires = list(models.Animal.objects.filter(herd=herd, male=True))
+        herd.breed_herd(sires, "")
+        herd.breed_herd(sires, "")
+
+        animals = models.Animal.objects.filter(
+            connectedclass=self.connectedclass
+        ).annotate(
+            sire_daughters=Count(
+                "animal_sire", filter=Q(animal_sire__male=False)
+            ),
+            dam_daughters=Count(
+                "animal_dam", filter=Q(animal_dam__male=False)
+            ),
+        )
+        expected = {x.id: x.sire_daughters + x.dam_daughters for x in animals}
+        self.assertTrue(any(expected.values()))
+
+        def get_counts():
+            return dict(animals.values_list("id", "daughter_count"))
+
+        self.assertEqual(get_counts(), expected)
+
+        animals.update(daughter_count=0)
+        call_command(
+            "rebuilddaughtercounts",
+            "--class",
+            self.connectedclass.id,
+            stdout=StringIO(),
+        )
+        self.assertEqual(get_counts(), expected)
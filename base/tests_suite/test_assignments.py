@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from .. import models
+
+
+class TestAssignments(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("teacher", "teacher@test.com")
+        self.connectedclass = models.Class.create_new(
+            self.teacher, "Class", "ANIMAL_SCIENCE_422", "", 5, 10
+        )
+        self.url = f"/class/{self.connectedclass.id}/assignments"
+        self.client.force_login(self.teacher)
+
+    def add_enrollment(self, name: str) -> models.Enrollment:
+        student = User.objects.create_user(
+            name, f"{name}@test.com", first_name=name
+        )
+        return models.Enrollment.create_from_enrollment_request(
+            models.EnrollmentRequest.create_new(student, self.connectedclass)
+        )
+
+    def add_assignment(self, days: int) -> models.Assignment:
+        return models.Assignment.create_new(
+            f"Due in {days}",
+            now() - timedelta(days=10),
+            now() + timedelta(days=days),
+            [
+                models.AssignmentStep.CHOICE_MALE_SUBMISSION,
+                models.AssignmentStep.CHOICE_BREED,
+            ],
+            self.connectedclass,
+        )
+
+    def test_assignments_query_count(self):
+        self.add_enrollment("b")
+        self.add_assignment(1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+
+        a = self.add_enrollment("a")
+        self.add_enrollment("c")
+        late = self.add_assignment(-1)
+        self.add_assignment(2)
+        models.AssignmentFulfillment.objects.filter(
+            enrollment=a, assignment=late
+        ).update(current_step=2)
+
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(self.url)
+
+        assignments = response.context["assignments"]
+        enrollments = response.context["enrollments"]
+        self.assertEqual(
+            [x.student.first_name for x in enrollments], ["a", "b", "c"]
+        )
+        self.assertEqual(assignments[0][0], late)
+        for assignment, steps, fulfillments in assignments:
+            self.assertEqual(steps, 2)
+            for fulfillment, enrollment in zip(fulfillments, enrollments):
+                self.assertEqual(fulfillment.assignment_id, assignment.id)
+                self.assertIs(fulfillment.enrollment, enrollment)
+
+        self.assertContains(response, '<div class="complete">', count=1)
+        self.assertContains(response, '<div class="missed">', count=2)
+        self.assertContains(response, '<div class="inprogress">', count=6)
@@ -0,0 +1,171 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils.timezone import now
+
+from .. import forms, models
+from ..views_utils import ClassAuth
+
+
+class TestBreeding(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("teacher", "teacher@test.com")
+        self.connectedclass = models.Class.create_new(
+            self.teacher, "Class", "ANIMAL_SCIENCE_422", "", 5, 10
+        )
+        self.student = User.objects.create_user(
+            "student", "student@test.com", first_name="Student"
+        )
+        self.enrollment = models.Enrollment.create_from_enrollment_request(
+            models.EnrollmentRequest.create_new(
+                self.student, self.connectedclass
+            )
+        )
+        self.class_auth = ClassAuth.Student(self.enrollment)
+
+        other = models.Class.create_new(
+            self.teacher, "Other", "ANIMAL_SCIENCE_422", "", 5, 10
+        )
+        self.foreign_male = models.Animal.objects.filter(
+            herd=other.class_herd, male=True
+        ).first()
+
+    def validate_males(self, males) -> tuple[bool, list[models.Animal]]:
+        form = forms.BreedHerd()
+        form.cleaned_data = {"males": males}
+        form.validation_catch = forms.BreedHerd.ValidationCatch()
+
+        valid = form.validate_males(self.class_auth)
+        return valid, form.validation_catch.__dict__.get("males", [])
+
+    def test_validate_males(self):
+        class_males = list(
+            models.Animal.objects.filter(
+                herd=self.connectedclass.class_herd, male=True
+            )
+        )
+        own_male = models.Animal.objects.filter(
+            herd=self.enrollment.herd, male=True
+        ).first()
+        female = models.Animal.objects.filter(
+            herd=self.connectedclass.class_herd, male=False
+        ).first()
+        dead = class_males[0]
+        dead.herd = None
+        dead.save()
+
+        males = [class_males[1], own_male, class_males[1]]
+        with self.assertNumQueries(1):
+            valid, catch = self.validate_males([x.id for x in males])
+
+        self.assertTrue(valid)
+        self.assertEqual(catch, males)
+        self.assertEqual(
+            self.validate_males([str(own_male.id)]), (True, [own_male])
+        )
+
+        for invalid in [
+            [own_male.id, self.foreign_male.id],
+            [own_male.id, female.id],
+            [own_male.id, dead.id],
+            [own_male.id, max(x.id for x in class_males) + 10_000],
+            [own_male.id, "male"],
+            [own_male.id, None],
+            {"id": own_male.id},
+        ]:
+            self.assertFalse(self.validate_males(invalid)[0], invalid)
+
+    def create_assignment(self, *steps: str) -> models.Assignment:
+        return models.Assignment.create_new(
+            "Assignment",
+            now() - timedelta(days=1),
+            now() + timedelta(days=1),
+            list(steps),
+            self.connectedclass,
+        )
+
+    def test_get_current_step(self):
+        assignment = self.create_assignment(
+            models.AssignmentStep.CHOICE_MALE_SUBMISSION,
+            models.AssignmentStep.CHOICE_BREED,
+        )
+        fulfillment = models.AssignmentFulfillment.objects.get(
+            assignment=assignment, enrollment=self.enrollment
+        )
+        fulfillment.current_step = 1
+        fulfillment.save()
+
+        with self.assertNumQueries(1):
+            current, step = models.AssignmentFulfillment.get_current_step(
+                assignment.id, self.enrollment
+            )
+            self.assertEqual(current.assignment, assignment)
+
+        self.assertEqual(current, fulfillment)
+        self.assertEqual(
+            step,
+            models.AssignmentStep.objects.get(assignment=assignment, number=1),
+        )
+        self.assertEqual(step.step, models.AssignmentStep.CHOICE_BREED)
+
+        # Past the last step, or not an assignment of the enrollment
+        fulfillment.current_step = 2
+        fulfillment.save()
+        other = models.Assignment.create_new(
+            "Other",
+            now(),
+            now(),
+            [models.AssignmentStep.CHOICE_BREED],
+            models.Class.objects.exclude(id=self.connectedclass.id).get(),
+        )
+        for assignmentid in [assignment.id, other.id, other.id + 1]:
+            self.assertIsNone(
+                models.AssignmentFulfillment.get_current_step(
+                    assignmentid, self.enrollment
+                )
+            )
+
+    def test_validate_assignment(self):
+        male = models.Animal.objects.filter(
+            herd=self.enrollment.herd, male=True
+        ).first()
+        assignment = self.create_assignment(
+            models.AssignmentStep.CHOICE_BREED,
+            models.AssignmentStep.CHOICE_FEMALE_SUBMISSION,
+        )
+
+        data = {"males": f"[{male.id}]", "assignment": assignment.id}
+        breed = forms.BreedHerd(data)
+        submit = forms.SubmitAnimal({"assignment": assignment.id})
+        self.assertTrue(breed.is_valid(self.class_auth))
+        self.assertFalse(submit.is_valid(self.class_auth))
+        self.assertEqual(breed.validation_catch.assignment, assignment)
+        self.assertEqual(breed.validation_catch.assignment_step.number, 0)
+
+        models.AssignmentFulfillment.objects.update(current_step=1)
+        breed = forms.BreedHerd(data)
+        submit = forms.SubmitAnimal({"assignment": assignment.id})
+        self.assertFalse(breed.is_valid(self.class_auth))
+        self.assertTrue(submit.is_valid(self.class_auth))
+
+    def test_open_assignments_json_dict(self):
+        assignments = [
+            self.create_assignment(models.AssignmentStep.CHOICE_BREED)
+            for _ in range(3)
+        ]
+        models.AssignmentFulfillment.objects.filter(
+            assignment=assignments[1]
+        ).update(current_step=1)
+
+        with self.assertNumQueries(3):
+            json = self.enrollment.get_open_assignments_json_dict()
+
+        self.assertEqual(list(json), [x.id for x in assignments])
+        self.assertEqual([x["fulfillment"] for x in json.values()], [0, 1, 0])
+        self.assertEqual(
+            json[assignments[0].id]["steps"],
+            [{"key": "breed", "verbose": "Breed"}],
+        )
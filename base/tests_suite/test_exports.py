@@ -0,0 +1,226 @@
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.test import TestCase, override_settings
+import numpy as np
+
+from .. import csv
+from .. import models
+from .. import names as nms
+from .. import npz
+from ..sinks import ExportSink
+from ..traitsets import get_traitset
+
+
+class TestExports(TestCase):
+    SITE = "https://herdgen.test"
+
+    def setUp(self):
+        self.teacher = User.objects.create_user("teacher", "teacher@test.com")
+        self.connectedclass = models.Class.create_new(
+            self.teacher, "Class", "ANIMAL_SCIENCE_422", "", 5, 10
+        )
+        self.client.force_login(self.teacher)
+
+    def get_expected_csv(self) -> bytes:
+        headers = self.connectedclass.get_animal_file_headers()
+        data_keys = self.connectedclass.get_animal_file_data_order()
+
+        file = csv.convert_data_row(headers) + csv.ROW_SEP
+        for animal in models.Animal.objects.filter(
+            connectedclass=self.connectedclass
+        ):
+            file += csv.convert_data_row(
+                [animal.resolve_data_key(x) for x in data_keys]
+            )
+            file += csv.ROW_SEP
+
+        return file.encode("utf-8")
+
+    def test_download_animal_chart(self):
+        response = self.client.get(
+            f"/class/{self.connectedclass.id}/download-animal-chart"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            b"".join(response.streaming_content), self.get_expected_csv()
+        )
+
+    def test_get_trend_chart(self):
+        for _ in range(3):
+            self.connectedclass.update_trend_log([], [])
+
+        response = self.client.get(
+            f"/class/{self.connectedclass.id}/get-trend-chart"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        snapshots = self.connectedclass.trend_snapshots.order_by("id")
+
+        self.assertEqual(len(lines), 1 + snapshots.count())
+        self.assertEqual(
+            lines[1].split(csv.COL_SEP)[:3],
+            [
+                snapshots[0].timestamp.isoformat(),
+                str(snapshots[0].population_size),
+                str(snapshots[0].net_merit),
+            ],
+        )
+
+    def test_iter_animal_csv_chunks(self):
+        chunks = list(csv.iter_animal_csv(self.connectedclass, 4))
+
+        # Header, then 15 animals in chunks of 4 rows
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(b"".join(chunks), self.get_expected_csv())
+
+    def test_animal_file_writer_fallbacks(self):
+        # Animals without a herd, or whose traits could not be packed
+        traitset = get_traitset(self.connectedclass.traitset)
+        animals = models.Animal.objects.filter(
+            connectedclass=self.connectedclass
+        )
+        models.Animal.objects.filter(id__in=animals.values("id")[:3]).update(
+            herd=None
+        )
+        for animal in list(animals)[5:9]:
+            for key in csv.AnimalFileWriter.TRAIT_KEYS:
+                setattr(animal, key, animal.get_traits(key, traitset))
+                setattr(animal, f"{key}_packed", None)
+            animal.save()
+
+        self.assertEqual(
+            b"".join(csv.iter_animal_csv(self.connectedclass)),
+            self.get_expected_csv(),
+        )
+
+    def test_animal_file_writer_precision(self):
+        lines = (
+            b"".join(csv.iter_animal_csv(self.connectedclass, precision=2))
+            .decode("utf-8")
+            .splitlines()
+        )
+        expected = self.get_expected_csv().decode("utf-8").splitlines()
+
+        self.assertEqual(lines[0], expected[0])
+        for line, expected_line in zip(lines[1:], expected[1:]):
+            for cell, expected_cell in zip(
+                line.split(csv.COL_SEP), expected_line.split(csv.COL_SEP)
+            ):
+                if "." in expected_cell and cell != expected_cell:
+                    self.assertEqual(len(cell.split(".")[1]), 2)
+                    self.assertAlmostEqual(
+                        float(cell), float(expected_cell), places=2
+                    )
+                else:
+                    self.assertEqual(cell, expected_cell)
+
+    def get_local_export_url(self) -> str:
+        "Relative url of the last download link emailed"
+
+        link = mail.outbox[-1].body.split()[-1]
+        self.assertTrue(link.startswith(f"{self.SITE}/exports/"))
+        return link.removeprefix(self.SITE)
+
+    def get_local_export(self, url: str) -> bytes:
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_create_animal_csv_local_sink(self):
+        with TemporaryDirectory() as directory:
+            with override_settings(
+                EXPORT_SINK="local",
+                EXPORT_DIRECTORY=directory,
+                EXPORT_BASE_URL=f"{self.SITE}/",
+            ):
+                csv.create_animal_csv.now(
+                    self.connectedclass.id, self.teacher.id
+                )
+
+                (path,) = Path(directory).glob("animal_charts/*.csv")
+                self.assertEqual(path.read_bytes(), self.get_expected_csv())
+
+                url = self.get_local_export_url()
+                self.assertEqual(
+                    self.get_local_export(url), self.get_expected_csv()
+                )
+
+                # Only the user the file was exported for may download it
+                self.assertEqual(self.client.get(url + "x").status_code, 404)
+                other = User.objects.create_user("other", "other@test.com")
+                self.client.force_login(other)
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_incomplete_sink(self):
+        class WriteOnlySink(ExportSink):
+            def write(self, data: bytes) -> None:
+                pass
+
+        with self.assertRaises(TypeError):
+            WriteOnlySink("file.csv", self.teacher.id)
+
+    def test_create_animal_npz_local_sink(self):
+        with TemporaryDirectory() as directory:
+            with override_settings(
+                EXPORT_SINK="local",
+                EXPORT_DIRECTORY=directory,
+                EXPORT_BASE_URL=self.SITE,
+            ):
+                npz.create_animal_npz.now(
+                    self.connectedclass.id, self.teacher.id
+                )
+
+                (path,) = Path(directory).glob("animal_charts/*.npz")
+                (schema_path,) = Path(directory).glob("animal_charts/*.json")
+                schema = json.loads(schema_path.read_text())
+
+                url = self.get_local_export_url()
+                self.assertEqual(
+                    self.get_local_export(url), schema_path.read_bytes()
+                )
+
+            with np.load(path) as data:
+                arrays = {key: data[key] for key in data.files}
+
+        self.assertEqual(schema["animals"], 15)
+        self.assertEqual(set(arrays), set(schema["arrays"]))
+
+        # Same columns, headers and values as the csv
+        headers = []
+        columns = []
+        for key, entry in schema["arrays"].items():
+            array = arrays[key]
+            self.assertEqual(array.dtype.str, entry["dtype"])
+            self.assertEqual(list(array.shape), entry["shape"])
+
+            if array.ndim == 1:
+                headers.append(entry["header"])
+                columns.append(array)
+            else:
+                headers += entry["headers"]
+                if key == nms.FORMATTED_RECESSIVES_KEY:
+                    array = np.array(entry["codes"], dtype=object)[array]
+
+                columns += list(array.T)
+
+        lines = self.get_expected_csv().decode("utf-8").splitlines()
+        self.assertEqual(csv.convert_data_row(headers), lines[0])
+
+        for index, line in enumerate(lines[1:]):
+            for column, cell in zip(columns, line.split(csv.COL_SEP)):
+                value = column[index]
+                if cell == "~":
+                    # Missing values: "", -1, nan or no recessive code
+                    self.assertTrue(value in [None, "", -1] or value != value)
+                elif isinstance(value, np.floating):
+                    self.assertAlmostEqual(value, float(cell))
+                else:
+                    self.assertEqual(str(value), cell)
@@ -0,0 +1,260 @@
+import json
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from .. import models
+from .. import names as nms
+from ..traitsets import get_traitset
+from ..traitsets.traitset import HOMOZYGOUS_CARRIER_KEY
+
+
+class TestHerds(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user("teacher", "teacher@test.com")
+        self.connectedclass = models.Class.create_new(
+            self.teacher, "Class", "ANIMAL_SCIENCE_422", "", 5, 10
+        )
+        self.herd = self.connectedclass.class_herd
+        self.url = f"/class/{self.connectedclass.id}/herd/{self.herd.id}/get"
+        self.client.force_login(self.teacher)
+
+    def test_get_herd_without_query(self):
+        json = self.client.get(self.url).json()
+
+        self.assertEqual(len(json["animals"]), 15)
+        self.assertNotIn("order", json)
+
+    def test_get_herd_page(self):
+        full = self.client.get(self.url).json()
+        json = self.client.get(
+            self.url,
+            {
+                "page": 2,
+                "per_page": 4,
+                "sort": "genotype,MILK",
+                "descending": "true",
+                "sex": "female",
+                "fields": "id,genotype",
+            },
+        ).json()
+
+        females = sorted(
+            (x for x in full["animals"].values() if not x[nms.MALE_KEY]),
+            key=lambda x: -x[nms.GENOTYPE_KEY]["MILK"],
+        )
+
+        self.assertEqual(json["count"], 10)
+        self.assertEqual(json["pages"], 3)
+        self.assertEqual(json["order"], [x["id"] for x in females[4:8]])
+        self.assertEqual(
+            set(json["animals"][str(json["order"][0])]), {"id", "genotype"}
+        )
+
+        for key in [nms.GENOTYPE_KEY, nms.PHENOTYPE_KEY, nms.PTA_KEY]:
+            for uid, mean in full["summary"][key].items():
+                self.assertAlmostEqual(json["summary"][key][uid], mean)
+
+    def test_get_herd_sort_unknown_phenotypes_last(self):
+        males = list(
+            models.Animal.objects.filter(herd=self.herd, male=True)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+        for descending in ["false", "true"]:
+            json = self.client.get(
+                self.url,
+                {"sort": "phenotype,MILK", "descending": descending},
+            ).json()
+
+            self.assertEqual(json["order"][-len(males) :], males)
+
+    def test_trait_sort_order_is_cached(self):
+        query = models.Herd.Query(sort=("ptas", "MILK"), descending=True)
+        females = models.Herd.Query(
+            sort=("ptas", "MILK"), descending=True, male=False
+        )
+
+        with patch.object(
+            models.Animal,
+            "unpack_trait_rows",
+            wraps=models.Animal.unpack_trait_rows,
+        ) as unpack:
+            order = self.herd.query_animal_ids(query)
+            female_order = self.herd.query_animal_ids(females)
+            self.assertEqual(unpack.call_count, 1)
+
+            self.herd.increment_version()
+            self.herd.refresh_from_db()
+            self.assertEqual(self.herd.query_animal_ids(query), order)
+            self.assertEqual(unpack.call_count, 2)
+
+        self.assertEqual(len(order), 15)
+        self.assertEqual(
+            female_order,
+            [x for x in order if not models.Animal.objects.get(id=x).male],
+        )
+
+    def test_get_herd_search_and_animal(self):
+        animal = models.Animal.objects.filter(herd=self.herd).first()
+        animal.name = "Bessie"
+        animal.save()
+        self.herd.increment_version()
+
+        for contains in ["bessie", "BESSIE", "eSs"]:
+            json = self.client.get(self.url, {"contains": contains}).json()
+            self.assertEqual(json["order"], [animal.id])
+
+        json = self.client.get(
+            self.url, {"id": animal.id, "fields": "id,name"}
+        ).json()
+        self.assertEqual(json["order"], [animal.id])
+        self.assertEqual(
+            json["animals"][str(animal.id)],
+            {"id": animal.id, "name": "Bessie"},
+        )
+
+    def test_get_herd_rejects_hidden_sort(self):
+        self.connectedclass.trait_visibility["MILK"] = [False, True, True]
+        self.connectedclass.net_merit_visibility = False
+        self.connectedclass.save()
+
+        for sort in ["genotype,MILK", "NM$", "genotype,UNKNOWN", "pedigree"]:
+            response = self.client.get(self.url, {"sort": sort})
+            self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(self.url, {"sort": "phenotype,MILK"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_herd_etag(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+
+        response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(
+            self.url, {"page": 1}, headers={"if-none-match": etag}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        sires = list(models.Animal.objects.filter(herd=self.herd, male=True))
+        self.herd.breed_herd(sires, "")
+
+        response = self.client.get(self.url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["breedings"], 1)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_get_cached_json_skips_outdated(self):
+        json_dict = models.Herd.json_dict
+
+        def json_dict_during_breeding(herd, query=None):
+            # Another request changes the herd while it is serialized
+            models.Herd.increment_versions(
+                models.Herd.objects.filter(id=herd.id)
+            )
+            return json_dict(herd, query)
+
+        with patch.object(models.Herd, "json_dict", json_dict_during_breeding):
+            self.herd.get_cached_json()
+
+        self.assertIsNone(cache.get(f"herd-json-{self.herd.get_json_key()}"))
+
+        self.herd.refresh_from_db()
+        self.herd.get_cached_json()
+        self.assertIsNotNone(
+            cache.get(f"herd-json-{self.herd.get_json_key()}")
+        )
+
+    def test_visibility_change_increments_version(self):
+        version = self.herd.version
+        visibility = self.connectedclass.trait_visibility
+        data = {
+            "name": self.connectedclass.name,
+            "info": "",
+            "default_animal": self.connectedclass.default_animal,
+            "genotype_visibility": [x for x in visibility if x != "MILK"],
+            "phenotype_visibility": list(visibility),
+            "pta_visibility": list(visibility),
+            "recessive_visibility": list(
+                self.connectedclass.recessive_visibility
+            ),
+            "net_merit_visibility": True,
+            "allow_other_animals": True,
+            "allow_herd_rename": True,
+            "quarantine_days": 0,
+        }
+
+        response = self.client.post(f"/class/{self.connectedclass.id}", data)
+
+        self.herd.refresh_from_db()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.herd.version, version + 1)
+
+    def test_serializer_matches_json_dict(self):
+        self.connectedclass.trait_visibility["MILK"] = [False, True, False]
+        self.connectedclass.trait_visibility["FAT"] = [True, False, True]
+        recessive = next(iter(self.connectedclass.recessive_visibility))
+        self.connectedclass.recessive_visibility[recessive] = False
+        self.connectedclass.hide_female_pta = True
+        self.connectedclass.net_merit_visibility = False
+        self.connectedclass.save()
+
+        animals = list(
+            models.Animal.objects.select_related("connectedclass").filter(
+                herd=self.herd
+            )
+        )
+        serialized = models.AnimalSerializer(
+            self.connectedclass
+        ).serialize_all(animals)
+
+        for animal in animals:
+            self.assertEqual(
+                json.dumps(serialized[animal.id]),
+                json.dumps(animal.json_dict()),
+            )
+
+    def test_breed_herd_removes_dead_animals(self):
+        traitset = get_traitset(self.connectedclass.traitset)
+        fatal = sorted(traitset.fatal_recessive_uids)
+        animals = models.Animal.objects.filter(herd=self.herd)
+        sires = list(animals.filter(male=True))
+
+        # A starter animal with a fatal recessive and one too old to breed
+        carrier = animals.filter(male=False).first()
+        carrier.recessives[fatal[0]] = HOMOZYGOUS_CARRIER_KEY
+        carrier.recessives[fatal[1]] = HOMOZYGOUS_CARRIER_KEY
+        carrier.save()
+        old = animals.filter(male=False).exclude(id=carrier.id).first()
+        old.generation = -10
+        old.save()
+
+        results = self.herd.breed_herd(sires, "")
+
+        everyone = models.Animal.objects.filter(
+            connectedclass=self.connectedclass
+        )
+        fatal_animals = {
+            x
+            for x in everyone
+            if any(
+                x.recessives[uid] == HOMOZYGOUS_CARRIER_KEY for uid in fatal
+            )
+        }
+
+        self.assertIn(carrier, fatal_animals)
+        self.assertEqual(
+            set(everyone.filter(herd__isnull=True)), fatal_animals | {old}
+        )
+        self.assertEqual(results.recessive_deaths, len(fatal_animals))
+        self.assertEqual(results.age_deaths, 1)
+        self.assertEqual(
+            self.connectedclass.trend_snapshots.latest("id").population_size,
+            animals.count(),
+        )
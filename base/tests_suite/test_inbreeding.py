@@ -0,0 +1,134 @@
+from random import Random
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TestCase
+from inbreeding_calculator import InbreedingCalculator
+
+from .. import models
+from ..inbreeding import InbreedingEngine, get_inbreeding_engine
+from ..pedigree import AncestryIndex, ancestry_indexes, get_ancestry_index
+
+
+class TestInbreeding(TestCase):
+    def setUp(self):
+        ancestry_indexes.clear()
+
+    @staticmethod
+    def get_closed_population(size: int, founders: int) -> AncestryIndex:
+        """Random mating in a small closed population so most animals are
+        inbred through several paths. Kept small, the path method used by
+        InbreedingCalculator is exponential in pedigree depth."""
+
+        rng = Random(1)
+        ancestry = AncestryIndex(0)
+        for animal_id in range(1, founders + 1):
+            ancestry.add(animal_id, None, None)
+
+        for animal_id in range(founders + 1, size + 1):
+            candidates = range(max(1, animal_id - 3 * founders), animal_id)
+            sire_id, dam_id = rng.sample(candidates, 2)
+            ancestry.add(animal_id, sire_id, dam_id)
+
+        return ancestry
+
+    def test_matches_calculator(self):
+        ancestry = self.get_closed_population(60, 6)
+        engine = InbreedingEngine(ancestry)
+
+        for animal_id in range(40, 61):
+            self.assertAlmostEqual(
+                engine.get_inbreeding(animal_id),
+                InbreedingCalculator(
+                    ancestry.get_pedigree(animal_id)
+                ).get_coefficient(),
+            )
+
+    def test_offspring_inbreedings(self):
+        ancestry = self.get_closed_population(60, 6)
+        engine = InbreedingEngine(ancestry)
+        parents = [(58, 59), (60, 57), (58, 59), (5, 6), (7, None)]
+
+        self.assertEqual(
+            engine.get_offspring_inbreedings(parents),
+            [engine.get_offspring_inbreeding(*x) for x in parents],
+        )
+
+        for (sire_id, dam_id), inbreeding in zip(
+            parents, engine.get_offspring_inbreedings(parents)
+        ):
+            self.assertAlmostEqual(
+                inbreeding,
+                InbreedingCalculator(
+                    {
+                        "sire": ancestry.get_pedigree(sire_id),
+                        "dam": ancestry.get_pedigree(dam_id),
+                        "id": None,
+                    }
+                ).get_coefficient(),
+            )
+
+    def test_known_coefficients(self):
+        ancestry = AncestryIndex(0)
+        ancestry.add(1, None, None)
+        ancestry.add(2, None, None)
+        ancestry.add(3, 1, 2)
+        ancestry.add(4, 1, 2)
+        ancestry.add(5, 3, 4)
+        engine = InbreedingEngine(ancestry)
+
+        self.assertEqual(engine.get_inbreeding(3), 0)
+        self.assertAlmostEqual(engine.get_inbreeding(5), 0.25)
+        self.assertAlmostEqual(engine.get_offspring_inbreeding(5, 3), 0.375)
+
+    def test_breed_herd(self):
+        teacher = User.objects.create_user("teacher", "teacher@test.com")
+        connectedclass = models.Class.create_new(
+            teacher, "Class", "ANIMAL_SCIENCE_422", "", 2, 6
+        )
+        herd = connectedclass.class_herd
+        sires = list(models.Animal.objects.filter(herd=herd, male=True))
+
+        for _ in range(4):
+            herd.breed_herd(sires, "")
+
+        ancestry_indexes.clear()
+        for animal in models.Animal.objects.filter(
+            connectedclass=connectedclass, generation__gt=1
+        ):
+            self.assertAlmostEqual(
+                animal.inbreeding,
+                InbreedingCalculator(animal.get_pedigree()).get_coefficient(),
+            )
+
+    def test_breed_herd_caches_calves_on_commit(self):
+        teacher = User.objects.create_user("teacher", "teacher@test.com")
+        connectedclass = models.Class.create_new(
+            teacher, "Class", "ANIMAL_SCIENCE_422", "", 2, 6
+        )
+        herd = connectedclass.class_herd
+        sires = list(models.Animal.objects.filter(herd=herd, male=True))
+        ancestry = get_ancestry_index(connectedclass.id)
+        engine = get_inbreeding_engine(connectedclass.id)
+        animals = models.Animal.objects.filter(connectedclass=connectedclass)
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                herd.breed_herd(sires, "")
+                rolled_back = list(animals.filter(generation=1))
+                raise RuntimeError()
+
+        herd.refresh_from_db()
+        self.assertTrue(rolled_back)
+        for animal in rolled_back:
+            self.assertNotIn(animal.id, ancestry.parents)
+            self.assertNotIn(animal.id, engine.inbreeding)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            herd.breed_herd(sires, "")
+
+        for animal in animals.filter(generation=1):
+            self.assertEqual(
+                ancestry.parents[animal.id], (animal.sire_id, animal.dam_id)
+            )
+            self.assertEqual(engine.inbreeding[animal.id], animal.inbreeding)
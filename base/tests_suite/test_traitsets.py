@@ -1,15 +1,17 @@
 from django.test import TestCase
-from ..traitsets import Traitset, REGISTERED
-from ..traitsets.traitset import Trait, Recessive
+from ..traitsets import Traitset, REGISTERED, get_traitset
+from ..traitsets.traitset import Trait, Recessive, get_cholesky_factor
 from random import random
 
+import numpy as np
+
 
 class TestTraitsets(TestCase):
     def _test_on_each(self, func):
         for registration in REGISTERED:
             try:
                 traitset = Traitset(registration.name)
-            except (KeyError, FileNotFoundError) as e:
+            except (KeyError, FileNotFoundError, ValueError) as e:
                 self.fail(
                     f"Error Loading Traitset '{registration.name}': {
                         type(e).__name__
@@ -110,6 +112,20 @@ class TestTraitsets(TestCase):
 
         self._test_on_each(test)
 
+    def test_lookup_indexes(self):
+        def test(x: Traitset):
+            for idx, trait in enumerate(x.traits):
+                self.assertIs(x.traits_by_uid[trait.uid], trait)
+                self.assertEqual(x.trait_indexes[trait.uid], idx)
+
+            for recessive in x.recessives:
+                self.assertIs(x.recessives_by_uid[recessive.uid], recessive)
+                self.assertEqual(
+                    recessive.uid in x.fatal_recessive_uids, recessive.fatal
+                )
+
+        self._test_on_each(test)
+
     def test_find_recessive_or_null(self):
         def test(x: Traitset):
             for uid in x.recessives:
@@ -119,3 +135,115 @@ class TestTraitsets(TestCase):
             self.assertIsNone(x.find_recessive_or_null(str(random())))
 
         self._test_on_each(test)
+
+    def test_get_random_genotypes(self):
+        def test(x: Traitset):
+            gen = x.get_random_genotypes(20_000)
+            self.assertEqual(gen.shape, (20_000, len(x.traits)))
+
+            np.testing.assert_allclose(
+                np.cov(gen, rowvar=False),
+                np.array(x.genotype_correlations),
+                atol=0.05,
+            )
+
+        self._test_on_each(test)
+
+    def test_breed(self):
+        def test(x: Traitset):
+            sires = x.to_trait_matrix(
+                [x.get_random_genotype() for _ in range(5)]
+            )
+            dams = x.to_trait_matrix(
+                [x.get_random_genotype() for _ in range(5)]
+            )
+            batch = x.breed(sires, dams, np.full(5, 0.1))
+
+            self.assertEqual(batch.genotypes.shape, (5, len(x.traits)))
+            self.assertEqual(batch.phenotypes.shape, (5, len(x.traits)))
+            self.assertEqual(batch.ptas.shape, (5, len(x.traits)))
+            self.assertEqual(batch.net_merits.shape, (5,))
+
+            gen = x.from_trait_array(batch.genotypes[0])
+            self.assertAlmostEqual(
+                batch.net_merits[0], x.derive_net_merit_from_genotype(gen)
+            )
+
+        self._test_on_each(test)
+
+    def test_derive_ptas_from_genotypes(self):
+        def test(x: Traitset):
+            genotypes = [x.get_random_genotype() for _ in range(6)]
+            daughters = [0, 3, 0, 3, 10, 0]
+            tests = [0, 1, 0, 1, 2, 5]
+
+            np.random.seed(0)
+            expected = x.to_trait_matrix(
+                [
+                    x.derive_ptas_from_genotype(*args)
+                    for args in zip(genotypes, daughters, tests)
+                ]
+            )
+
+            np.random.seed(0)
+            np.testing.assert_allclose(
+                x.derive_ptas_from_genotypes(
+                    x.to_trait_matrix(genotypes),
+                    np.array(daughters),
+                    np.array(tests),
+                ),
+                expected,
+            )
+
+            ptas = x.derive_ptas_from_genotypes(
+                x.to_trait_matrix(genotypes), 0, 0, np.random.default_rng(1)
+            )
+            np.testing.assert_array_equal(
+                ptas,
+                x.derive_ptas_from_genotypes(
+                    x.to_trait_matrix(genotypes), 0, 0, np.random.default_rng(1)
+                ),
+            )
+
+        self._test_on_each(test)
+
+    def test_cholesky_factors(self):
+        def test(x: Traitset):
+            for factor, correlations in [
+                (x.genotype_cholesky, x.genotype_correlations),
+                (x.phenotype_cholesky, x.phenotype_correlations),
+            ]:
+                self.assertTrue(factor.flags.c_contiguous)
+                np.testing.assert_allclose(
+                    factor @ factor.T, np.array(correlations), atol=1e-12
+                )
+
+        self._test_on_each(test)
+
+    def test_get_cholesky_factor_rejects_invalid(self):
+        with self.assertRaises(ValueError):
+            get_cholesky_factor(((1, 0.9), (0.9, 1)), 3, "Test")
+
+        with self.assertRaises(ValueError):
+            get_cholesky_factor(((1, 0.5), (0.2, 1)), 2, "Test")
+
+        with self.assertRaises(ValueError):
+            get_cholesky_factor(((1, 2), (2, 1)), 2, "Test")
+
+    def test_registry_shares_instances(self):
+        for registration in REGISTERED:
+            traitset = get_traitset(registration.name)
+            self.assertIs(traitset, get_traitset(registration.name))
+
+    def test_traitset_is_frozen(self):
+        def test(x: Traitset):
+            with self.assertRaises(AttributeError):
+                x.name = "other"
+
+            with self.assertRaises(AttributeError):
+                x.traits[0].heritability = 1
+
+            with self.assertRaises(TypeError):
+                x.animals["other"] = None
+
+        self._test_on_each(test)
@@ -1,4 +1,5 @@
 from .registration import Registration
+from .registry import get_traitset, registry
 from .traitset import Traitset, DOCUMENTED_FUNCS
 
 REGISTERED = [
@@ -0,0 +1,59 @@
+from os import stat
+from threading import Lock
+from typing import Iterable
+
+from .traitset import Traitset
+
+
+class TraitsetRegistry:
+    """Process wide store of loaded traitsets.
+
+    Each traitset is parsed once and handed out as a shared, frozen
+    instance. Entries are keyed by name and file stamp (mtime and size) so
+    an edited traitset file is reloaded on its next lookup."""
+
+    _entries: dict[str, tuple[tuple[int, int], Traitset]]
+    _lock: Lock
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def get_stamp(name: str) -> tuple[int, int]:
+        stats = stat(Traitset.get_path_for(name))
+        return stats.st_mtime_ns, stats.st_size
+
+    def get(self, name: str) -> Traitset:
+        stamp = self.get_stamp(name)
+
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+
+            traitset = Traitset(name)
+            self._entries[name] = (stamp, traitset)
+
+        return traitset
+
+    def warm(self, names: Iterable[str]) -> None:
+        for name in names:
+            self.get(name)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+registry = TraitsetRegistry()
+
+
+def get_traitset(name: str) -> Traitset:
+    """Get the shared instance of a traitset"""
+
+    return registry.get(name)
@@ -1,7 +1,8 @@
 from json import load
 from pathlib import Path
 from random import random
-from typing import Callable, Optional, Type
+from types import MappingProxyType
+from typing import Callable, Mapping, Optional, Type
 
 from django.utils.html import SafeString
 import numpy as np
@@ -61,19 +62,42 @@ HETEROZYGOUS_KEY = "he"
 HOMOZYGOUS_CARRIER_KEY = "ho(c)"
 HOMOZYGOUS_FREE_KEY = "ho(f)"
 
+PACKED_DTYPE = np.dtype("<f8")
+
 PHENOTYPE_PREFIX_KEY = "phenotype_prefix"
 GENOTYPE_PREFIX_KEY = "genotype_prefix"
 PTA_PREFIX_KEY = "pta_prefix"
 
 
-class RecessiveAnimalFilter:
+class Frozen:
+    """Blocks attribute assignment once freeze has been called.
+
+    Traitsets are shared between requests by the registry, so nothing may
+    modify one after it has been loaded."""
+
+    _frozen: bool = False
+
+    def freeze(self) -> None:
+        object.__setattr__(self, "_frozen", True)
+
+    def __setattr__(self, name: str, value) -> None:
+        if self._frozen:
+            raise AttributeError(
+                f"Cannot set '{name}': {type(self).__name__} is frozen"
+            )
+
+        super().__setattr__(name, value)
+
+
+class RecessiveAnimalFilter(Frozen):
     name: str
 
     def __init__(self, name: str):
         self.name = name
+        self.freeze()
 
 
-class TraitAnimalFilter:
+class TraitAnimalFilter(Frozen):
     name: str
     standard_deviation: float
     phenotype_average: float
@@ -90,9 +114,10 @@ class TraitAnimalFilter:
         self.standard_deviation = standard_deviation
         self.phenotype_average = phenotype_average
         self.unit = unit
+        self.freeze()
 
 
-class TraitsetAnimalFilter:
+class TraitsetAnimalFilter(Frozen):
     herd: str
     male: str
     female: str
@@ -136,15 +161,16 @@ class TraitsetAnimalFilter:
         self.genotype_prefix = genotype_prefix
         self.phenotype_prefix = phenotype_prefix
         self.pta_prefix = pta_prefix
+        self.freeze()
 
 
-class Trait:
+class Trait(Frozen):
     uid: str
     heritability: float
     net_merit_dollars: float
     inbreeding_depression_percentage: float
     calculated_standard_deviation: float
-    animals: dict[str, TraitAnimalFilter]
+    animals: Mapping[str, TraitAnimalFilter]
 
     def __init__(
         self,
@@ -162,7 +188,8 @@ class Trait:
             inbreeding_depression_percentage
         )
         self.calculated_standard_deviation = calculated_standard_deviation
-        self.animals = animals
+        self.animals = MappingProxyType(animals)
+        self.freeze()
 
     @classmethod
     @document(
@@ -309,11 +336,11 @@ class Trait:
         return genotype * self.net_merit_dollars
 
 
-class Recessive:
+class Recessive(Frozen):
     uid: str
     fatal: bool
     prevalence_percent: float
-    animals: dict[str, RecessiveAnimalFilter]
+    animals: Mapping[str, RecessiveAnimalFilter]
 
     def __init__(
         self,
@@ -325,7 +352,8 @@ class Recessive:
         self.uid = uid
         self.fatal = fatal
         self.prevalence_percent = prevalence_percent
-        self.animals = animals
+        self.animals = MappingProxyType(animals)
+        self.freeze()
 
     @classmethod
     @document("""random""")
@@ -387,15 +415,88 @@ class Recessive:
             return HOMOZYGOUS_FREE_KEY
 
 
-class Traitset:
+class BreedingBatch:
+    """Matrices produced by Traitset.breed, one row per offspring and one
+    column per trait in traitset order."""
+
+    genotypes: np.ndarray
+    phenotypes: np.ndarray
+    ptas: np.ndarray
+    net_merits: np.ndarray
+
+    def __init__(
+        self,
+        genotypes: np.ndarray,
+        phenotypes: np.ndarray,
+        ptas: np.ndarray,
+        net_merits: np.ndarray,
+    ):
+        self.genotypes = genotypes
+        self.phenotypes = phenotypes
+        self.ptas = ptas
+        self.net_merits = net_merits
+
+
+def read_only_array(values) -> np.ndarray:
+    array = np.array(values, dtype=np.float64)
+    array.flags.writeable = False
+    return array
+
+
+def get_cholesky_factor(
+    correlations: tuple[tuple[float, ...], ...], size: int, label: str
+) -> np.ndarray:
+    """Validate a correlation matrix and get its lower Cholesky factor.
+
+    Raises ValueError if the matrix is not a symmetric positive definite
+    (size x size) matrix."""
+
+    try:
+        matrix = np.array(correlations, dtype=np.float64)
+    except ValueError:
+        raise ValueError(f"{label} correlation matrix is not square")
+
+    if matrix.shape != (size, size):
+        raise ValueError(
+            f"{label} correlation matrix has shape {matrix.shape},"
+            + f" expected ({size}, {size})"
+        )
+
+    if not np.allclose(matrix, matrix.T):
+        raise ValueError(f"{label} correlation matrix is not symmetric")
+
+    try:
+        factor = np.linalg.cholesky(matrix)
+    except np.linalg.LinAlgError:
+        raise ValueError(
+            f"{label} correlation matrix is not positive definite"
+        )
+
+    factor = np.ascontiguousarray(factor)
+    factor.flags.writeable = False
+    return factor
+
+
+class Traitset(Frozen):
     name: str
     desc: str | None
-    traits: list[Trait]
-    recessives: list[Recessive]
-    genotype_correlations: list[list[float]]
-    phenotype_correlations: list[list[float]]
-    animals: dict[str, TraitsetAnimalFilter]
-    animal_choices: list[str]
+    traits: tuple[Trait, ...]
+    recessives: tuple[Recessive, ...]
+    genotype_correlations: tuple[tuple[float, ...], ...]
+    phenotype_correlations: tuple[tuple[float, ...], ...]
+    animals: Mapping[str, TraitsetAnimalFilter]
+    animal_choices: tuple[tuple[str, str], ...]
+    trait_uids: tuple[str, ...]
+    traits_by_uid: Mapping[str, Trait]
+    trait_indexes: Mapping[str, int]
+    recessives_by_uid: Mapping[str, Recessive]
+    fatal_recessive_uids: frozenset[str]
+    genotype_cholesky: np.ndarray
+    phenotype_cholesky: np.ndarray
+    standard_deviations: np.ndarray
+    heritabilities: np.ndarray
+    net_merit_dollars: np.ndarray
+    inbreeding_depression_percentages: np.ndarray
 
     def __init__(self, name: str):
         self.name = name
@@ -442,11 +543,15 @@ class Traitset:
             for x in recessives_dict
         ]
 
-        self.traits = traits
-        self.recessives = recessives
-        self.genotype_correlations = genotype_correlations_list
-        self.phenotype_correlations = phenotype_correlations_list
-        self.animals = {
+        self.traits = tuple(traits)
+        self.recessives = tuple(recessives)
+        self.genotype_correlations = tuple(
+            tuple(row) for row in genotype_correlations_list
+        )
+        self.phenotype_correlations = tuple(
+            tuple(row) for row in phenotype_correlations_list
+        )
+        animals = {
             x: TraitsetAnimalFilter(
                 animals_dict[x][HERD_KEY],
                 animals_dict[x][MALE_KEY],
@@ -465,7 +570,43 @@ class Traitset:
             for x in animals_dict
         }
 
-        self.animal_choices = [(x, x) for x in animals_dict]
+        self.animals = MappingProxyType(animals)
+        self.animal_choices = tuple((x, x) for x in animals_dict)
+
+        self.trait_uids = tuple(x.uid for x in self.traits)
+        self.traits_by_uid = MappingProxyType({x.uid: x for x in self.traits})
+        self.trait_indexes = MappingProxyType(
+            {uid: idx for idx, uid in enumerate(self.trait_uids)}
+        )
+        self.recessives_by_uid = MappingProxyType(
+            {x.uid: x for x in self.recessives}
+        )
+        self.fatal_recessive_uids = frozenset(
+            x.uid for x in self.recessives if x.fatal
+        )
+        try:
+            self.genotype_cholesky = get_cholesky_factor(
+                self.genotype_correlations, len(self.traits), "Genotype"
+            )
+            self.phenotype_cholesky = get_cholesky_factor(
+                self.phenotype_correlations, len(self.traits), "Phenotype"
+            )
+        except ValueError as e:
+            raise ValueError(f"Invalid traitset '{name}': {e}") from e
+
+        self.standard_deviations = read_only_array(
+            [x.calculated_standard_deviation for x in self.traits]
+        )
+        self.heritabilities = read_only_array(
+            [x.heritability for x in self.traits]
+        )
+        self.net_merit_dollars = read_only_array(
+            [x.net_merit_dollars for x in self.traits]
+        )
+        self.inbreeding_depression_percentages = read_only_array(
+            [x.inbreeding_depression_percentage for x in self.traits]
+        )
+        self.freeze()
 
     def get_default_trait_visibility(self) -> dict[str, list[bool]]:
         return {x.uid: [True, True, True] for x in self.traits}
@@ -483,8 +624,7 @@ class Traitset:
         initial_values = np.array(
             [Trait.mendelian_sample() for _ in self.traits]
         )
-        L = np.linalg.cholesky(np.array(self.genotype_correlations))
-        correlated_values = L @ initial_values
+        correlated_values = self.genotype_cholesky @ initial_values
 
         return {
             trait.uid: val
@@ -537,8 +677,7 @@ class Traitset:
                 for x in self.traits
             ]
         )
-        L = np.linalg.cholesky(self.phenotype_correlations)
-        correlated_values = L @ initial_values
+        correlated_values = self.phenotype_cholesky @ initial_values
 
         return {
             trait.uid: val
@@ -562,7 +701,7 @@ class Traitset:
     ) -> dict[str, float]:
         """# Gets PTA from each trait's convert_genotype_to_pta function."""
         return {
-            key: self.find_trait_or_null(key).convert_genotype_to_pta(
+            key: self.traits_by_uid[key].convert_genotype_to_pta(
                 val,
                 number_of_daughters,
                 genomic_tests,
@@ -581,6 +720,166 @@ class Traitset:
 
         return net_merit
 
+    def to_trait_array(self, values: dict[str, float | None]) -> np.ndarray:
+        """Get trait values as an array in traitset order (None -> nan)"""
+        return np.array(
+            [values[uid] for uid in self.trait_uids], dtype=np.float64
+        )
+
+    def to_trait_matrix(
+        self, values: list[dict[str, float | None]]
+    ) -> np.ndarray:
+        """Get a list of trait value dicts as an (animals x traits) matrix"""
+        return np.array(
+            [[x[uid] for uid in self.trait_uids] for x in values],
+            dtype=np.float64,
+        ).reshape(len(values), len(self.trait_uids))
+
+    def from_trait_array(self, values: np.ndarray) -> dict[str, float | None]:
+        """Get a trait value dict from an array in traitset order (nan ->
+        None)"""
+        return {
+            uid: None if x != x else x
+            for uid, x in zip(self.trait_uids, values.tolist(), strict=True)
+        }
+
+    def pack_traits(self, values: dict[str, float | None]) -> bytes:
+        """Pack trait values as float64 bytes in traitset order"""
+        return self.pack_trait_array(self.to_trait_array(values))
+
+    def pack_trait_array(self, values: np.ndarray) -> bytes:
+        """Pack an array of trait values in traitset order like
+        pack_traits"""
+        return np.asarray(values, dtype=PACKED_DTYPE).tobytes()
+
+    def unpack_traits(self, packed: bytes | memoryview) -> np.ndarray:
+        """Get a read-only array view over trait values packed by
+        pack_traits"""
+        values = np.frombuffer(packed, dtype=PACKED_DTYPE)
+        if len(values) != len(self.trait_uids):
+            raise ValueError(
+                f"Packed trait values have {len(values)} entries,"
+                + f" traitset '{self.name}' has {len(self.trait_uids)} traits"
+            )
+
+        return values
+
+    def unpack_trait_matrix(
+        self, packed: list[bytes | memoryview]
+    ) -> np.ndarray:
+        """Get an (animals x traits) matrix from a list of packed values"""
+        return np.frombuffer(
+            b"".join(packed), dtype=PACKED_DTYPE
+        ).reshape(len(packed), len(self.trait_uids))
+
+    def get_random_genotypes(self, count: int) -> np.ndarray:
+        """Batch version of get_random_genotype: (count x traits) matrix"""
+        samples = np.random.normal(size=(len(self.traits), count))
+        return (self.genotype_cholesky @ samples).T
+
+    def get_genotypes_from_breeding(
+        self, sire_genotypes: np.ndarray, dam_genotypes: np.ndarray
+    ) -> np.ndarray:
+        """Batch version of get_genotype_from_breeding.
+
+        Takes (animals x traits) sire and dam matrices. The standard
+        deviation scaling in Trait.get_genotype_from_breeding cancels out
+        and is skipped."""
+        mendelian_samples = self.get_random_genotypes(len(sire_genotypes))
+        parent_averages = (sire_genotypes + dam_genotypes) / 2
+        return parent_averages + np.sqrt(2) / 2 * mendelian_samples
+
+    def derive_phenotypes_from_genotypes(
+        self, genotypes: np.ndarray, inbreeding_coefficients: np.ndarray
+    ) -> np.ndarray:
+        """Batch version of derive_phenotype_from_genotype"""
+        sd = self.standard_deviations
+        h2 = self.heritabilities
+
+        residual_standard_deviations = np.sqrt((sd**2) / h2 * (1 - h2))
+        residuals = (
+            np.random.normal(size=genotypes.shape)
+            * residual_standard_deviations
+        )
+        depressions = (
+            np.asarray(inbreeding_coefficients)[:, np.newaxis]
+            * 100
+            * self.inbreeding_depression_percentages
+        )
+        phenotypes = (genotypes * sd * 2 + residuals + depressions) / sd
+
+        return phenotypes @ self.phenotype_cholesky.T
+
+    def derive_ptas_from_genotypes(
+        self,
+        genotypes: np.ndarray,
+        number_of_daughters: int | np.ndarray,
+        genomic_tests: int | np.ndarray,
+        rng: Optional[np.random.Generator] = None,
+    ) -> np.ndarray:
+        """Batch version of derive_ptas_from_genotype.
+
+        number_of_daughters and genomic_tests may be scalars or vectors with
+        one entry per row of genotypes. Reliabilities are calculated once
+        per distinct (daughters, tests) pair and all noise is drawn in one
+        call, from rng if given, otherwise from numpy's global generator.
+        The standard deviation scaling in Trait.convert_genotype_to_pta
+        cancels out and is skipped."""
+        h2 = self.heritabilities
+
+        pairs, pair_indexes = np.unique(
+            np.column_stack(
+                [
+                    np.broadcast_to(number_of_daughters, len(genotypes)),
+                    np.broadcast_to(genomic_tests, len(genotypes)),
+                ]
+            ),
+            axis=0,
+            return_inverse=True,
+        )
+
+        # (pairs x traits) reliabilities and weights
+        n = pairs[:, 0:1] + pairs[:, 1:2] * 2 * (1 / h2)
+        k = (4 - h2) / h2
+        rel = np.minimum(h2 + (n / (n + k)), 0.99)
+        genotype_weights = np.sqrt(rel) * rel**0.25 / 2
+        noise_weights = np.sqrt(1 - rel) * rel**0.25 / 2
+
+        normal = np.random.normal if rng is None else rng.normal
+        noise = normal(size=genotypes.shape)
+
+        pair_indexes = pair_indexes.reshape(-1)
+        return (
+            genotype_weights[pair_indexes] * genotypes
+            + noise_weights[pair_indexes] * noise
+        )
+
+    def derive_net_merits_from_genotypes(
+        self, genotypes: np.ndarray
+    ) -> np.ndarray:
+        """Batch version of derive_net_merit_from_genotype"""
+        return genotypes @ (self.standard_deviations * self.net_merit_dollars)
+
+    def breed(
+        self,
+        sire_genotypes: np.ndarray,
+        dam_genotypes: np.ndarray,
+        inbreeding_coefficients: np.ndarray,
+    ) -> BreedingBatch:
+        """Breed rows of sire_genotypes with matching rows of dam_genotypes"""
+        genotypes = self.get_genotypes_from_breeding(
+            sire_genotypes, dam_genotypes
+        )
+
+        return BreedingBatch(
+            genotypes,
+            self.derive_phenotypes_from_genotypes(
+                genotypes, inbreeding_coefficients
+            ),
+            self.derive_ptas_from_genotypes(genotypes, 0, 0),
+            self.derive_net_merits_from_genotypes(genotypes),
+        )
+
     def get_random_recessives(self) -> dict[str, str]:
         return {x.uid: x.get_random() for x in self.recessives}
 
@@ -596,21 +895,21 @@ class Traitset:
         return recessives
 
     def find_trait_or_null(self, trait: str) -> Optional[Trait]:
-        for t in self.traits:
-            if t.uid == trait:
-                return t
-
-        return None
+        return self.traits_by_uid.get(trait)
 
     def find_recessive_or_null(self, recessive: str) -> Optional[Recessive]:
-        for r in self.recessives:
-            if r.uid == recessive:
-                return r
-
-        return None
+        return self.recessives_by_uid.get(recessive)
 
     def get_dict(self) -> dict[str, str | float | dict]:
-        return load(open(TRAITSET_PATH / f"{self.name}.json", "r"))
+        with open(self.get_path(), "r") as file:
+            return load(file)
+
+    def get_path(self) -> Path:
+        return self.get_path_for(self.name)
+
+    @staticmethod
+    def get_path_for(name: str) -> Path:
+        return TRAITSET_PATH / f"{name}.json"
 
     def get_html_animal_table(self) -> SafeString:
         headers = wrap("Animal", "th")
@@ -720,7 +1019,7 @@ class Traitset:
         return self.get_html_correlation_table(self.phenotype_correlations)
 
     def get_html_correlation_table(
-        self, correlations: list[list[float]]
+        self, correlations: tuple[tuple[float, ...], ...]
     ) -> SafeString:
         headers = wrap("", "th")
 
@@ -21,6 +21,12 @@ urlpatterns = [
     path("class/<int:classid>/delete", views.deleteclass),
     path("class/<int:classid>/get-trend-chart", views.get_trend_chart),
     path("class/<int:classid>/get-animal-chart", views.get_animal_chart),
+    path(
+        "class/<int:classid>/download-animal-chart",
+        views.download_animal_chart,
+    ),
+    path("class/<int:classid>/get-animal-data", views.get_animal_data),
+    path("exports/<str:token>", views.download_export),
     path("class/<int:classid>/generating-file", views.generating_file),
     path("class/<int:classid>/get-enrollments", views.get_enrollments),
     path("class/<int:classid>/calculate-ptas", views.calculate_ptas),
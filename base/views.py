@@ -1,11 +1,15 @@
 import re
 from sys import prefix
+from typing import Any, Iterator
+
 from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView
+from django.core import signing
 from django.core.mail import mail_admins, mail_managers
 from django.db import transaction
+from django.db.models import Count
 from django.http import (
     FileResponse,
     Http404,
@@ -13,15 +17,17 @@ from django.http import (
     HttpResponse,
     HttpResponseRedirect,
     JsonResponse,
+    StreamingHttpResponse,
 )
 from django.shortcuts import get_object_or_404, render
+from django.utils.cache import get_conditional_response
 from django.utils.html import SafeString
 from django.utils.timezone import now
 from django.views.decorators.http import require_POST
 
 from base.traitsets import (
     DOCUMENTED_FUNCS,
-    Traitset,
+    get_traitset,
     REGISTERED as registered_traitsets,
 )
 
@@ -29,6 +35,9 @@ from . import forms
 from . import models
 from . import csv
 from . import names as nms
+from . import npz
+from . import sinks
+from .pedigree import DEFAULT_PEDIGREE_DEPTH, MAX_PEDIGREE_DEPTH
 from .templatetags.animal_filters import filter_text_to_default
 from .views_utils import (
     ClassAuth,
@@ -266,22 +275,29 @@ def assignments(
     if type(class_auth) not in ClassAuth.TEACHER_ADMIN:
         raise Http404("Must be teacher to access assignments page")
 
-    enrollments = models.Enrollment.objects.filter(
-        connectedclass=connectedclass
-    ).order_by("student__first_name", "student__last_name")
-    assignments = [
-        (
-            a,
-            models.AssignmentStep.objects.filter(assignment=a).count(),
-            models.AssignmentFulfillment.objects.filter(assignment=a).order_by(
-                "enrollment__student__first_name",
-                "enrollment__student__last_name",
-            ),
+    enrollments = list(
+        models.Enrollment.objects.select_related("student")
+        .filter(connectedclass=connectedclass)
+        .order_by("student__first_name", "student__last_name")
+    )
+    enrollments_by_id = {x.id: x for x in enrollments}
+
+    # One row per assignment with a fulfillment (or None) per enrollment
+    assignments = []
+    for a in (
+        models.Assignment.objects.filter(connectedclass=connectedclass)
+        .annotate(step_count=Count("assignmentstep_assignment"))
+        .prefetch_related("assignmentfulfillment_set")
+        .order_by("duedate")
+    ):
+        by_enrollment = {}
+        for x in a.assignmentfulfillment_set.all():
+            x.enrollment = enrollments_by_id[x.enrollment_id]
+            by_enrollment[x.enrollment_id] = x
+
+        assignments.append(
+            (a, a.step_count, [by_enrollment.get(x.id) for x in enrollments])
         )
-        for a in models.Assignment.objects.filter(
-            connectedclass=connectedclass
-        ).order_by("duedate")
-    ]
 
     return render(
         request,
@@ -394,7 +410,7 @@ def equations(request: HttpRequest) -> HttpResponse:
 
 def traitset_overview(request: HttpRequest, traitsetname: str) -> HttpResponse:
     try:
-        traitset = Traitset(traitsetname)
+        traitset = get_traitset(traitsetname)
     except FileNotFoundError as e:
         raise Http404(e)
 
@@ -404,9 +420,11 @@ def traitset_overview(request: HttpRequest, traitsetname: str) -> HttpResponse:
 
 
 def traitsets(request: HttpRequest) -> HttpResponse:
-    traitsets = [(Traitset(x.name)) for x in registered_traitsets if x.enabled]
+    traitsets = [
+        get_traitset(x.name) for x in registered_traitsets if x.enabled
+    ]
     deprecated_traitsets = [
-        Traitset(x.name) for x in registered_traitsets if not x.enabled
+        get_traitset(x.name) for x in registered_traitsets if not x.enabled
     ]
 
     return render(
@@ -525,9 +543,10 @@ def genomic_test(request: HttpRequest, classid: int) -> HttpResponseRedirect:
     if type(class_auth) not in ClassAuth.TEACHER_ADMIN:
         raise Http404("Must be teacher to genomic test")
 
-    class_auth.connectedclass.recalculate_ptas(
-        classid, request.user.email, True
+    calculation = models.PtaCalculation.create_new(
+        class_auth.connectedclass, genomic_test=True
     )
+    models.Class.recalculate_ptas(calculation.id, request.user.email)
 
     return HttpResponseRedirect(f"/class/{classid}/running-genomic-test")
 
@@ -540,9 +559,8 @@ def calculate_ptas(request: HttpRequest, classid: int) -> HttpResponseRedirect:
     if type(class_auth) not in ClassAuth.TEACHER_ADMIN:
         raise Http404("Must be teacher to calculate ptas")
 
-    class_auth.connectedclass.recalculate_ptas(
-        class_auth.connectedclass.id, request.user.email
-    )
+    calculation = models.PtaCalculation.create_new(class_auth.connectedclass)
+    models.Class.recalculate_ptas(calculation.id, request.user.email)
 
     return HttpResponseRedirect(f"/class/{classid}/running-calculate-ptas")
 
@@ -557,7 +575,7 @@ def submit_animal(
     class_auth = auth_class(request, classid)
     herd_auth = auth_herd(class_auth, herdid)
     animal = get_object_or_404(
-        models.Animal.objects.defer("pedigree"),
+        models.Animal.objects,
         connectedclass=classid,
         herd=herdid,
         id=animalid,
@@ -667,7 +685,12 @@ def genomic_test_running(request: HttpRequest, classid: int) -> HttpResponse:
     return render(
         request,
         "base/genomic_test_running.html",
-        {"class": class_auth.connectedclass},
+        {
+            "class": class_auth.connectedclass,
+            "calculation": models.PtaCalculation.get_latest(
+                class_auth.connectedclass
+            ),
+        },
     )
 
 
@@ -680,19 +703,26 @@ def pta_calculation_running(
     return render(
         request,
         "base/pta_calculation_running.html",
-        {"class": class_auth.connectedclass},
+        {
+            "class": class_auth.connectedclass,
+            "calculation": models.PtaCalculation.get_latest(
+                class_auth.connectedclass
+            ),
+        },
     )
 
 
 #### FILE VIEWS ####
 @login_required
-def get_trend_chart(request: HttpRequest, classid: int) -> FileResponse:
+def get_trend_chart(
+    request: HttpRequest, classid: int
+) -> StreamingHttpResponse:
     class_auth = auth_class(request, classid)
 
     if type(class_auth) not in ClassAuth.TEACHER_ADMIN:
         raise Http404("Must be teacher to get trend chart")
 
-    traitset = Traitset(class_auth.connectedclass.traitset)
+    traitset = get_traitset(class_auth.connectedclass.traitset)
     headers = (
         ["Time Stamp", "Population Size", "Net Merit $"]
         + [
@@ -704,19 +734,31 @@ def get_trend_chart(request: HttpRequest, classid: int) -> FileResponse:
             for x in traitset.traits
         ]
     )
-    data = []
-    for row in class_auth.connectedclass.trend_log:
-        data.append(
-            [
-                row[nms.TIME_STAMP_KEY],
-                row[nms.POPULATION_SIZE_KEY],
-                row[nms.NETMERIT_KEY],
-            ]
-            + [row["genotype"][x.uid] for x in traitset.traits]
-            + [row["phenotype"][x.uid] for x in traitset.traits]
+    snapshots = (
+        models.TrendSnapshot.objects.filter(
+            connectedclass=class_auth.connectedclass
+        )
+        .order_by("id")
+        .values_list(
+            "timestamp",
+            "population_size",
+            "net_merit",
+            nms.GENOTYPE_KEY,
+            nms.PHENOTYPE_KEY,
         )
+    )
+
+    def data() -> Iterator[list[Any]]:
+        for timestamp, size, net_merit, genotype, phenotype in (
+            snapshots.iterator(chunk_size=1_000)
+        ):
+            yield (
+                [timestamp.isoformat(), size, net_merit]
+                + [genotype[x.uid] for x in traitset.traits]
+                + [phenotype[x.uid] for x in traitset.traits]
+            )
 
-    return csv.create_csv_response("trendlog.csv", headers, data)
+    return csv.create_csv_response("trendlog.csv", headers, data())
 
 
 @login_required
@@ -734,6 +776,58 @@ def get_animal_chart(
     return HttpResponseRedirect(f"/class/{classid}/generating-file")
 
 
+@login_required
+@transaction.atomic()
+def get_animal_data(
+    request: HttpRequest, classid: int
+) -> HttpResponseRedirect:
+    class_auth = auth_class(request, classid)
+
+    if type(class_auth) not in ClassAuth.TEACHER_ADMIN:
+        raise Http404("Must be teacher to get animal data")
+
+    npz.create_animal_npz(classid, request.user.id)
+
+    return HttpResponseRedirect(f"/class/{classid}/generating-file")
+
+
+@login_required
+def download_animal_chart(
+    request: HttpRequest, classid: int
+) -> StreamingHttpResponse:
+    class_auth = auth_class(request, classid)
+
+    if type(class_auth) not in ClassAuth.TEACHER_ADMIN:
+        raise Http404("Must be teacher to get animal chart")
+
+    response = StreamingHttpResponse(
+        csv.iter_animal_csv(class_auth.connectedclass),
+        content_type="text/csv",
+    )
+    response["Content-Disposition"] = 'attachment; filename="AnimalChart.csv"'
+
+    return response
+
+
+@login_required
+def download_export(request: HttpRequest, token: str) -> FileResponse:
+    try:
+        userid, file_name = sinks.load_local_export_token(token)
+    except signing.BadSignature:
+        raise Http404("Export does not exist")
+
+    if userid != request.user.id:
+        raise Http404("Export does not exist")
+
+    path = sinks.get_local_export_path(file_name)
+    if not path.is_file():
+        raise Http404("Export does not exist")
+
+    return FileResponse(
+        open(path, "rb"), as_attachment=True, filename=path.name
+    )
+
+
 #### JSON VIEWS ####
 @login_required
 def get_enrollments(request: HttpRequest, classid: int) -> JsonResponse:
@@ -761,12 +855,32 @@ def get_enrollments(request: HttpRequest, classid: int) -> JsonResponse:
 
 
 @login_required
-def get_herd(request: HttpRequest, classid: int, herdid: int) -> JsonResponse:
+def get_herd(request: HttpRequest, classid: int, herdid: int) -> HttpResponse:
     class_auth = auth_class(request, classid, "class_herd")
     herd_auth = auth_herd(class_auth, herdid)
-    json = herd_auth.herd.json_dict()
 
-    return JsonResponse(json)
+    query = None
+    if request.GET:
+        form = forms.HerdQuery(request.GET)
+        if not form.is_valid(herd_auth.herd.connectedclass):
+            raise Http404("Invalid herd query")
+
+        query = form.get_query()
+
+    query_string = request.GET.urlencode()
+    etag = f'"{herd_auth.herd.get_json_key(query_string)}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+
+    response = HttpResponse(
+        herd_auth.herd.get_cached_json(query, query_string),
+        content_type="application/json",
+    )
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+
+    return response
 
 
 @login_required
@@ -810,7 +924,16 @@ def get_pedigree(
     class_auth = auth_class(request, classid, "class_herd")
     herd_auth = auth_herd(class_auth, herdid)
     animal = get_object_or_404(
-        models.Animal.objects, id=animalid, herd=herd_auth.herd
+        models.Animal.objects.only("id", "connectedclass_id"),
+        id=animalid,
+        herd=herd_auth.herd,
     )
 
-    return JsonResponse(animal.pedigree)
+    try:
+        depth = int(request.GET.get("depth", DEFAULT_PEDIGREE_DEPTH))
+    except ValueError:
+        raise Http404("Invalid pedigree depth")
+
+    depth = min(max(depth, 0), MAX_PEDIGREE_DEPTH)
+
+    return JsonResponse(animal.get_pedigree(depth))
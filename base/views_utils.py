@@ -32,7 +32,7 @@ def auth_class(
     request: HttpRequest, classid: int, *related: str
 ) -> ClassAuth.Teacher | ClassAuth.Student | ClassAuth.Admin:
     connectedclass = get_object_or_404(
-        models.Class.objects.select_related("teacher", *related).defer("trend_log"),
+        models.Class.objects.select_related("teacher", *related),
         id=classid,
     )
 
@@ -46,9 +46,7 @@ def auth_class(
             return ClassAuth.Student(
                 models.Enrollment.objects.select_related(
                     *["connectedclass__" + x for x in related]
-                )
-                .defer("connectedclass__trend_log")
-                .get(
+                ).get(
                     connectedclass=connectedclass,
                     student=request.user,
                 )
@@ -90,9 +88,7 @@ def auth_herd(
 ):
     connectedclass = class_auth.connectedclass
     herd = get_object_or_404(
-        models.Herd.objects.select_related("connectedclass", *related).defer(
-            "connectedclass__trend_log"
-        ),
+        models.Herd.objects.select_related("connectedclass", *related),
         id=herdid,
         connectedclass=connectedclass,
     )
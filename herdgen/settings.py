@@ -163,6 +163,16 @@ AWS_S3_CUSTOM_DOMAIN = "%s.s3.amazonaws.com" % AWS_STORAGE_BUCKET_NAME
 AWS_S3_FILE_OVERWRITE = False
 AWS_S3_DEFAULT_ACL = None
 
+# Where exported files (animal charts) are written: "s3" (AWS bucket),
+# "local" (EXPORT_DIRECTORY) or "storage" (the default file storage)
+EXPORT_SINK = env("EXPORT_SINK", str, default="s3")
+EXPORT_DIRECTORY = env("EXPORT_DIRECTORY", str, default=BASE_DIR / "exports")
+# Address of the site, used for download links to "local" exports
+EXPORT_BASE_URL = env("EXPORT_BASE_URL", str, default="http://127.0.0.1:8000")
+
+# Worker processes used to recalculate PTAs, 1 calculates in the task itself
+PTA_PROCESSES = env("PTA_PROCESSES", int, default=1)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -1,24 +1,46 @@
-from base.traitsets.traitset import Traitset
+from base.traitsets import get_traitset
 from .add_pta_visibility_defaults import add_pta_visibility_defaults
-from base.models import Animal
+from base import names as nms
+from base.models import Animal, Class
+
+CHUNK_SIZE = 2_000
 
 
 def add_pta_and_dam_only_phenotypes():
     add_pta_visibility_defaults()
 
-    traitsets = {}
-    animals = Animal.objects.select_related("connectedclass").all()
     count = Animal.objects.count()
     print(f"{(count)} Animals to process")
 
-    for idx, anim in enumerate(animals.iterator(chunk_size=50)):
-        if anim.connectedclass_id in traitsets:
-            traitset = traitsets[anim.connectedclass_id]
-        else:
-            traitset = Traitset(anim.connectedclass.traitset)
-            traitsets[anim.connectedclass_id] = traitset
+    done = 0
+    for klass in Class.objects.all():
+        traitset = get_traitset(klass.traitset)
+        animals = Animal.objects.filter(connectedclass=klass).only(
+            "genotype", "genotype_packed"
+        )
+
+        chunk = []
+        for anim in animals.iterator(chunk_size=CHUNK_SIZE):
+            chunk.append(anim)
+
+            if len(chunk) >= CHUNK_SIZE:
+                add_ptas(chunk, traitset)
+                done += len(chunk)
+                print(f"Animal {done}/{count} {done / count * 100}%")
+                chunk = []
+
+        if chunk:
+            add_ptas(chunk, traitset)
+            done += len(chunk)
+            print(f"Animal {done}/{count} {done / count * 100}%")
+
+
+def add_ptas(animals: list[Animal], traitset):
+    ptas = traitset.derive_ptas_from_genotypes(
+        Animal.get_trait_matrix(animals, nms.GENOTYPE_KEY, traitset), 0, 0
+    )
 
-        anim.ptas = traitset.derive_ptas_from_genotype(anim.genotype, 0, 0)
+    for anim, values in zip(animals, ptas):
+        anim.ptas_packed = traitset.pack_trait_array(values)
 
-        anim.save()
-        print(f"Animal {idx + 1}/{count} {(idx - 1)/count * 100}%")
+    Animal.objects.bulk_update(animals, ["ptas_packed"])
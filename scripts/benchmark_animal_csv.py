@@ -0,0 +1,72 @@
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from base import csv
+from base.models import Animal, Class
+
+
+def iter_animal_csv_by_animal(connectedclass: Class):
+    """Animal csv built one cell at a time with resolve_data_key"""
+
+    headers = connectedclass.get_animal_file_headers()
+    data_keys = connectedclass.get_animal_file_data_order()
+
+    yield f"{csv.convert_data_row(headers)}{csv.ROW_SEP}".encode("utf-8")
+
+    animals = (
+        Animal.objects.select_related("herd", "connectedclass")
+        .filter(connectedclass=connectedclass)
+        .iterator(chunk_size=5_000)
+    )
+    for animal in animals:
+        row = csv.convert_data_row(
+            [animal.resolve_data_key(x) for x in data_keys]
+        )
+        yield f"{row}{csv.ROW_SEP}".encode("utf-8")
+
+
+def time_export(chunks) -> tuple[float, bytes]:
+    start = perf_counter()
+    data = b"".join(chunks)
+    return perf_counter() - start, data
+
+
+def benchmark_animal_csv(
+    animals: int = 100_000, traitset: str = "ANIMAL_SCIENCE_422"
+):
+    """Time both animal csv writers on a throwaway class. Everything is
+    rolled back when finished."""
+
+    with transaction.atomic():
+        user = User.objects.create_user("benchmark-animal-csv")
+
+        start = perf_counter()
+        connectedclass = Class.create_new(
+            user,
+            "Benchmark",
+            traitset,
+            "",
+            animals // 2,
+            animals - animals // 2,
+        )
+        print(f"Created {animals} animals in {perf_counter() - start:.1f}s")
+
+        by_animal, expected = time_export(
+            iter_animal_csv_by_animal(connectedclass)
+        )
+        print(f"resolve_data_key writer: {by_animal:.2f}s")
+
+        by_column, data = time_export(csv.iter_animal_csv(connectedclass))
+        print(
+            f"Column writer: {by_column:.2f}s ({by_animal / by_column:.1f}x)"
+        )
+        print(f"Identical output: {data == expected}")
+
+        fixed, _ = time_export(
+            csv.iter_animal_csv(connectedclass, precision=4)
+        )
+        print(f"Column writer, 4 decimals: {fixed:.2f}s")
+
+        transaction.set_rollback(True)
@@ -1,18 +1,20 @@
 from base import models
-from base.traitsets import Traitset
+from base import names as nms
+from base.traitsets import Traitset, get_traitset
 
 
 def run():
     sets: dict[int, Traitset] = {}
 
     for klass in models.Class.objects.all():
-        sets[klass.id] = Traitset(klass.traitset)
+        sets[klass.id] = get_traitset(klass.traitset)
 
     animals = models.Animal.objects.all()
     for animal in animals:
         traitset = sets[animal.connectedclass_id]
-        animal.phenotype = traitset.derive_phenotype_from_genotype(
-            animal.genotype, animal.inbreeding
+        phenotype = traitset.derive_phenotype_from_genotype(
+            animal.get_traits(nms.GENOTYPE_KEY, traitset), animal.inbreeding
         )
+        animal.phenotype_packed = traitset.pack_traits(phenotype)
 
-    models.Animal.objects.bulk_update(animals, ["phenotype"])
+    models.Animal.objects.bulk_update(animals, ["phenotype_packed"])